@@ -0,0 +1,294 @@
+"""Analítica por clase para profesores.
+
+Las rutas cargan actividades, high scores y sesiones en bloque como columnas
+NumPy y calculan tasas de finalización, distribuciones de puntuación y tiempo
+de juego agrupando por escuela y/o grado sin recorrer las filas en Python.
+Requiere NumPy; sin él las rutas responden 501.
+"""
+from flask import Blueprint, request, jsonify
+from sqlalchemy import func, select
+from src.models.user import db
+from src.models.game_progress import GameProgress, CompletedModule, ModuleActivity
+from src.models.high_score import HighScore
+from src.models.student import Student, StudentSession
+from src.columnar import np, columns, encode, lookup, group_stats, group_histogram, distinct_pairs
+
+analytics_bp = Blueprint('analytics', __name__)
+
+GROUP_FIELDS = ('escuela', 'grado')
+SCORE_EDGES = (0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100)
+PERCENTILES = (50, 90)
+
+# Une filas con user_id 'student_<nip>' a su estudiante
+student_of_user_id = Student.nip == func.substr(GameProgress.user_id, 9)
+
+
+def parse_group_by(value):
+    """Valida ?group_by= (escuela, grado o escuela,grado)"""
+    fields = tuple(field.strip() for field in (value or 'escuela').split(',') if field.strip())
+    if not fields or any(field not in GROUP_FIELDS for field in fields) or len(set(fields)) != len(fields):
+        raise ValueError('group_by debe ser escuela, grado o escuela,grado')
+    return fields
+
+
+def filter_students(statement, escuela=None, grado=None):
+    if escuela:
+        statement = statement.where(Student.escuela == escuela)
+    if grado:
+        statement = statement.where(Student.grado == grado)
+    return statement
+
+
+def fetch_columns(statement, count, dtype=None):
+    """Ejecuta statement y devuelve sus columnas como arrays"""
+    result = db.session.connection().execute(statement)
+    # Las tuplas del cursor DB-API evitan construir un Row por fila
+    rows = result.cursor.fetchall()
+    result.close()
+    return columns(rows, count, dtype)
+
+
+# -- carga ---------------------------------------------------------------
+
+def load_student_groups(group_by, escuela=None, grado=None):
+    """Ids de estudiante, código de grupo por estudiante y etiquetas de cada grupo"""
+    statement = filter_students(
+        select(Student.id, *(getattr(Student, field) for field in group_by)), escuela, grado
+    )
+    student_ids, *labels = fetch_columns(statement, 1 + len(group_by))
+    if len(student_ids) == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64), []
+
+    # Combina los códigos de cada campo y los reduce a 0..n-1
+    uniques, combined = [], np.zeros(len(student_ids), dtype=np.int64)
+    for column in labels:
+        values, codes = encode(column)
+        uniques.append(values)
+        combined = combined * len(values) + codes
+    group_codes, groups = np.unique(combined, return_inverse=True)
+
+    group_labels = []
+    for code in group_codes:
+        label = {}
+        for field, values in reversed(list(zip(group_by, uniques))):
+            code, index = divmod(int(code), len(values))
+            label[field] = values[index]
+        group_labels.append({field: label[field] for field in group_by})
+    return student_ids.astype(np.int64), groups.astype(np.int64), group_labels
+
+
+def load_completions(escuela=None, grado=None):
+    """(student_id, module_id) de cada módulo completado"""
+    statement = filter_students(
+        select(Student.id, CompletedModule.module_id)
+        .join(GameProgress, GameProgress.id == CompletedModule.progress_id)
+        .join(Student, student_of_user_id),
+        escuela, grado
+    )
+    return fetch_columns(statement, 2, np.int64)
+
+
+def load_activity_scores(escuela=None, grado=None, module_id=None):
+    """(student_id, module_id, score) de cada actividad"""
+    statement = filter_students(
+        select(Student.id, ModuleActivity.module_id, func.coalesce(ModuleActivity.score, 0))
+        .join(Student, Student.nip == func.substr(ModuleActivity.user_id, 9)),
+        escuela, grado
+    )
+    if module_id is not None:
+        statement = statement.where(ModuleActivity.module_id == module_id)
+    return fetch_columns(statement, 3, np.int64)
+
+
+def load_high_scores(escuela=None, grado=None, module_id=None):
+    """(student_id, module_id, score) de cada high score"""
+    statement = filter_students(
+        select(Student.id, HighScore.module_id, HighScore.score)
+        .join(Student, Student.nip == HighScore.student_nip),
+        escuela, grado
+    )
+    if module_id is not None:
+        statement = statement.where(HighScore.module_id == module_id)
+    return fetch_columns(statement, 3, np.int64)
+
+
+def load_session_minutes(escuela=None, grado=None):
+    """(student_id, duration_minutes) de cada sesión cerrada"""
+    statement = filter_students(
+        select(StudentSession.student_id, StudentSession.duration_minutes)
+        .join(Student, Student.id == StudentSession.student_id)
+        .where(StudentSession.duration_minutes.is_not(None)),
+        escuela, grado
+    )
+    return fetch_columns(statement, 2, np.int64)
+
+
+# -- cálculo -------------------------------------------------------------
+
+def as_number(value, digits=2):
+    """Convierte un escalar NumPy a float/None para JSON"""
+    value = float(value)
+    return None if np.isnan(value) else round(value, digits)
+
+
+def stats_dict(stats, index):
+    result = {'count': int(stats['count'][index])}
+    for name in ('mean', 'min', 'max', *(f'p{p}' for p in PERCENTILES)):
+        result[name] = as_number(stats[name][index])
+    return result
+
+
+def compute_completion(student_ids, groups, group_labels, completion_students, completion_modules):
+    """Tasa de finalización de cada módulo por grupo"""
+    n_groups = len(group_labels)
+    group_sizes = np.bincount(groups, minlength=n_groups)
+
+    # Un estudiante cuenta una vez por módulo aunque aparezca repetido
+    completion_students, completion_modules = distinct_pairs(
+        completion_students.astype(np.int64), completion_modules.astype(np.int64)
+    )
+    completion_groups = lookup(student_ids, groups, completion_students)
+    known = completion_groups >= 0
+    completion_groups = completion_groups[known]
+    completion_modules = completion_modules[known]
+
+    modules = np.unique(completion_modules)
+    completed = np.bincount(
+        completion_groups * len(modules) + np.searchsorted(modules, completion_modules),
+        minlength=n_groups * len(modules)
+    ).reshape(n_groups, len(modules))
+
+    return [
+        {
+            **label,
+            'students': int(group_sizes[g]),
+            'modules': [
+                {
+                    'module_id': int(module),
+                    'completed': int(completed[g, m]),
+                    'completion_rate': as_number(completed[g, m] / group_sizes[g], 4) if group_sizes[g] else None
+                }
+                for m, module in enumerate(modules)
+            ]
+        }
+        for g, label in enumerate(group_labels)
+    ]
+
+
+def compute_scores(student_ids, groups, group_labels, score_students, score_modules, scores):
+    """Distribución de puntuaciones por grupo y módulo"""
+    score_groups = lookup(student_ids, groups, score_students.astype(np.int64))
+    known = score_groups >= 0
+    score_groups = score_groups[known]
+    score_modules = score_modules[known].astype(np.int64)
+    scores = scores[known].astype(np.float64)
+
+    modules = np.unique(score_modules)
+    cells = score_groups * len(modules) + np.searchsorted(modules, score_modules)
+    n_cells = len(group_labels) * len(modules)
+    stats = group_stats(cells, scores, n_cells, PERCENTILES)
+    histogram = group_histogram(cells, scores, n_cells, np.array(SCORE_EDGES, dtype=np.float64))
+
+    result = []
+    for g, label in enumerate(group_labels):
+        entries = []
+        for m, module in enumerate(modules):
+            cell = g * len(modules) + m
+            if stats['count'][cell] == 0:
+                continue
+            entries.append({
+                'module_id': int(module),
+                **stats_dict(stats, cell),
+                'histogram': histogram[cell].tolist()
+            })
+        result.append({**label, 'modules': entries})
+    return result
+
+
+def compute_time_on_task(student_ids, groups, group_labels, session_students, minutes):
+    """Minutos de juego por estudiante, resumidos por grupo"""
+    n_groups = len(group_labels)
+    positions = lookup(student_ids, np.arange(len(student_ids)), session_students.astype(np.int64))
+    known = positions >= 0
+    positions = positions[known]
+
+    # Primero se suma por estudiante; los estudiantes sin sesiones cuentan 0 minutos
+    per_student = np.bincount(positions, weights=minutes[known].astype(np.float64), minlength=len(student_ids))
+    sessions = np.bincount(groups[positions], minlength=n_groups)
+    stats = group_stats(groups, per_student, n_groups, PERCENTILES)
+
+    return [
+        {
+            **label,
+            'students': int(stats['count'][g]),
+            'sessions': int(sessions[g]),
+            'total_minutes': int(stats['sum'][g]),
+            'minutes_per_student': {name: value for name, value in stats_dict(stats, g).items() if name != 'count'}
+        }
+        for g, label in enumerate(group_labels)
+    ]
+
+
+# -- rutas ---------------------------------------------------------------
+
+def analytics_view(compute):
+    """Envuelve una ruta de analítica: comprueba NumPy, group_by y errores"""
+    if np is None:
+        return jsonify({
+            'success': False,
+            'error': 'NumPy no está instalado'
+        }), 501
+    try:
+        group_by = parse_group_by(request.args.get('group_by'))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    try:
+        escuela = request.args.get('escuela')
+        grado = request.args.get('grado')
+        student_ids, groups, group_labels = load_student_groups(group_by, escuela, grado)
+        return jsonify({
+            'success': True,
+            'group_by': list(group_by),
+            'data': compute(escuela, grado, student_ids, groups, group_labels)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@analytics_bp.route('/modules', methods=['GET'])
+def get_module_completion():
+    """Tasa de finalización por módulo (?group_by=, ?escuela=, ?grado=)"""
+    def compute(escuela, grado, student_ids, groups, group_labels):
+        return compute_completion(student_ids, groups, group_labels, *load_completions(escuela, grado))
+    return analytics_view(compute)
+
+
+@analytics_bp.route('/scores', methods=['GET'])
+def get_score_distribution():
+    """Distribución de puntuaciones por módulo (?source=activities|highscores, ?module_id=)"""
+    source = request.args.get('source', 'activities')
+    if source not in ('activities', 'highscores'):
+        return jsonify({
+            'success': False,
+            'error': 'source debe ser activities o highscores'
+        }), 400
+    loader = load_activity_scores if source == 'activities' else load_high_scores
+    module_id = request.args.get('module_id', type=int)
+
+    def compute(escuela, grado, student_ids, groups, group_labels):
+        return compute_scores(student_ids, groups, group_labels, *loader(escuela, grado, module_id))
+    return analytics_view(compute)
+
+
+@analytics_bp.route('/time-on-task', methods=['GET'])
+def get_time_on_task():
+    """Minutos de juego por estudiante agregados por grupo"""
+    def compute(escuela, grado, student_ids, groups, group_labels):
+        return compute_time_on_task(student_ids, groups, group_labels, *load_session_minutes(escuela, grado))
+    return analytics_view(compute)
@@ -1,8 +1,17 @@
 from flask import Blueprint, request, jsonify
 from src.models.user import db
-from src.models.student import Student, StudentSession
+from src.models.student import Student, StudentSession, StudentStats
 from src.models.game_progress import GameProgress
+from src.leaderboard import leaderboard
+from src.write_behind import write_behind
+from src.cache import cache, student_key, progress_key
+from src.db_config import retry_on_lock
+from src.nip_allocator import nip_allocator, nip_candidates, NIP_ALLOCATION_RETRIES
+from src.pagination import DEFAULT_LIMIT, parse_cursor, parse_since, encode_cursor, parse_limit, after_cursor, parse_fields, project_rows
+from sqlalchemy.exc import IntegrityError, OperationalError
 from datetime import datetime, date
+import click
+import csv
 import re
 
 auth_bp = Blueprint('auth', __name__)
@@ -24,85 +33,153 @@ def generate_nip(nombre, apellidos, fecha_nacimiento):
     
     return f"{iniciales}{dia:02d}{mes:02d}"
 
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
 def validate_email(email):
     """Valida el formato del email"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return EMAIL_PATTERN.match(email) is not None
+
+REQUIRED_FIELDS = ['nombre', 'apellidos', 'edad', 'escuela', 'grado',
+                   'fechaNacimiento', 'nombreTutor', 'emailTutor']
+
+def validate_student_data(data):
+    """Valida los datos de registro de un estudiante.
+
+    Devuelve (valores de las columnas de Student sin el NIP, None) o
+    (None, mensaje de error).
+    """
+    for field in REQUIRED_FIELDS:
+        if field not in data or not data[field] or not str(data[field]).strip():
+            return None, f'El campo {field} es requerido'
+    
+    try:
+        edad = int(data['edad'])
+    except (TypeError, ValueError):
+        return None, 'La edad debe ser un número'
+    if edad < 6 or edad > 17:
+        return None, 'La edad debe estar entre 6 y 17 años'
+    
+    email = str(data['emailTutor']).strip()
+    if not validate_email(email):
+        return None, 'El email del tutor no es válido'
+    
+    try:
+        fecha_nacimiento = datetime.strptime(str(data['fechaNacimiento']).strip(), '%Y-%m-%d').date()
+    except ValueError:
+        return None, 'Formato de fecha inválido'
+    
+    return {
+        'nombre': str(data['nombre']).strip(),
+        'apellidos': str(data['apellidos']).strip(),
+        'edad': edad,
+        'escuela': str(data['escuela']).strip(),
+        'grado': str(data['grado']).strip(),
+        'fecha_nacimiento': fecha_nacimiento,
+        'nombre_tutor': str(data['nombreTutor']).strip(),
+        'email_tutor': email.lower()
+    }, None
+
+def load_student_with_progress(nip):
+    """Obtiene (student, progress) de un estudiante activo con un solo SELECT.
+
+    Los módulos e insignias del progreso se cargan con selectin, así que
+    to_dict() no dispara consultas adicionales por fila.
+    """
+    row = db.session.query(Student, GameProgress).outerjoin(
+        GameProgress, GameProgress.user_id == db.literal('student_') + Student.nip
+    ).filter(
+        Student.nip == nip,
+        Student.activo == True
+    ).first()
+    return row if row else (None, None)
+
+def load_student_dict(nip):
+    """to_dict() de un estudiante activo, o None (cargador del caché)"""
+    student = Student.query.filter_by(nip=nip, activo=True).first()
+    return student.to_dict() if student else None
+
+def load_progress_dict(user_id):
+    """to_dict() del progreso de un usuario, o None (cargador del caché)"""
+    progress = GameProgress.query.filter_by(user_id=user_id).first()
+    return progress.to_dict() if progress else None
+
+def find_registered_student(values, nip_base):
+    """Estudiante con el mismo nombre, apellidos y fecha en cualquiera de los NIP de su base"""
+    return Student.query.filter(
+        Student.nip.in_(list(nip_candidates(nip_base))),
+        db.func.lower(Student.nombre) == values['nombre'].lower(),
+        db.func.lower(Student.apellidos) == values['apellidos'].lower(),
+        Student.fecha_nacimiento == values['fecha_nacimiento']
+    ).first()
 
 @auth_bp.route('/register', methods=['POST'])
+@retry_on_lock
 def register_student():
     """Registra un nuevo estudiante"""
+    reserved = None
     try:
         data = request.get_json()
         
-        # Validar datos requeridos
-        required_fields = ['nombre', 'apellidos', 'edad', 'escuela', 'grado', 
-                          'fechaNacimiento', 'nombreTutor', 'emailTutor']
-        
-        for field in required_fields:
-            if field not in data or not data[field]:
-                return jsonify({
-                    'success': False,
-                    'error': f'El campo {field} es requerido'
-                }), 400
-        
-        # Validar edad
-        edad = int(data['edad'])
-        if edad < 6 or edad > 17:
+        # Validar datos requeridos, edad, email y fecha
+        values, error = validate_student_data(data)
+        if error:
             return jsonify({
                 'success': False,
-                'error': 'La edad debe estar entre 6 y 17 años'
+                'error': error
             }), 400
         
-        # Validar email
-        if not validate_email(data['emailTutor']):
-            return jsonify({
-                'success': False,
-                'error': 'El email del tutor no es válido'
-            }), 400
+        nip_base = generate_nip(values['nombre'], values['apellidos'], values['fecha_nacimiento'])
         
-        # Generar NIP
-        nip = generate_nip(data['nombre'], data['apellidos'], data['fechaNacimiento'])
-        
-        # Verificar si el NIP ya existe
-        existing_student = Student.query.filter_by(nip=nip).first()
-        if existing_student:
-            # Si el NIP ya existe, intentar generar uno alternativo (ej. añadiendo un número)
-            # Para este caso, simplemente informamos que ya existe y el usuario debe contactar al admin
+        # Primer NIP libre según el índice en memoria; si otro worker lo acaba
+        # de registrar, la restricción única lo detecta y se prueba el siguiente
+        for _ in range(NIP_ALLOCATION_RETRIES):
+            # Se consulta la BD aunque el índice local esté desactualizado, y
+            # otra vez tras cada choque (puede ser el mismo alumno enviado dos veces)
+            if find_registered_student(values, nip_base):
+                return jsonify({
+                    'success': False,
+                    'error': 'Ya existe un estudiante con este NIP. Por favor, verifica tus datos o contacta al administrador.'
+                }), 400
+            
+            nip = reserved = nip_allocator.reserve(nip_base)
+            if nip is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'No quedan NIP disponibles para estas iniciales y fecha de nacimiento. Contacta al administrador.'
+                }), 409
+            
+            # Crear nuevo estudiante y su progreso inicial en la misma transacción
+            student = Student(nip=nip, **values)
+            progress = GameProgress(user_id=student.get_user_id())
+            db.session.add_all([student, progress])
+            try:
+                # flush asigna ids y valores por defecto; las respuestas se
+                # construyen antes del commit para no recargar las filas expiradas
+                db.session.flush()
+                break
+            except IntegrityError:
+                # Otro worker registró NIP de esta base: releerlos antes de reintentar
+                db.session.rollback()
+                reserved = None
+                nip_allocator.refresh([nip_base])
+        else:
             return jsonify({
                 'success': False,
-                'error': 'Ya existe un estudiante con este NIP. Por favor, verifica tus datos o contacta al administrador.'
-            }), 400
-        
-        # Convertir fecha de nacimiento
-        fecha_nacimiento = datetime.strptime(data['fechaNacimiento'], '%Y-%m-%d').date()
-        
-        # Crear nuevo estudiante
-        student = Student(
-            nip=nip,
-            nombre=data['nombre'].strip(),
-            apellidos=data['apellidos'].strip(),
-            edad=edad,
-            escuela=data['escuela'].strip(),
-            grado=data['grado'],
-            fecha_nacimiento=fecha_nacimiento,
-            nombre_tutor=data['nombreTutor'].strip(),
-            email_tutor=data['emailTutor'].strip().lower()
-        )
-        
-        db.session.add(student)
-        db.session.commit()
+                'error': 'No se pudo asignar un NIP, inténtalo de nuevo'
+            }), 503
         
-        # Crear progreso inicial del juego
-        user_id = student.get_user_id()
-        progress = GameProgress(user_id=user_id)
-        db.session.add(progress)
+        student_data = student.to_dict()
+        progress_data = progress.to_dict()
         db.session.commit()
+        reserved = None
+        cache.set(student_key(nip), student_data)
+        cache.set(progress_key(progress_data['user_id']), progress_data)
+        leaderboard.record_progress(progress, progress_data)
         
         return jsonify({
             'success': True,
             'data': {
-                'student': student.to_dict(),
+                'student': student_data,
                 'nip': nip
             },
             'message': 'Estudiante registrado exitosamente'
@@ -113,6 +190,50 @@ def register_student():
             'success': False,
             'error': 'Formato de fecha inválido'
         }), 400
+    except OperationalError:
+        # El NIP reservado no llegó a guardarse (retry_on_lock vuelve a empezar)
+        nip_allocator.release(reserved)
+        raise
+    except Exception as e:
+        db.session.rollback()
+        nip_allocator.release(reserved)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@auth_bp.route('/register/bulk', methods=['POST'])
+def register_students_bulk():
+    """Registra un listado de estudiantes (JSON o text/csv); ?dry_run=1 sólo valida"""
+    from src.student_import import parse_roster, import_students, BUSY_ERROR
+    try:
+        try:
+            rows = parse_roster(request.get_data(), request.content_type)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        report = import_students(rows, dry_run=request.args.get('dry_run') == '1')
+        if not report['created'] and any(error['error'] == BUSY_ERROR for error in report['errors']):
+            return jsonify({
+                'success': False,
+                'error': BUSY_ERROR,
+                'data': report
+            }), 503
+        if not report['created'] and report['errors']:
+            return jsonify({
+                'success': False,
+                'error': 'Ninguna fila es válida',
+                'data': report
+            }), 400
+        
+        return jsonify({
+            'success': True,
+            'data': report,
+            'message': f"{len(report['created'])} estudiantes registrados, {len(report['errors'])} filas con errores"
+        })
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -121,6 +242,7 @@ def register_student():
         }), 500
 
 @auth_bp.route('/login/<nip>', methods=['GET'])
+@retry_on_lock
 def login_student(nip):
     """Inicia sesión con el NIP del estudiante"""
     try:
@@ -131,40 +253,58 @@ def login_student(nip):
                 'error': 'El NIP debe tener 6 caracteres'
             }), 400
         
-        # Buscar estudiante
-        student = Student.query.filter_by(nip=nip.upper(), activo=True).first()
+        nip = nip.upper()
+        user_id = f'student_{nip}'
         
-        if not student:
-            return jsonify({
-                'success': False,
-                'error': 'NIP no encontrado o cuenta inactiva'
-            }), 404
+        # Estudiante y progreso desde el caché; si falta alguno, una sola consulta
+        student_data = cache.get(student_key(nip))
+        progress_data = cache.get(progress_key(user_id)) if student_data else None
+        created_progress = None
         
-        # Crear nueva sesión
-        session = StudentSession(student_id=student.id)
+        if student_data is None or progress_data is None:
+            student, progress = load_student_with_progress(nip)
+            
+            if not student:
+                return jsonify({
+                    'success': False,
+                    'error': 'NIP no encontrado o cuenta inactiva'
+                }), 404
+            
+            student_data = student.to_dict()
+            if progress is None:
+                # Crear progreso si no existe, en la misma transacción que la sesión
+                created_progress = GameProgress(user_id=user_id)
+                db.session.add(created_progress)
+            else:
+                progress_data = progress.to_dict()
+        
+        # Crear nueva sesión y contarla en las estadísticas del estudiante
+        session = StudentSession(student_id=student_data['id'])
         db.session.add(session)
-        db.session.commit()
         
-        # Obtener progreso del juego
-        user_id = student.get_user_id()
-        progress = GameProgress.query.filter_by(user_id=user_id).first()
-        
-        if not progress:
-            # Crear progreso si no existe
-            progress = GameProgress(user_id=user_id)
-            db.session.add(progress)
-            db.session.commit()
+        db.session.flush()
+        StudentStats.record_login(student_data['id'], session.session_start)
+        if created_progress is not None:
+            progress_data = created_progress.to_dict()
+        response_data = {
+            'student': student_data,
+            'progress': progress_data,
+            'session_id': session.id
+        }
+        db.session.commit()
+        cache.set(student_key(nip), student_data)
+        cache.set(progress_key(user_id), progress_data)
+        if created_progress is not None:
+            leaderboard.record_progress(created_progress, progress_data)
         
         return jsonify({
             'success': True,
-            'user': {
-                'student': student.to_dict(),
-                'progress': progress.to_dict(),
-                'session_id': session.id
-            },
+            'user': response_data,
             'message': 'Inicio de sesión exitoso'
         })
         
+    except OperationalError:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
@@ -172,6 +312,7 @@ def login_student(nip):
         }), 500
 
 @auth_bp.route('/logout/<int:session_id>', methods=['POST'])
+@retry_on_lock
 def logout_student(session_id):
     """Cierra la sesión del estudiante"""
     try:
@@ -193,16 +334,45 @@ def logout_student(session_id):
         if 'coins_earned' in data:
             session.coins_earned = data['coins_earned']
         
-        # Finalizar sesión
+        # Finalizar sesión (la duración sólo se suma a las estadísticas la primera vez)
+        already_closed = session.session_end is not None
         session.end_session()
+        
+        if write_behind.enabled:
+            # Los datos de cierre son telemetría: se escriben en el siguiente volcado
+            session_data = session.to_dict()
+            values = {
+                'id': session.id,
+                'session_end': session.session_end,
+                'duration_minutes': session.duration_minutes,
+                'modules_completed': session.modules_completed,
+                'activities_completed': session.activities_completed,
+                'coins_earned': session.coins_earned
+            }
+            db.session.expunge(session)
+            write_behind.update(StudentSession, values)
+            if not already_closed:
+                write_behind.call(StudentStats.record_logout, session_data['student_id'],
+                                  values['duration_minutes'], values['session_end'])
+            return jsonify({
+                'success': True,
+                'data': session_data,
+                'message': 'Sesión cerrada exitosamente'
+            })
+        
+        if not already_closed:
+            StudentStats.record_logout(session.student_id, session.duration_minutes, session.session_end)
+        session_data = session.to_dict()
         db.session.commit()
         
         return jsonify({
             'success': True,
-            'data': session.to_dict(),
+            'data': session_data,
             'message': 'Sesión cerrada exitosamente'
         })
         
+    except OperationalError:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
@@ -213,32 +383,28 @@ def logout_student(session_id):
 def get_student_info(nip):
     """Obtiene información del estudiante por NIP"""
     try:
-        student = Student.query.filter_by(nip=nip.upper(), activo=True).first()
+        nip = nip.upper()
+        student_data = cache.read_through(student_key(nip), lambda: load_student_dict(nip))
         
-        if not student:
+        if not student_data:
             return jsonify({
                 'success': False,
                 'error': 'Estudiante no encontrado'
             }), 404
         
-        # Obtener estadísticas de sesiones
-        total_sessions = StudentSession.query.filter_by(student_id=student.id).count()
-        total_time = db.session.query(db.func.sum(StudentSession.duration_minutes)).filter_by(student_id=student.id).scalar() or 0
+        # Obtener estadísticas de sesiones (precalculadas en login/logout)
+        stats = db.session.get(StudentStats, student_data['id']) or StudentStats(total_sessions=0, total_minutes=0)
         
         # Obtener progreso del juego
-        user_id = student.get_user_id()
-        progress = GameProgress.query.filter_by(user_id=user_id).first()
+        user_id = f'student_{nip}'
+        progress_data = cache.read_through(progress_key(user_id), lambda: load_progress_dict(user_id))
         
         return jsonify({
             'success': True,
             'data': {
-                'student': student.to_dict(),
-                'progress': progress.to_dict() if progress else None,
-                'statistics': {
-                    'total_sessions': total_sessions,
-                    'total_time_minutes': total_time,
-                    'average_session_time': round(total_time / total_sessions, 1) if total_sessions > 0 else 0
-                }
+                'student': student_data,
+                'progress': progress_data,
+                'statistics': stats.to_statistics()
             }
         })
         
@@ -248,31 +414,185 @@ def get_student_info(nip):
             'error': str(e)
         }), 500
 
+# Campos de ?fields= del historial de sesiones y su columna
+SESSION_FIELDS = {
+    'id': StudentSession.id,
+    'student_id': StudentSession.student_id,
+    'session_start': StudentSession.session_start,
+    'session_end': StudentSession.session_end,
+    'duration_minutes': StudentSession.duration_minutes,
+    'modules_completed': StudentSession.modules_completed,
+    'activities_completed': StudentSession.activities_completed,
+    'coins_earned': StudentSession.coins_earned
+}
+
+@auth_bp.route('/student/<nip>/sessions', methods=['GET'])
+def get_student_sessions(nip):
+    """Historial de sesiones del estudiante, de la más reciente a la más antigua
+
+    Parámetros opcionales: ?limit=, ?after=<session_start,id> (el next_cursor
+    de la página anterior), ?since=<fecha ISO> y ?fields=a,b,c.
+    """
+    try:
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            fields = parse_fields(request.args.get('fields'), SESSION_FIELDS)
+            after = parse_cursor(request.args['after']) if request.args.get('after') else None
+            since = parse_since(request.args.get('since'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        nip = nip.upper()
+        student_data = cache.read_through(student_key(nip), lambda: load_student_dict(nip))
+        if not student_data:
+            return jsonify({
+                'success': False,
+                'error': 'Estudiante no encontrado'
+            }), 404
+
+        # id y session_start se leen siempre para construir el cursor
+        query = db.session.query(
+            StudentSession.session_start, StudentSession.id, *(SESSION_FIELDS[field] for field in fields)
+        ).filter(StudentSession.student_id == student_data['id'])
+        if since:
+            query = query.filter(StudentSession.session_start > since)
+        if after:
+            query = query.filter(after_cursor(StudentSession.session_start, StudentSession.id, after))
+        rows = query.order_by(StudentSession.session_start.desc(), StudentSession.id.desc()).limit(limit).all()
+
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = encode_cursor(rows[-1][0], rows[-1][1])
+
+        return jsonify({
+            'success': True,
+            'data': project_rows((row[2:] for row in rows), fields, {'modules_completed': []}),
+            'next_cursor': next_cursor
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@auth_bp.cli.command('backfill-stats')
+def backfill_stats_command():
+    """Recalcula student_stats desde todas las sesiones"""
+    from src.migrations import backfill_student_stats
+    click.echo(f'{backfill_student_stats(force=True)} estudiantes con estadísticas')
+
+@auth_bp.cli.command('check-stats')
+@click.option('--fix/--no-fix', default=False, help='Corregir las diferencias encontradas')
+@click.option('--batch', default=1000, help='Estudiantes por lote')
+def check_stats_command(fix, batch):
+    """Compara student_stats con los agregados de student_sessions"""
+    from src.stats_checker import check_student_stats
+    max_id = db.session.query(db.func.max(Student.id)).scalar() or 0
+    inconsistent = sum(
+        check_student_stats(first_id, first_id + batch - 1, fix=fix)
+        for first_id in range(0, max_id + 1, batch)
+    )
+    click.echo(f'{inconsistent} estudiantes inconsistentes' + (' (corregidos)' if fix else ''))
+
+@auth_bp.cli.command('import-students')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dry-run', is_flag=True, help='Sólo validar, sin insertar')
+@click.option('--output', type=click.Path(dir_okay=False), help='CSV con los NIP asignados')
+def import_students_command(path, dry_run, output):
+    """Registra los estudiantes de un listado .csv o .json"""
+    from src.student_import import parse_roster, import_students
+    with open(path, 'rb') as source:
+        rows = parse_roster(source.read(), 'text/csv' if path.lower().endswith('.csv') else 'application/json')
+    report = import_students(rows, dry_run=dry_run)
+    for error in report['errors']:
+        click.echo(f"fila {error['row']}: {error['error']}", err=True)
+    if output:
+        with open(output, 'w', newline='', encoding='utf-8') as target:
+            writer = csv.DictWriter(target, fieldnames=['row', 'nip', 'nombre', 'apellidos'])
+            writer.writeheader()
+            writer.writerows(report['created'])
+    verb = 'válidos' if dry_run else 'registrados'
+    click.echo(f"{len(report['created'])} estudiantes {verb}, {len(report['errors'])} filas con errores")
+
+def roster_query(escuela=None, grado=None, after=None, limit=DEFAULT_LIMIT):
+    """Consulta única del listado: estudiantes + progreso + número de sesiones.
+
+    Sustituye las 2N+1 consultas anteriores por un solo SELECT con LEFT JOIN
+    a game_progress y a student_stats (número de sesiones precalculado). El
+    orden (created_at, id) sale del índice ix_students_activo_created_at.
+    """
+    query = db.session.query(
+        Student,
+        GameProgress,
+        db.func.coalesce(StudentStats.total_sessions, 0)
+    ).outerjoin(
+        GameProgress, GameProgress.user_id == db.literal('student_') + Student.nip
+    ).outerjoin(
+        StudentStats, StudentStats.student_id == Student.id
+    ).filter(Student.activo == True)
+
+    if escuela:
+        query = query.filter(Student.escuela == escuela)
+    if grado:
+        query = query.filter(Student.grado == grado)
+    if after:
+        query = query.filter(after_cursor(Student.created_at, Student.id, after))
+
+    return query.order_by(Student.created_at.desc(), Student.id.desc()).limit(limit)
+
+def roster_count(escuela=None, grado=None):
+    """Número de estudiantes activos del listado (COUNT sobre los índices de students)"""
+    query = db.session.query(db.func.count(Student.id)).filter(Student.activo == True)
+    if escuela:
+        query = query.filter(Student.escuela == escuela)
+    if grado:
+        query = query.filter(Student.grado == grado)
+    return query.scalar()
+
 @auth_bp.route('/students', methods=['GET'])
 def list_students():
-    """Lista todos los estudiantes registrados (para administradores)"""
+    """Lista los estudiantes registrados (para administradores)
+
+    Parámetros opcionales: ?escuela=, ?grado=, ?limit= (100 por defecto,
+    máximo 1000) y ?after=<created_at,id> (el valor de next_cursor de la
+    página anterior). total es el número de estudiantes del listado completo
+    y count el de esta página.
+    """
     try:
-        students = Student.query.filter_by(activo=True).order_by(Student.created_at.desc()).all()
-        
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            after = parse_cursor(request.args['after']) if request.args.get('after') else None
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        escuela = request.args.get('escuela')
+        grado = request.args.get('grado')
+        rows = roster_query(escuela=escuela, grado=grado, after=after, limit=limit).all()
+
         students_data = []
-        for student in students:
-            # Obtener progreso
-            user_id = student.get_user_id()
-            progress = GameProgress.query.filter_by(user_id=user_id).first()
-            
-            # Obtener estadísticas básicas
-            total_sessions = StudentSession.query.filter_by(student_id=student.id).count()
-            
+        for student, progress, total_sessions in rows:
             student_info = student.to_dict()
             student_info['progress'] = progress.to_dict() if progress else None
             student_info['total_sessions'] = total_sessions
-            
             students_data.append(student_info)
-        
+
+        next_cursor = None
+        if len(rows) == limit:
+            last = rows[-1][0]
+            next_cursor = encode_cursor(last.created_at, last.id)
+
         return jsonify({
             'success': True,
             'data': students_data,
-            'total': len(students_data)
+            'total': roster_count(escuela=escuela, grado=grado),
+            'count': len(students_data),
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
@@ -280,4 +600,3 @@ def list_students():
             'success': False,
             'error': str(e)
         }), 500
-
@@ -0,0 +1,1254 @@
+"""Benchmarks de la API de Aventura Financiera.
+
+Uso (desde el directorio backend):
+    python -m src.benchmark roster --students 10000 100000
+    python -m src.benchmark activities --batch-sizes 1 10 100
+    python -m src.benchmark concurrency --workers 1 4 16 --journal-mode WAL
+    python -m src.benchmark login-burst --logins 500 --seconds 10
+    python -m src.benchmark plans --rows 100000   # sale con código 1 si hay full scans
+    python -m src.benchmark analytics --students 50000 --activities 20
+    python -m src.benchmark serialize --rows 20000
+    python -m src.benchmark live --clients 0 10 1000   # sale con código 1 si las consultas dependen de los clientes
+    python -m src.benchmark server --profiles sync gthread gevent --sse-clients 0 20
+    python -m src.benchmark coins --workers 8 --users 2   # sale con código 1 si se pierde algún premio
+    python -m src.benchmark import --rows 10000 --single 500
+    python -m src.benchmark nips --allocations 100000   # sale con código 1 si se repite algún NIP
+    python -m src.benchmark flow --students 5000 --output flow.json --baseline anterior.json   # código 1 si empeora
+"""
+import os
+import sys
+# DON'T CHANGE THIS !!!
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import random
+import socket
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import event, insert
+from src.models.user import db
+from src.models.student import Student, StudentSession
+from src.models.game_progress import GameProgress, CompletedModule, EarnedBadge, ModuleActivity
+from src.models.high_score import HighScore, BestScore
+from src.models.coin_ledger import CoinLedgerEntry
+from src.migrations import backfill_best_scores
+from src.leaderboard import leaderboard
+from src.nip_allocator import nip_allocator
+from src.request_metrics import request_metrics
+from src.routes.game import game_bp, ACTIVITY_FIELDS, BEST_SCORE_FIELDS
+from src.routes.auth import auth_bp, SESSION_FIELDS
+from src.routes import analytics
+from src.routes.export import export_bp
+from src.routes.events import events_bp
+from src.pubsub import event_bus, InMemoryBroker
+from src import db_config
+from src.serialization import FastJSONProvider, orjson
+from src.pagination import project_rows
+from flask.json.provider import DefaultJSONProvider
+
+
+def create_bench_app(database_uri):
+    """Crea una app Flask aislada apuntando a una base de datos de pruebas"""
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    db_config.configure_database(app, database_uri)
+    app.register_blueprint(game_bp, url_prefix='/api/game')
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(analytics.analytics_bp, url_prefix='/api/analytics')
+    app.register_blueprint(export_bp, url_prefix='/api/export')
+    app.register_blueprint(events_bp, url_prefix='/api/events')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+class QueryCounter:
+    """Cuenta las sentencias SQL ejecutadas mientras está activo"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+class CommitCounter:
+    """Cuenta los COMMIT emitidos por el engine mientras está activo"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _on_commit(self, conn):
+        with self._lock:
+            self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'commit', self._on_commit)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'commit', self._on_commit)
+
+
+def percentile(sorted_values, fraction):
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    if not sorted_values:
+        return 0.0
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def make_nip(i):
+    """NIP sintético único de 6 caracteres"""
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    prefix = i // 10000
+    return letters[prefix // 26 % 26] + letters[prefix % 26] + f"{i % 10000:04d}"
+
+
+def seed_district(students, sessions_per_student=3, escuelas=20, chunk=5000,
+                  activities_per_student=0, high_scores_per_student=0):
+    """Inserta un distrito sintético: estudiantes, progreso, sesiones,
+    actividades y high scores"""
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    for start in range(0, students, chunk):
+        ids = range(start, min(start + chunk, students))
+        student_rows = []
+        progress_rows = []
+        for i in ids:
+            nip = make_nip(i)
+            student_rows.append({
+                'nip': nip,
+                'nombre': f'Alumno{i}',
+                'apellidos': 'Prueba Sintética',
+                'edad': rng.randint(6, 17),
+                'escuela': f'Escuela {i % escuelas}',
+                'grado': f'{rng.randint(1, 6)}° Primaria',
+                'fecha_nacimiento': date(2014, 1, 1),
+                'nombre_tutor': 'Tutor Prueba',
+                'email_tutor': f'tutor{i}@example.com',
+                'activo': True,
+                'created_at': now - timedelta(seconds=i),
+                'updated_at': now,
+            })
+            progress_rows.append({
+                'user_id': f'student_{nip}',
+                'coins': rng.randint(100, 500),
+                'level': rng.randint(1, 3),
+            })
+        db.session.execute(insert(Student), student_rows)
+        db.session.execute(insert(GameProgress), progress_rows)
+        db.session.commit()
+
+        first_id = db.session.query(Student.id).filter(Student.nip == make_nip(ids[0])).scalar()
+        first_progress_id = db.session.query(GameProgress.id).filter(
+            GameProgress.user_id == f'student_{make_nip(ids[0])}').scalar()
+        db.session.execute(insert(CompletedModule), [
+            {'progress_id': first_progress_id + offset, 'module_id': module_id, 'position': position}
+            for offset in range(len(ids))
+            for position, module_id in enumerate((1, 2))
+        ])
+        db.session.execute(insert(EarnedBadge), [
+            {'progress_id': first_progress_id + offset, 'name': 'Primer Paso', 'position': 0}
+            for offset in range(len(ids))
+        ])
+        session_rows = [
+            {
+                'student_id': first_id + offset,
+                'session_start': now,
+                'session_end': now,
+                'duration_minutes': rng.randint(5, 45),
+            }
+            for offset in range(len(ids))
+            for _ in range(sessions_per_student)
+        ]
+        if session_rows:
+            db.session.execute(insert(StudentSession), session_rows)
+
+        activity_rows = [
+            {
+                'user_id': f'student_{make_nip(i)}',
+                'module_id': n % 8 + 1,
+                'activity_type': 'quiz',
+                'activity_data': '{"answers": [1, 0, 2]}',
+                'score': rng.randint(0, 100),
+                'completed': True,
+                'completed_at': now,
+                'created_at': now - timedelta(seconds=i, minutes=n),
+            }
+            for i in ids
+            for n in range(activities_per_student)
+        ]
+        if activity_rows:
+            db.session.execute(insert(ModuleActivity), activity_rows)
+
+        high_score_rows = [
+            {
+                'student_nip': make_nip(i),
+                'module_id': n % 8 + 1,
+                'score': rng.randint(0, 100),
+                'achieved_at': now - timedelta(seconds=i, minutes=n),
+            }
+            for i in ids
+            for n in range(high_scores_per_student)
+        ]
+        if high_score_rows:
+            db.session.execute(insert(HighScore), high_score_rows)
+        db.session.commit()
+
+    if high_scores_per_student:
+        backfill_best_scores()
+
+
+def bench_roster(sizes, page_size, pages):
+    """Mide consultas SQL y latencia de GET /api/auth/students"""
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_bench_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            with app.app_context():
+                seed_district(size)
+                client = app.test_client()
+                url = f'/api/auth/students?limit={page_size}'
+                timings = []
+                with QueryCounter(db.engine) as counter:
+                    for _ in range(pages):
+                        start = time.perf_counter()
+                        response = client.get(url)
+                        timings.append(time.perf_counter() - start)
+                        cursor = response.get_json()['next_cursor']
+                        if not cursor:
+                            break
+                        url = f'/api/auth/students?limit={page_size}&after={cursor}'
+                timings.sort()
+                print(f"roster students={size} pages={len(timings)} "
+                      f"queries/page={counter.count / len(timings):.1f} "
+                      f"p50={timings[len(timings) // 2] * 1000:.1f}ms "
+                      f"max={timings[-1] * 1000:.1f}ms")
+
+
+def bench_activities(batch_sizes, total):
+    """Compara filas/seg de POST /activity frente a POST /activities/<id>/batch"""
+    activity = {
+        'module_id': 1,
+        'activity_type': 'quiz',
+        'score': 80,
+        'completed': True,
+        'activity_data': {'question': 1, 'answer': 'b'}
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_bench_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        client = app.test_client()
+
+        start = time.perf_counter()
+        for _ in range(total):
+            client.post('/api/game/activity/student_BENCH1', json=activity)
+        elapsed = time.perf_counter() - start
+        print(f"activities single rows={total} rows/s={total / elapsed:.0f}")
+
+        for size in batch_sizes:
+            batches = max(total // size, 1)
+            start = time.perf_counter()
+            for _ in range(batches):
+                client.post('/api/game/activities/student_BENCH1/batch', json=[activity] * size)
+            elapsed = time.perf_counter() - start
+            print(f"activities batch={size} rows={batches * size} "
+                  f"rows/s={batches * size / elapsed:.0f}")
+
+
+def _concurrent_writer(database_uri, worker, deadline, results):
+    app = create_bench_app(database_uri)
+    client = app.test_client()
+    ok = errors = 0
+    i = 0
+    while time.time() < deadline:
+        user_id = f'student_{make_nip(worker)}'
+        if i % 2:
+            response = client.post(f'/api/game/complete-module/{user_id}/{i % 8 + 1}', json={'score': 90})
+        else:
+            response = client.post(f'/api/game/activity/{user_id}',
+                                   json={'module_id': 1, 'activity_type': 'quiz', 'score': 50})
+        if response.status_code < 400:
+            ok += 1
+        else:
+            errors += 1
+        i += 1
+    results.put((ok, errors))
+
+
+def bench_concurrency(worker_counts, seconds, journal_mode):
+    """Escrituras/seg con varios procesos escribiendo en la misma base SQLite"""
+    db_config.SQLITE_PRAGMAS['journal_mode'] = journal_mode
+    context = multiprocessing.get_context('fork')
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            database_uri = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            app = create_bench_app(database_uri)
+            with app.app_context():
+                seed_district(workers, sessions_per_student=0)
+                db.engine.dispose()
+
+            results = context.Queue()
+            deadline = time.time() + seconds
+            processes = [
+                context.Process(target=_concurrent_writer, args=(database_uri, worker, deadline, results))
+                for worker in range(workers)
+            ]
+            for process in processes:
+                process.start()
+            totals = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+
+            ok = sum(t[0] for t in totals)
+            errors = sum(t[1] for t in totals)
+            print(f"concurrency journal={journal_mode} workers={workers} "
+                  f"writes/s={ok / seconds:.0f} errors={errors}")
+
+
+def _coin_awarder(database_uri, worker, users, deadline, results):
+    app = create_bench_app(database_uri)
+    client = app.test_client()
+    awarded = {}
+    ok = replayed = errors = 0
+    i = 0
+    while time.time() < deadline:
+        user_id = f'student_{make_nip(i % users)}'
+        key = f'{worker}-{i}'
+        # Uno de cada tres premios se reenvía con la misma clave (reintento del cliente)
+        for _ in range(2 if i % 3 == 0 else 1):
+            response = client.post(f'/api/game/complete-module/{user_id}/{i % 8 + 1}',
+                                   json={'score': 90}, headers={'Idempotency-Key': key})
+            body = response.get_json() or {}
+            if response.status_code >= 400:
+                errors += 1
+            elif body.get('replayed'):
+                replayed += 1
+            else:
+                ok += 1
+                awarded[user_id] = awarded.get(user_id, 0) + body['coins_earned']
+        i += 1
+    results.put((ok, replayed, errors, awarded))
+
+
+def bench_coins(worker_counts, users, seconds):
+    """Premios concurrentes de complete_module sobre pocos usuarios: el saldo
+    final debe ser el inicial más la suma de los premios confirmados"""
+    context = multiprocessing.get_context('fork')
+    lost_total = 0
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            database_uri = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            app = create_bench_app(database_uri)
+            with app.app_context():
+                seed_district(users, sessions_per_student=0)
+                initial = dict(db.session.query(GameProgress.user_id, GameProgress.coins).all())
+                db.engine.dispose()
+
+            results = context.Queue()
+            deadline = time.time() + seconds
+            processes = [
+                context.Process(target=_coin_awarder, args=(database_uri, worker, users, deadline, results))
+                for worker in range(workers)
+            ]
+            for process in processes:
+                process.start()
+            totals = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+
+            awarded = {}
+            for _, _, _, worker_awarded in totals:
+                for user_id, coins in worker_awarded.items():
+                    awarded[user_id] = awarded.get(user_id, 0) + coins
+            with app.app_context():
+                final = dict(db.session.query(GameProgress.user_id, GameProgress.coins).all())
+                ledger = dict(db.session.query(
+                    CoinLedgerEntry.user_id, db.func.sum(CoinLedgerEntry.delta)
+                ).group_by(CoinLedgerEntry.user_id).all())
+            lost = sum(abs(initial[user_id] + awarded.get(user_id, 0) - final[user_id]) for user_id in initial)
+            unledgered = sum(abs(awarded.get(user_id, 0) - (ledger.get(user_id) or 0)) for user_id in initial)
+            lost_total += lost + unledgered
+            print(f"coins workers={workers} users={users} "
+                  f"awards/s={sum(t[0] for t in totals) / seconds:.0f} "
+                  f"replayed={sum(t[1] for t in totals)} errors={sum(t[2] for t in totals)} "
+                  f"lost_coins={lost} ledger_mismatch={unledgered}")
+    return lost_total == 0
+
+
+NAMES = ['Ana', 'Luis', 'María', 'José', 'Sofía', 'Diego', 'Valeria', 'Mateo', 'Camila', 'Santiago']
+SURNAMES = ['García', 'López', 'Martínez', 'Hernández', 'Pérez', 'Sánchez', 'Ramírez', 'Torres']
+
+
+def synthetic_roster(rows, seed=11):
+    """Listado de registro con nombres repetidos: muchas colisiones de NIP"""
+    rng = random.Random(seed)
+    roster = []
+    for i in range(rows):
+        birth = date(2010, 1, 1) + timedelta(days=rng.randrange(365 * 8))
+        roster.append({
+            'nombre': rng.choice(NAMES),
+            'apellidos': f'{rng.choice(SURNAMES)} {rng.choice(SURNAMES)} {i}',
+            'edad': rng.randint(6, 17),
+            'escuela': f'Escuela {i % 20}',
+            'grado': f'{rng.randint(1, 6)}° Primaria',
+            'fechaNacimiento': birth.isoformat(),
+            'nombreTutor': 'Tutor Sintético',
+            'emailTutor': f'tutor{i}@example.com'
+        })
+    return roster
+
+
+def bench_import(rows, single):
+    """Filas/seg de POST /register/bulk frente a POST /register fila a fila"""
+    roster = synthetic_roster(rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_bench_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        with app.app_context():
+            leaderboard.rebuild()
+            engine = db.engine
+        client = app.test_client()
+
+        with QueryCounter(engine) as queries, CommitCounter(engine) as commits:
+            start = time.perf_counter()
+            response = client.post('/api/auth/register/bulk', json=roster)
+            elapsed = time.perf_counter() - start
+        report = response.get_json()['data']
+        print(f"import bulk rows={rows} created={len(report['created'])} errors={len(report['errors'])} "
+              f"rows/s={rows / elapsed:.0f} total={elapsed * 1000:.0f}ms "
+              f"queries={queries.count} commits={commits.count}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_bench_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        with app.app_context():
+            leaderboard.rebuild()
+            engine = db.engine
+        client = app.test_client()
+
+        rejected = 0
+        with QueryCounter(engine) as queries, CommitCounter(engine) as commits:
+            start = time.perf_counter()
+            for row in roster[:single]:
+                if client.post('/api/auth/register', json=row).status_code >= 400:
+                    rejected += 1
+            elapsed = time.perf_counter() - start
+        print(f"import single rows={single} rejected={rejected} rows/s={single / elapsed:.0f} "
+              f"queries/row={queries.count / single:.1f} commits/row={commits.count / single:.1f}")
+
+
+def _student_registrar(database_uri, worker, rows, results):
+    app = create_bench_app(database_uri)
+    client = app.test_client()
+    nips = []
+    errors = 0
+    for row in rows:
+        response = client.post('/api/auth/register', json=dict(row, apellidos=f"{row['apellidos']} {worker}"))
+        if response.status_code >= 400:
+            errors += 1
+        else:
+            nips.append(response.get_json()['data']['nip'])
+    results.put((nips, errors))
+
+
+def bench_nips(allocations, existing, workers, per_worker):
+    """Asignaciones/seg del índice de NIP con bases repetidas y registros
+    concurrentes de alumnos con el mismo NIP base desde varios procesos"""
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_bench_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        with app.app_context():
+            # Alumnos existentes con NIP reales (iniciales + DDMM) que chocan con los nuevos
+            now = datetime.utcnow()
+            taken = set()
+            while len(taken) < existing:
+                birth = date(2012, 1, 1) + timedelta(days=rng.randrange(366))
+                nip = nip_allocator.reserve(f"{rng.choice(NAMES)[0]}{rng.choice(SURNAMES)[0]}"
+                                            f"{birth.day:02d}{birth.month:02d}")
+                if nip is not None:
+                    taken.add(nip)
+            db.session.execute(insert(Student), [{
+                'nip': nip, 'nombre': 'Alumno', 'apellidos': f'Existente {i}', 'edad': 10,
+                'escuela': 'Escuela 0', 'grado': '4° Primaria', 'fecha_nacimiento': date(2012, 1, 1),
+                'nombre_tutor': 'Tutor', 'email_tutor': 'tutor@example.com', 'activo': True,
+                'created_at': now, 'updated_at': now
+            } for i, nip in enumerate(taken)])
+            db.session.commit()
+
+            with QueryCounter(db.engine) as load_queries:
+                start = time.perf_counter()
+                nip_allocator.load()
+                load_ms = (time.perf_counter() - start) * 1000
+
+            bases = []
+            for _ in range(allocations):
+                birth = date(2012, 1, 1) + timedelta(days=rng.randrange(366))
+                bases.append(f"{rng.choice(NAMES)[0]}{rng.choice(SURNAMES)[0]}{birth.day:02d}{birth.month:02d}")
+            with QueryCounter(db.engine) as queries:
+                start = time.perf_counter()
+                allocated = [nip_allocator.reserve(base) for base in bases]
+                elapsed = time.perf_counter() - start
+            assigned = [nip for nip in allocated if nip is not None]
+            duplicates = len(assigned) - len(set(assigned)) + len(taken.intersection(assigned))
+            print(f"nips allocations={allocations} existing={existing} load={load_ms:.0f}ms "
+                  f"load_queries={load_queries.count} allocations/s={allocations / elapsed:.0f} "
+                  f"queries={queries.count} exhausted={allocations - len(assigned)} duplicates={duplicates}")
+            db.engine.dispose()
+
+    context = multiprocessing.get_context('fork')
+    rows = synthetic_roster(per_worker)
+    # Todos los procesos registran los mismos nombres y fechas: mismo NIP base
+    for row in rows:
+        row['fechaNacimiento'] = f"2012-03-{rng.randint(1, 2):02d}"
+    with tempfile.TemporaryDirectory() as tmp:
+        database_uri = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        app = create_bench_app(database_uri)
+        with app.app_context():
+            # Índice vacío heredado por todos: eligen los mismos NIP y chocan en la BD
+            nip_allocator.load()
+            db.engine.dispose()
+        results = context.Queue()
+        processes = [
+            context.Process(target=_student_registrar, args=(database_uri, worker, rows, results))
+            for worker in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        totals = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        nips = [nip for worker_nips, _ in totals for nip in worker_nips]
+        concurrent_duplicates = len(nips) - len(set(nips))
+        errors = sum(t[1] for t in totals)
+        print(f"nips concurrent workers={workers} registrations={len(nips)} errors={errors} "
+              f"duplicates={concurrent_duplicates}")
+
+        # Índice desactualizado: el del proceso padre sigue vacío. Volver a
+        # registrar a los mismos alumnos debe rechazarse, no crear otra cuenta
+        client = app.test_client()
+        accepted = sum(
+            client.post('/api/auth/register', json=dict(row, apellidos=f"{row['apellidos']} 0")).status_code < 400
+            for row in rows
+        )
+        with app.app_context():
+            repeated_identities = db.session.query(
+                Student.nombre, Student.apellidos, Student.fecha_nacimiento
+            ).group_by(Student.nombre, Student.apellidos, Student.fecha_nacimiento).having(
+                db.func.count() > 1
+            ).count()
+            db.engine.dispose()
+        print(f"nips stale_index reregistered={len(rows)} accepted={accepted} "
+              f"repeated_students={repeated_identities}")
+    return duplicates == 0 and concurrent_duplicates == 0 and errors == 0 and accepted == 0 \
+        and repeated_identities == 0
+
+
+def bench_login_burst(logins, seconds, threads):
+    """Reproduce la campana de las 8:00: `logins` inicios de sesión repartidos
+    en `seconds` segundos, y reporta p50/p99 y commits por login"""
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_bench_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        with app.app_context():
+            seed_district(logins, sessions_per_student=5)
+            engine = db.engine
+
+        client = app.test_client()
+        interval = seconds / logins
+        start = time.perf_counter()
+
+        def login(i):
+            # Cada login sale en su instante programado dentro de la ráfaga
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            began = time.perf_counter()
+            response = client.get(f'/api/auth/login/{make_nip(i)}')
+            return time.perf_counter() - began, response.status_code
+
+        with CommitCounter(engine) as commits, ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(login, range(logins)))
+
+        timings = sorted(elapsed for elapsed, _ in results)
+        errors = sum(1 for _, status in results if status >= 400)
+        print(f"login-burst logins={logins} seconds={seconds} "
+              f"p50={percentile(timings, 0.5) * 1000:.1f}ms "
+              f"p99={percentile(timings, 0.99) * 1000:.1f}ms "
+              f"commits/login={commits.count / logins:.2f} errors={errors}")
+
+
+# Tablas que el chequeo de planes siembra con muchas filas
+PLAN_CHECKED_TABLES = {
+    'students', 'game_progress', 'student_sessions', 'module_activities',
+    'high_scores', 'best_scores', 'progress_completed_modules', 'progress_badges',
+    'coin_ledger',
+}
+
+
+class StatementRecorder:
+    """Guarda las sentencias SELECT/UPDATE/DELETE ejecutadas y su endpoint"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.label = None
+        self.statements = []
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany or statement.lstrip().upper().startswith(('PRAGMA', 'EXPLAIN')):
+            return
+        self.statements.append((self.label, statement, parameters))
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+# Lecturas completas intencionadas: la reconstrucción del leaderboard en memoria
+PLAN_ALLOWED_SCANS = {
+    ('leaderboard rebuild', 'game_progress'),
+    ('leaderboard rebuild', 'best_scores'),
+}
+
+
+def full_scans(label, plan_rows):
+    """Tablas recorridas completas ('SCAN <tabla>' sin índice) en un plan de SQLite"""
+    scans = []
+    for row in plan_rows:
+        detail = row[-1]
+        if not detail.startswith('SCAN '):
+            continue
+        table = detail.split()[1]
+        if (table in PLAN_CHECKED_TABLES and 'USING' not in detail
+                and (label, table) not in PLAN_ALLOWED_SCANS):
+            scans.append(detail)
+    return scans
+
+
+def check_query_plans(rows):
+    """Ejecuta cada endpoint sobre tablas con `rows` filas y revisa con
+    EXPLAIN QUERY PLAN que ninguna consulta recorra una tabla completa.
+
+    Devuelve la lista de fallos (endpoint, sql, detalle del plan).
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_bench_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        with app.app_context():
+            seed_district(rows, sessions_per_student=1, activities_per_student=1,
+                          high_scores_per_student=1)
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+
+            client = app.test_client()
+            nip = make_nip(rows // 2)
+            user_id = f'student_{nip}'
+            cursor = client.get('/api/auth/students?limit=5').get_json()['next_cursor']
+            # Altas nuevas (nombres distintos de los sembrados)
+            roster = synthetic_roster(4, seed=rows)
+            since = (datetime.utcnow() - timedelta(minutes=1)).isoformat()
+            endpoints = [
+                ('GET', f'/api/auth/login/{nip}', None),
+                ('GET', f'/api/auth/student/{nip}', None),
+                ('GET', '/api/auth/students?limit=100', None),
+                ('GET', f'/api/auth/students?limit=100&after={cursor}', None),
+                ('GET', '/api/auth/students?limit=100&escuela=Escuela%203', None),
+                ('POST', '/api/auth/logout/1', {'coins_earned': 10}),
+                ('POST', '/api/auth/register', roster[0]),
+                ('POST', '/api/auth/register/bulk', roster[1:]),
+                ('GET', f'/api/game/progress/{user_id}', None),
+                ('POST', f'/api/game/progress/{user_id}', {'level': 2}),
+                ('POST', f'/api/game/complete-module/{user_id}/3', {'score': 95}),
+                ('POST', f'/api/game/activity/{user_id}', {'module_id': 1, 'activity_type': 'quiz'}),
+                ('POST', f'/api/game/activities/{user_id}/batch', [{'module_id': 1, 'activity_type': 'quiz'}]),
+                ('GET', f'/api/game/activities/{user_id}', None),
+                ('GET', f'/api/game/activities/{user_id}?module_id=1&since={since}&fields=id,score', None),
+                ('GET', f'/api/auth/student/{nip}/sessions', None),
+                ('GET', '/api/game/leaderboard', None),
+                ('GET', f'/api/game/leaderboard/rank/{user_id}', None),
+                ('GET', '/api/game/highscores', None),
+                ('GET', '/api/game/highscores?module_id=3', None),
+                ('GET', f'/api/game/highscores/student/{nip}', None),
+                ('POST', f'/api/game/reset/{user_id}', None),
+                ('GET', f'/api/export/activities?since={since}', None),
+                ('GET', f'/api/export/sessions?since={since}', None),
+                ('GET', f'/api/export/highscores?since={since}', None),
+            ]
+
+            with StatementRecorder(db.engine) as recorder:
+                recorder.label = 'leaderboard rebuild'
+                leaderboard.rebuild()
+                for method, url, body in endpoints:
+                    recorder.label = f'{method} {url}'
+                    client.open(url, method=method, json=body).get_data()  # consume el streaming
+
+            failures = []
+            for label, statement, parameters in recorder.statements:
+                plan = db.session.connection().exec_driver_sql(
+                    'EXPLAIN QUERY PLAN ' + statement, parameters
+                ).all()
+                for detail in full_scans(label, plan):
+                    failures.append((label, statement, detail))
+            db.session.rollback()
+            return failures
+
+
+def bench_analytics(students, activities_per_student, repeats):
+    """Tiempo de carga (SQL -> columnas) y de agregación vectorizada de la
+    analítica sobre students * activities_per_student actividades"""
+    if analytics.np is None:
+        print('analytics requiere NumPy')
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_bench_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        with app.app_context():
+            seed_district(students, activities_per_student=activities_per_student,
+                          high_scores_per_student=2)
+            group_by = ('escuela', 'grado')
+
+            def timed(function, *args):
+                best = None
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    result = function(*args)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                return result, best
+
+            student_groups, load_groups = timed(analytics.load_student_groups, group_by)
+            cases = [
+                ('scores', analytics.load_activity_scores, analytics.compute_scores),
+                ('modules', analytics.load_completions, analytics.compute_completion),
+                ('time-on-task', analytics.load_session_minutes, analytics.compute_time_on_task),
+            ]
+            for name, load, compute in cases:
+                data, load_seconds = timed(load)
+                _, compute_seconds = timed(compute, *student_groups, *data)
+                print(f"analytics {name} rows={len(data[0])} groups={len(student_groups[2])} "
+                      f"load={(load_seconds + load_groups) * 1000:.0f}ms "
+                      f"compute={compute_seconds * 1000:.0f}ms")
+
+            client = app.test_client()
+            start = time.perf_counter()
+            response = client.get('/api/analytics/scores?group_by=escuela,grado')
+            print(f"analytics GET /api/analytics/scores status={response.status_code} "
+                  f"total={(time.perf_counter() - start) * 1000:.0f}ms")
+
+
+def bench_serialization(rows, repeats):
+    """Filas/seg serializadas por modelo: ORM + to_dict() con el json de
+    Flask, ORM + to_dict() con orjson, y tuplas de la consulta con orjson"""
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_bench_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        with app.app_context():
+            students = max(rows // 10, 1)
+            seed_district(students, sessions_per_student=10, activities_per_student=10,
+                          high_scores_per_student=10)
+            stdlib = DefaultJSONProvider(app)
+            fast = FastJSONProvider(app)
+            high_score_fields = {
+                'id': HighScore.id, 'student_nip': HighScore.student_nip, 'score': HighScore.score,
+                'module_id': HighScore.module_id, 'achieved_at': HighScore.achieved_at
+            }
+            models = [
+                (Student, None, {}),
+                (GameProgress, None, {}),
+                (ModuleActivity, ACTIVITY_FIELDS, {'activity_data': {}}),
+                (StudentSession, SESSION_FIELDS, {'modules_completed': []}),
+                (HighScore, high_score_fields, {}),
+                (BestScore, BEST_SCORE_FIELDS, {}),
+            ]
+
+            def best_of(function):
+                best = None
+                for _ in range(repeats):
+                    db.session.expunge_all()
+                    start = time.perf_counter()
+                    count = function()
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                return count / best
+
+            print(f"serialize encoder={'orjson' if orjson is not None else 'json (orjson no instalado)'}")
+            for model, fields, json_defaults in models:
+                def orm(provider):
+                    data = [item.to_dict() for item in model.query.limit(rows).all()]
+                    provider.dumps(data)
+                    return len(data)
+
+                def tuples():
+                    result = db.session.query(*fields.values()).limit(rows).all()
+                    fast.dumps(project_rows(result, list(fields), json_defaults))
+                    return len(result)
+
+                results = [
+                    ('orm+json', best_of(lambda: orm(stdlib))),
+                    ('orm+orjson', best_of(lambda: orm(fast))),
+                ]
+                if fields:
+                    results.append(('tuplas+orjson', best_of(tuples)))
+                print(f"serialize {model.__tablename__} " + ' '.join(
+                    f"{name}={rate:.0f}filas/s" for name, rate in results
+                ))
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def start_gunicorn(profile, database_uri, port):
+    """Arranca gunicorn con gunicorn.conf.py y espera a que responda"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, GUNICORN_PROFILE=profile, DATABASE_URL=database_uri, PORT=str(port))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(here, 'gunicorn.conf.py'),
+         '--chdir', here, 'main:app'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            connection.request('GET', '/api/game/modules')
+            if connection.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+        if server.poll() is not None:
+            break
+    server.terminate()
+    raise RuntimeError(f'gunicorn ({profile}) no arrancó')
+
+
+def open_sse_clients(port, count):
+    """Conexiones SSE que se quedan abiertas sin leer (clientes lentos)"""
+    sockets = []
+    for _ in range(count):
+        client = socket.create_connection(('127.0.0.1', port))
+        client.sendall(b'GET /api/events/leaderboard HTTP/1.1\r\nHost: bench\r\n'
+                       b'Accept: text/event-stream\r\n\r\n')
+        sockets.append(client)
+    return sockets
+
+
+def drive_load(port, students, seconds, concurrency):
+    """Mezcla login -> progreso -> ranking -> complete_module desde
+    `concurrency` hilos; devuelve latencias y errores"""
+    deadline = time.time() + seconds
+    timings, errors = [], []
+
+    def run(worker):
+        rng = random.Random(worker)
+        i = 0
+        while time.time() < deadline:
+            nip = make_nip(rng.randrange(students))
+            method, path = [
+                ('GET', f'/api/auth/login/{nip}'),
+                ('GET', f'/api/game/progress/student_{nip}'),
+                ('GET', '/api/game/leaderboard'),
+                ('POST', f'/api/game/complete-module/student_{nip}/{rng.randint(1, 8)}'),
+            ][i % 4]
+            i += 1
+            began = time.perf_counter()
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+                body = '{"score": 85}' if method == 'POST' else None
+                connection.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                connection.close()
+                if response.status >= 500:
+                    errors.append(response.status)
+                    continue
+            except OSError as e:
+                errors.append(type(e).__name__)
+                continue
+            timings.append(time.perf_counter() - began)
+
+    threads = [threading.Thread(target=run, args=(worker,)) for worker in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(timings), errors
+
+
+def bench_server(profiles, students, seconds, concurrency, sse_counts):
+    """Peticiones/seg y p99 de gunicorn con cada perfil de workers, con y sin
+    conexiones SSE abiertas ocupando el servidor"""
+    with tempfile.TemporaryDirectory() as tmp:
+        database_uri = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        app = create_bench_app(database_uri)
+        with app.app_context():
+            seed_district(students)
+            db.engine.dispose()
+
+        for profile in profiles:
+            for sse_clients in sse_counts:
+                port = free_port()
+                server = start_gunicorn(profile, database_uri, port)
+                sse = open_sse_clients(port, sse_clients)
+                try:
+                    timings, errors = drive_load(port, students, seconds, concurrency)
+                finally:
+                    for client in sse:
+                        client.close()
+                    server.terminate()
+                    server.wait()
+                print(f"server profile={profile} sse_clients={sse_clients} concurrency={concurrency} "
+                      f"requests/s={len(timings) / seconds:.0f} "
+                      f"p50={percentile(timings, 0.5) * 1000:.1f}ms "
+                      f"p99={percentile(timings, 0.99) * 1000:.1f}ms errors={len(errors)}")
+
+
+def bench_live(client_counts, completions, broker):
+    """Consultas SQL por complete_module con N clientes SSE conectados al
+    ranking: deben ser las mismas con 0 que con 1000 clientes"""
+    results = []
+    for clients in client_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_bench_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            event_bus.use(InMemoryBroker() if broker == 'memory' else None, broker)
+            with app.app_context():
+                seed_district(completions)
+                leaderboard.rebuild()
+                engine = db.engine
+            client = app.test_client()
+
+            with QueryCounter(engine) as connect_queries:
+                streams = [client.get('/api/events/leaderboard', buffered=False) for _ in range(clients)]
+            frames = [0] * clients
+
+            def read(index):
+                for chunk in streams[index].response:
+                    text = chunk.decode() if isinstance(chunk, bytes) else chunk
+                    if text.startswith('event: end'):
+                        break
+                    if text.startswith('event: '):
+                        frames[index] += 1
+                streams[index].close()
+
+            readers = [threading.Thread(target=read, args=(i,), daemon=True) for i in range(clients)]
+            for reader in readers:
+                reader.start()
+
+            rng = random.Random(7)
+            start = time.perf_counter()
+            with QueryCounter(engine) as write_queries:
+                for i in range(completions):
+                    client.post(f'/api/game/complete-module/student_{make_nip(i)}/{rng.randint(1, 8)}',
+                                json={'score': rng.randint(50, 100)})
+            elapsed = time.perf_counter() - start
+            event_bus.publish('leaderboard', 'end', {})
+            for reader in readers:
+                reader.join()
+
+            per_completion = write_queries.count / completions
+            results.append(per_completion)
+            print(f"live broker={broker} clients={clients} completions={completions} "
+                  f"queries/completion={per_completion:.1f} connect_queries={connect_queries.count} "
+                  f"frames/client={sum(frames) / clients if clients else 0:.1f} "
+                  f"completions/s={completions / elapsed:.0f} "
+                  f"subscribers_left={event_bus.stats()['subscribers']}")
+    event_bus.use(None)
+    return len(set(results)) <= 1
+
+
+# Pasos del flujo de un alumno: nombre -> (método, regla de la ruta)
+FLOW_STEPS = {
+    'login': ('GET', '/api/auth/login/<nip>'),
+    'activity': ('POST', '/api/game/activity/<user_id>'),
+    'complete_module': ('POST', '/api/game/complete-module/<user_id>/<int:module_id>'),
+    'leaderboard': ('GET', '/api/game/leaderboard'),
+}
+
+
+def git_commit():
+    """Commit actual del repositorio, o None fuera de git"""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_flows(app, students, flows, threads, activities_per_flow, seed):
+    """Ejecuta `flows` flujos login -> actividades -> complete_module ->
+    ranking por hilo; devuelve latencias por paso, errores y duración"""
+    timings = {step: [] for step in FLOW_STEPS}
+    errors = {step: 0 for step in FLOW_STEPS}
+    lock = threading.Lock()
+
+    def run(worker):
+        client = app.test_client()
+        rng = random.Random(seed * 1000 + worker)
+        local = {step: [] for step in FLOW_STEPS}
+        failed = {step: 0 for step in FLOW_STEPS}
+        for _ in range(flows):
+            nip = make_nip(rng.randrange(students))
+            user_id = f'student_{nip}'
+            requests = [('login', 'GET', f'/api/auth/login/{nip}', None)]
+            requests += [
+                ('activity', 'POST', f'/api/game/activity/{user_id}',
+                 {'module_id': rng.randint(1, 8), 'activity_type': 'quiz', 'score': rng.randint(0, 100)})
+                for _ in range(activities_per_flow)
+            ]
+            requests += [
+                ('complete_module', 'POST', f'/api/game/complete-module/{user_id}/{rng.randint(1, 8)}',
+                 {'score': rng.randint(50, 100)}),
+                ('leaderboard', 'GET', '/api/game/leaderboard', None),
+            ]
+            for step, method, path, body in requests:
+                began = time.perf_counter()
+                response = client.open(path, method=method, json=body)
+                local[step].append(time.perf_counter() - began)
+                if response.status_code >= 400:
+                    failed[step] += 1
+        with lock:
+            for step in FLOW_STEPS:
+                timings[step].extend(local[step])
+                errors[step] += failed[step]
+
+    workers = [threading.Thread(target=run, args=(worker,)) for worker in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return timings, errors, time.perf_counter() - start
+
+
+def bench_flow(students, sessions, activities, high_scores, flows, threads, activities_per_flow, seed):
+    """Flujo completo de alumnos contra la app real: throughput, p50/p95/p99
+    y consultas SQL por endpoint, como un diccionario serializable a JSON"""
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_bench_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        request_metrics.init_app(app)
+        with app.app_context():
+            seed_district(students, sessions_per_student=sessions, activities_per_student=activities,
+                          high_scores_per_student=high_scores)
+            leaderboard.rebuild()
+
+        # Calentamiento (cachés, primeras conexiones) fuera de la medición
+        run_flows(app, students, 5, 1, activities_per_flow, seed + 1)
+        request_metrics.reset()
+        timings, errors, elapsed = run_flows(app, students, flows, threads, activities_per_flow, seed)
+        server = request_metrics.snapshot()
+
+    endpoints = {}
+    for step, (method, route) in FLOW_STEPS.items():
+        samples = sorted(timings[step])
+        totals = server.get((route, method), {'requests': 0, 'sql_queries': 0, 'sql_seconds': 0, 'bytes': 0,
+                                              'exceptions': 0})
+        handled = totals['requests'] or 1
+        endpoints[step] = {
+            'method': method,
+            'route': route,
+            'requests': len(samples),
+            'errors': errors[step],
+            'throughput_rps': round(len(samples) / elapsed, 1),
+            'latency_ms': {
+                'mean': round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0,
+                'p50': round(percentile(samples, 0.50) * 1000, 3),
+                'p95': round(percentile(samples, 0.95) * 1000, 3),
+                'p99': round(percentile(samples, 0.99) * 1000, 3),
+                'max': round(samples[-1] * 1000, 3) if samples else 0.0,
+            },
+            'queries_per_request': round(totals['sql_queries'] / handled, 2),
+            'sql_ms_per_request': round(totals['sql_seconds'] * 1000 / handled, 3),
+            'bytes_per_request': round(totals['bytes'] / handled),
+            'db_exceptions': totals['exceptions'],
+        }
+
+    total_requests = sum(endpoint['requests'] for endpoint in endpoints.values())
+    return {
+        'benchmark': 'flow',
+        'commit': git_commit(),
+        'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': sys.version.split()[0],
+        'sqlite': sqlite3.sqlite_version,
+        'config': {
+            'students': students, 'sessions_per_student': sessions,
+            'activities_per_student': activities, 'high_scores_per_student': high_scores,
+            'flows_per_thread': flows, 'threads': threads,
+            'activities_per_flow': activities_per_flow, 'seed': seed,
+        },
+        'duration_s': round(elapsed, 3),
+        'requests': total_requests,
+        'errors': sum(endpoint['errors'] for endpoint in endpoints.values()),
+        'throughput_rps': round(total_requests / elapsed, 1),
+        'endpoints': endpoints,
+    }
+
+
+def flow_regressions(report, baseline, tolerance):
+    """Diferencias con un informe anterior: más consultas por petición (son
+    deterministas), o p95/throughput peores que la tolerancia relativa"""
+    regressions = []
+    for step, current in report['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(step)
+        if previous is None:
+            continue
+        if current['queries_per_request'] > previous['queries_per_request'] + 0.01:
+            regressions.append(f"{step}: consultas/petición {previous['queries_per_request']} -> "
+                               f"{current['queries_per_request']}")
+        if current['latency_ms']['p95'] > previous['latency_ms']['p95'] * (1 + tolerance):
+            regressions.append(f"{step}: p95 {previous['latency_ms']['p95']} ms -> {current['latency_ms']['p95']} ms")
+        if current['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{step}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} req/s")
+        if current['errors'] > previous['errors']:
+            regressions.append(f"{step}: errores {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks de Aventura Financiera')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    roster = subparsers.add_parser('roster', help='Listado de estudiantes paginado')
+    roster.add_argument('--students', type=int, nargs='+', default=[10000, 100000])
+    roster.add_argument('--page-size', type=int, default=100)
+    roster.add_argument('--pages', type=int, default=20)
+
+    activities = subparsers.add_parser('activities', help='Ingesta de actividades individual vs por lotes')
+    activities.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 10, 100])
+    activities.add_argument('--rows', type=int, default=2000)
+
+    concurrency = subparsers.add_parser('concurrency', help='Escrituras concurrentes desde varios procesos')
+    concurrency.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+    concurrency.add_argument('--seconds', type=float, default=5)
+    concurrency.add_argument('--journal-mode', default='WAL', help='WAL o DELETE para comparar')
+
+    burst = subparsers.add_parser('login-burst', help='Ráfaga de inicios de sesión (8:00 a.m.)')
+    burst.add_argument('--logins', type=int, default=500)
+    burst.add_argument('--seconds', type=float, default=10)
+    burst.add_argument('--threads', type=int, default=32)
+
+    plans = subparsers.add_parser('plans', help='Falla si alguna consulta de un endpoint recorre una tabla completa')
+    plans.add_argument('--rows', type=int, default=100000)
+
+    analytics_parser = subparsers.add_parser('analytics', help='Agregaciones de analítica sobre ~1M actividades')
+    analytics_parser.add_argument('--students', type=int, default=50000)
+    analytics_parser.add_argument('--activities', type=int, default=20, help='actividades por estudiante')
+    analytics_parser.add_argument('--repeats', type=int, default=3)
+
+    serialize = subparsers.add_parser('serialize', help='Throughput de serialización JSON por modelo')
+    serialize.add_argument('--rows', type=int, default=20000)
+    serialize.add_argument('--repeats', type=int, default=3)
+
+    coins = subparsers.add_parser('coins', help='Premios concurrentes sin actualizaciones perdidas')
+    coins.add_argument('--workers', type=int, nargs='+', default=[1, 8])
+    coins.add_argument('--users', type=int, default=2)
+    coins.add_argument('--seconds', type=float, default=5)
+
+    import_parser = subparsers.add_parser('import', help='Alta masiva de estudiantes frente a /register')
+    import_parser.add_argument('--rows', type=int, default=10000)
+    import_parser.add_argument('--single', type=int, default=500, help='filas registradas una a una para comparar')
+
+    nips = subparsers.add_parser('nips', help='Asignación de NIP con colisiones, en memoria y entre procesos')
+    nips.add_argument('--allocations', type=int, default=100000)
+    nips.add_argument('--existing', type=int, default=5000, help='alumnos ya registrados')
+    nips.add_argument('--workers', type=int, default=4)
+    nips.add_argument('--per-worker', type=int, default=40, help='registros por proceso')
+
+    flow = subparsers.add_parser('flow', help='Flujo login -> actividades -> complete_module -> ranking, informe JSON')
+    flow.add_argument('--students', type=int, default=5000)
+    flow.add_argument('--sessions', type=int, default=3, help='sesiones por estudiante')
+    flow.add_argument('--activities', type=int, default=10, help='actividades por estudiante')
+    flow.add_argument('--high-scores', type=int, default=5, help='high scores por estudiante')
+    flow.add_argument('--flows', type=int, default=200, help='flujos por hilo')
+    flow.add_argument('--threads', type=int, default=1, help='más de uno añade contención y ruido a las latencias')
+    flow.add_argument('--activities-per-flow', type=int, default=3)
+    flow.add_argument('--seed', type=int, default=1)
+    flow.add_argument('--output', default=None, help='Fichero JSON (por defecto la salida estándar)')
+    flow.add_argument('--baseline', default=None, help='Informe anterior con el que comparar')
+    flow.add_argument('--tolerance', type=float, default=0.25,
+                      help='empeoramiento relativo admitido de p95 y throughput')
+
+    live = subparsers.add_parser('live', help='Consultas SQL con muchos clientes SSE conectados')
+    live.add_argument('--clients', type=int, nargs='+', default=[0, 10, 1000])
+    live.add_argument('--completions', type=int, default=200)
+    live.add_argument('--broker', choices=['local', 'memory'], default='local')
+
+    server = subparsers.add_parser('server', help='Perfiles de gunicorn (sync/gthread/gevent) bajo carga')
+    server.add_argument('--profiles', nargs='+', default=['sync', 'gthread', 'gevent'])
+    server.add_argument('--students', type=int, default=2000)
+    server.add_argument('--seconds', type=float, default=10)
+    server.add_argument('--concurrency', type=int, default=32)
+    server.add_argument('--sse-clients', type=int, nargs='+', default=[0, 20])
+
+    args = parser.parse_args(argv)
+    if args.command == 'roster':
+        bench_roster(args.students, args.page_size, args.pages)
+    elif args.command == 'activities':
+        bench_activities(args.batch_sizes, args.rows)
+    elif args.command == 'concurrency':
+        bench_concurrency(args.workers, args.seconds, args.journal_mode)
+    elif args.command == 'login-burst':
+        bench_login_burst(args.logins, args.seconds, args.threads)
+    elif args.command == 'plans':
+        failures = check_query_plans(args.rows)
+        for label, statement, detail in failures:
+            print(f"FULL SCAN {detail} en {label}:\n    {' '.join(statement.split())}")
+        print(f"plans rows={args.rows} full_scans={len(failures)}")
+        sys.exit(1 if failures else 0)
+    elif args.command == 'analytics':
+        bench_analytics(args.students, args.activities, args.repeats)
+    elif args.command == 'serialize':
+        bench_serialization(args.rows, args.repeats)
+    elif args.command == 'coins':
+        consistent = bench_coins(args.workers, args.users, args.seconds)
+        print(f"coins lost_updates={'0' if consistent else 'SÍ'}")
+        sys.exit(0 if consistent else 1)
+    elif args.command == 'import':
+        bench_import(args.rows, args.single)
+    elif args.command == 'nips':
+        unique = bench_nips(args.allocations, args.existing, args.workers, args.per_worker)
+        print(f"nips unique={unique}")
+        sys.exit(0 if unique else 1)
+    elif args.command == 'flow':
+        report = bench_flow(args.students, args.sessions, args.activities, args.high_scores,
+                            args.flows, args.threads, args.activities_per_flow, args.seed)
+        text = json.dumps(report, indent=2, ensure_ascii=False)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+        else:
+            print(text)
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                regressions = flow_regressions(report, json.load(f), args.tolerance)
+            for regression in regressions:
+                print(f'REGRESIÓN {regression}', file=sys.stderr)
+            sys.exit(1 if regressions else 0)
+    elif args.command == 'live':
+        constant = bench_live(args.clients, args.completions, args.broker)
+        print(f"live constant_queries={constant}")
+        sys.exit(0 if constant else 1)
+    elif args.command == 'server':
+        bench_server(args.profiles, args.students, args.seconds, args.concurrency, args.sse_clients)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""Caché de lectura (read-through) para estudiantes y progreso.
+
+get_student_info, login_student y get_user_progress consultan Student por NIP
+y GameProgress por user_id en cada petición, aunque esas filas sólo cambian
+al escribir progreso. Aquí se guardan sus to_dict() y las rutas que escriben
+actualizan o invalidan las entradas.
+
+Backends (CACHE_BACKEND):
+- lru (por defecto): LRU en proceso con TTL (CACHE_TTL, CACHE_MAX_ENTRIES).
+  Cada worker de gunicorn tiene su propia copia, por eso el TTL es corto.
+- redis: compartido entre workers (CACHE_REDIS_URL, requiere el paquete redis).
+- memory: la misma interfaz Redis sobre InMemoryRedis, para pruebas.
+- none: desactivado.
+
+Los valores devueltos son compartidos: no deben modificarse.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:  # El backend redis es opcional
+    redis = None
+
+from src.serialization import dumps, loads
+
+
+class LRUCache:
+    """LRU en memoria con caducidad por entrada"""
+
+    def __init__(self, max_entries=10000, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class InMemoryRedis:
+    """Sustituto en memoria del cliente redis (get/set con ex/delete/flushdb)"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+        return True
+
+
+class RedisCache:
+    """Adaptador de un cliente redis (o InMemoryRedis) con valores JSON"""
+
+    def __init__(self, client, ttl=30, prefix='aventura:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return loads(raw) if raw is not None else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, dumps(value), ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        self.client.flushdb()
+
+
+class NullCache:
+    """Backend desactivado: nunca guarda nada"""
+    evictions = 0
+    expirations = 0
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class ReadThroughCache:
+    """Fachada con contadores sobre el backend configurado"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or LRUCache()
+        self.name = 'lru'
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        """Elige el backend a partir de las variables de entorno"""
+        name = os.environ.get('CACHE_BACKEND', 'lru')
+        ttl = int(os.environ.get('CACHE_TTL', '30'))
+        if name == 'lru':
+            backend = LRUCache(int(os.environ.get('CACHE_MAX_ENTRIES', '10000')), ttl)
+        elif name == 'redis':
+            if redis is None:
+                raise RuntimeError('CACHE_BACKEND=redis requiere el paquete redis')
+            backend = RedisCache(redis.Redis.from_url(os.environ['CACHE_REDIS_URL']), ttl)
+        elif name == 'memory':
+            backend = RedisCache(InMemoryRedis(), ttl)
+        elif name == 'none':
+            backend = NullCache()
+        else:
+            raise RuntimeError(f'CACHE_BACKEND desconocido: {name}')
+        self.use(backend, name)
+
+    def use(self, backend, name=None):
+        """Sustituye el backend (y reinicia los contadores)"""
+        self.backend = backend
+        self.name = name or type(backend).__name__
+        self.hits = self.misses = self.invalidations = 0
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def delete(self, key):
+        self.backend.delete(key)
+        with self._lock:
+            self.invalidations += 1
+
+    def read_through(self, key, loader):
+        """Devuelve la entrada cacheada o la carga con loader() y la guarda.
+
+        Si loader() devuelve None no se guarda nada.
+        """
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': self.name,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+                'invalidations': self.invalidations,
+                'evictions': self.backend.evictions,
+                'expirations': self.backend.expirations,
+                'entries': len(self.backend) if hasattr(self.backend, '__len__') else None
+            }
+
+
+def student_key(nip):
+    return f'student:{nip}'
+
+
+def progress_key(user_id):
+    return f'progress:{user_id}'
+
+
+cache = ReadThroughCache()
@@ -0,0 +1,101 @@
+"""Compactación del libro de monedas (coin_ledger).
+
+El saldo vive en game_progress.coins, así que las entradas antiguas sólo
+sirven de historial. compact_coin_ledger sustituye, por lotes de usuarios,
+todas las entradas anteriores a COIN_LEDGER_RETENTION_DAYS días por una sola
+entrada 'compactado' con su suma: la suma del libro no cambia y la tabla deja
+de crecer con la actividad. Las claves de idempotencia de esas entradas se
+descartan (un reintento llega en segundos, no en días).
+
+Con COIN_LEDGER_COMPACT_INTERVAL > 0 (segundos) corre en un hilo en segundo
+plano; `flask game compact-ledger` la lanza a mano.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert
+from src.models.user import db
+from src.models.coin_ledger import CoinLedgerEntry
+
+COMPACTED_REASON = 'compactado'
+
+
+def compact_coin_ledger(retention_days, chunk_size=500):
+    """Agrupa las entradas anteriores a retention_days de cada usuario.
+
+    Devuelve (usuarios compactados, entradas eliminadas).
+    """
+    ledger = CoinLedgerEntry.__table__
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    users = entries = 0
+    while True:
+        # Usuarios con más de una entrada antigua (con una sola no hay nada que agrupar)
+        rows = db.session.execute(
+            db.select(
+                ledger.c.user_id,
+                db.func.sum(ledger.c.delta),
+                db.func.count(),
+                db.func.max(ledger.c.created_at)
+            ).where(ledger.c.created_at < cutoff)
+            .group_by(ledger.c.user_id)
+            .having(db.func.count() > 1)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+
+        # Las entradas nuevas llevan created_at actual: ninguna cae antes del corte
+        db.session.execute(delete(ledger).where(
+            ledger.c.user_id.in_([row[0] for row in rows]),
+            ledger.c.created_at < cutoff
+        ))
+        db.session.execute(insert(ledger), [{
+            'user_id': user_id,
+            'delta': total,
+            'reason': COMPACTED_REASON,
+            'created_at': last_created_at
+        } for user_id, total, _, last_created_at in rows])
+        entries += sum(row[2] for row in rows)
+        db.session.commit()
+        users += len(rows)
+    return users, entries
+
+
+class LedgerCompactor:
+    """Compacta el libro de monedas periódicamente en segundo plano"""
+
+    def __init__(self):
+        self.interval = 0
+        self.retention_days = 30
+        self._app = None
+        self._thread = None
+        self.runs = 0
+        self.compacted_entries = 0
+
+    def init_app(self, app):
+        self._app = app
+        self.interval = float(os.environ.get('COIN_LEDGER_COMPACT_INTERVAL', '0'))
+        self.retention_days = float(os.environ.get('COIN_LEDGER_RETENTION_DAYS', '30'))
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='ledger-compactor', daemon=True)
+            self._thread.start()
+
+    def compact(self):
+        with self._app.app_context():
+            _, entries = compact_coin_ledger(self.retention_days)
+        self.compacted_entries += entries
+        self.runs += 1
+        return entries
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.compact()
+            except Exception as e:
+                self._app.logger.warning('Error compactando coin_ledger: %s', e)
+
+
+ledger_compactor = LedgerCompactor()
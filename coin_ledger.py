@@ -0,0 +1,80 @@
+from src.models.user import db
+from src.models.game_progress import GameProgress
+from datetime import datetime
+from sqlalchemy import insert, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+# Motivos que un cliente puede enviar con coins_delta ('modulo' y
+# 'compactado' los escribe sólo el servidor)
+CLIENT_REASONS = ('ajuste', 'tienda', 'minijuego', 'bonificacion')
+MAX_COINS_DELTA = 10000
+
+class CoinLedgerEntry(db.Model):
+    """Movimiento de monedas de un usuario (sólo se insertan filas).
+
+    game_progress.coins es el saldo y se actualiza en la misma transacción con
+    UPDATE ... SET coins = coins + delta, así que dos premios simultáneos no
+    se pisan. idempotency_key evita aplicar dos veces la misma petición
+    reintentada. La compactación (src.coin_compaction) agrupa las entradas
+    antiguas de cada usuario en una sola con reason='compactado'.
+    """
+    __tablename__ = 'coin_ledger'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'idempotency_key', name='uq_coin_ledger_user_key'),
+        db.Index('ix_coin_ledger_user_id_id', 'user_id', 'id'),
+        db.Index('ix_coin_ledger_created_at', 'created_at', 'id'),  # compactación
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(100), nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(50), nullable=False)  # 'modulo', 'ajuste', 'compactado'...
+    module_id = db.Column(db.Integer)
+    idempotency_key = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @classmethod
+    def find(cls, user_id, idempotency_key):
+        """Entrada ya registrada con esa clave de idempotencia, o None"""
+        return cls.query.filter_by(user_id=user_id, idempotency_key=idempotency_key).first()
+
+    @classmethod
+    def apply(cls, progress, delta, reason, module_id=None, idempotency_key=None):
+        """Suma delta al saldo de forma atómica y registra el movimiento.
+
+        Devuelve el saldo nuevo, o None si quedaría negativo (no se aplica
+        nada: la entrada del libro sólo se inserta si el saldo cambió). Una
+        clave de idempotencia repetida lanza IntegrityError.
+        """
+        if progress.id is None:
+            db.session.flush()
+        table = GameProgress.__table__
+        balance = db.session.execute(
+            update(table).where(
+                table.c.id == progress.id,
+                table.c.coins + delta >= 0
+            ).values(coins=table.c.coins + delta).returning(table.c.coins)
+        ).scalar()
+        if balance is None:
+            return None
+        db.session.execute(insert(cls).values(
+            user_id=progress.user_id,
+            delta=delta,
+            reason=reason,
+            module_id=module_id,
+            idempotency_key=idempotency_key,
+            created_at=datetime.utcnow()
+        ))
+        # El objeto refleja el saldo de la BD sin releer la fila
+        set_committed_value(progress, 'coins', balance)
+        return balance
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'delta': self.delta,
+            'reason': self.reason,
+            'module_id': self.module_id,
+            'created_at': self.created_at.isoformat()
+        }
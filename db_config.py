@@ -0,0 +1,175 @@
+"""Configuración de la base de datos para producción.
+
+- DATABASE_URL (declarada en render.yaml) selecciona Postgres u otra base;
+  si no existe se usa SQLite en database/app.db.
+- En SQLite cada conexión nueva activa WAL, synchronous=NORMAL, mmap, caché y
+  busy_timeout, para que varios workers de gunicorn puedan escribir sin
+  devolver "database is locked" al primer conflicto.
+- retry_on_lock reintenta con backoff las rutas de escritura cuando, aun así,
+  la base de datos sigue bloqueada.
+- Con workers de gevent (GUNICORN_PROFILE=gevent) las llamadas al driver no
+  ceden el control: en SQLite cada worker usa una sola conexión (los
+  greenlets esperan su turno en el pool, que sí coopera) y un busy_timeout
+  corto, y la espera entre reintentos la hace retry_on_lock con time.sleep
+  parcheado. En Postgres se instala psycogreen si está disponible.
+"""
+import os
+import random
+import sqlite3
+import sys
+import time
+from functools import wraps
+
+from flask import jsonify
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from src.models.user import db
+
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_SIZE_KB', '20000')),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024))),
+    'temp_store': 'MEMORY',
+}
+
+# busy_timeout con gevent: bloquea el worker entero mientras espera
+COOPERATIVE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_COOPERATIVE_BUSY_TIMEOUT_MS', '100'))
+
+LOCK_RETRIES = int(os.environ.get('DB_LOCK_RETRIES', '5'))
+LOCK_RETRY_BASE_DELAY = float(os.environ.get('DB_LOCK_RETRY_DELAY', '0.05'))
+
+
+def default_database_uri():
+    return f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+
+
+def database_uri_from_env():
+    """Devuelve DATABASE_URL normalizada o la URI de SQLite por defecto"""
+    url = os.environ.get('DATABASE_URL')
+    if not url:
+        return default_database_uri()
+    # Render/Heroku usan el esquema antiguo postgres://, que SQLAlchemy ya no acepta
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def cooperative_mode():
+    """True si el proceso corre con gevent (o DB_COOPERATIVE=1)"""
+    if os.environ.get('DB_COOPERATIVE') in ('0', '1'):
+        return os.environ['DB_COOPERATIVE'] == '1'
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('socket')
+
+
+def sqlite_busy_timeout():
+    if cooperative_mode():
+        return min(SQLITE_PRAGMAS['busy_timeout'], COOPERATIVE_BUSY_TIMEOUT_MS)
+    return SQLITE_PRAGMAS['busy_timeout']
+
+
+def engine_options(uri):
+    """Opciones de create_engine según el tipo de base de datos"""
+    if uri.startswith('sqlite'):
+        # El busy_timeout se aplica también por PRAGMA; timeout cubre la conexión inicial
+        options = {'connect_args': {'timeout': sqlite_busy_timeout() / 1000}}
+        if cooperative_mode() and ':memory:' not in uri:
+            # Una conexión por worker: SQLite sólo admite un escritor y el
+            # driver bloquearía el bucle de gevent mientras espera el bloqueo
+            options.update(pool_size=1, max_overflow=0,
+                           pool_timeout=int(os.environ.get('DB_POOL_TIMEOUT', '30')))
+        return options
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', '5')),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', '10')),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', '30')),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', '1800')),
+        'pool_pre_ping': True,
+    }
+
+
+@event.listens_for(Engine, 'connect')
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Aplica los PRAGMA de producción a cada conexión SQLite nueva"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    pragmas = dict(SQLITE_PRAGMAS, busy_timeout=sqlite_busy_timeout())
+    for pragma, value in pragmas.items():
+        cursor.execute(f'PRAGMA {pragma}={value}')
+    cursor.close()
+
+
+def configure_database(app, uri=None):
+    """Configura SQLAlchemy en la app (llamar antes de db.init_app)"""
+    uri = uri or database_uri_from_env()
+    if uri.startswith('sqlite:///'):
+        os.makedirs(os.path.dirname(uri[len('sqlite:///'):]) or '.', exist_ok=True)
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(uri)
+    if cooperative_mode() and uri.startswith('postgresql'):
+        patch_psycopg_for_gevent(app)
+
+
+def patch_psycopg_for_gevent(app):
+    """Hace que psycopg2 ceda el control a gevent mientras espera a Postgres"""
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        app.logger.warning('psycogreen no está instalado: con gevent cada consulta a Postgres bloquea el worker')
+        return
+    patch_psycopg()
+
+
+def upsert_insert():
+    """insert() con soporte de ON CONFLICT para la base actual, o None si no lo tiene"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return sqlite_insert
+    if dialect == 'postgresql':
+        return postgresql_insert
+    return None
+
+
+def is_lock_error(error):
+    """True si el error es un bloqueo/conflicto transitorio de la base de datos"""
+    message = str(getattr(error, 'orig', error)).lower()
+    return isinstance(error, OperationalError) and (
+        'database is locked' in message
+        or 'database table is locked' in message
+        or 'deadlock detected' in message
+        or 'could not serialize access' in message
+    )
+
+
+def retry_on_lock(view):
+    """Reintenta una ruta de escritura con backoff exponencial si la BD está bloqueada.
+
+    La ruta debe dejar escapar OperationalError (tras hacer rollback) en lugar
+    de convertirlo en un 500.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        for attempt in range(LOCK_RETRIES + 1):
+            try:
+                return view(*args, **kwargs)
+            except OperationalError as e:
+                db.session.rollback()
+                if not is_lock_error(e):
+                    return jsonify({
+                        'success': False,
+                        'error': str(e)
+                    }), 500
+                if attempt == LOCK_RETRIES:
+                    return jsonify({
+                        'success': False,
+                        'error': 'La base de datos está ocupada, inténtalo de nuevo'
+                    }), 503
+                time.sleep(LOCK_RETRY_BASE_DELAY * (2 ** attempt) * (0.5 + random.random()))
+    return wrapper
@@ -0,0 +1,155 @@
+"""Eventos en vivo por Server-Sent Events.
+
+GET /api/events/leaderboard?escuela= y GET /api/events/progress/<user_id>
+mantienen abierta una respuesta text/event-stream. Al conectar se envía el
+estado actual (evento 'leaderboard' o 'progress') y después cada cambio:
+complete_module y update_user_progress llaman a publish_progress tras el
+commit, que publica el progreso del alumno y, si el top del ranking global o
+de su escuela ha cambiado, el nuevo top.
+
+El estado inicial sale de los rankings en memoria y del caché de progreso, y
+el stream no usa la sesión de base de datos: el número de clientes conectados
+no añade consultas. Al reconectar (EventSource lo hace solo) el cliente
+vuelve a recibir el estado completo, así que no hace falta Last-Event-ID.
+
+Cada conexión ocupa un hilo o greenlet del servidor mientras está abierta.
+Con el perfil gthread (el desplegado) cada worker atiende GUNICORN_THREADS
+conexiones a la vez; para miles de clientes instala gevent y usa
+GUNICORN_PROFILE=gevent (gunicorn.conf.py).
+"""
+import os
+import threading
+
+from flask import Blueprint, Response, request, jsonify
+from src.models.game_progress import GameProgress
+from src.leaderboard import leaderboard
+from src.cache import cache, progress_key
+from src.pubsub import event_bus, sse_frame
+
+events_bp = Blueprint('events', __name__)
+
+EVENTS_HEARTBEAT = float(os.environ.get('EVENTS_HEARTBEAT', '15'))
+EVENTS_RETRY_MS = 3000
+LIVE_TOP = 10
+
+# Último top publicado por canal: sólo se publica si cambia
+_published_tops = {}
+_published_lock = threading.Lock()
+
+
+def leaderboard_channel(escuela=None):
+    return 'leaderboard' if escuela is None else f'leaderboard:{escuela}'
+
+
+def progress_channel(user_id):
+    return f'progress:{user_id}'
+
+
+def publish_progress(progress_data):
+    """Publica el progreso guardado y los cambios del ranking que provoca"""
+    user_id = progress_data['user_id']
+    event_bus.publish(progress_channel(user_id), 'progress', {
+        'data': progress_data,
+        'rank': leaderboard.coins_rank(user_id)
+    })
+
+    escuela = leaderboard.school_of(user_id)
+    boards = [None] if escuela is None else [None, escuela]
+    for board in boards:
+        channel = leaderboard_channel(board)
+        top = leaderboard.top_coins(LIVE_TOP, escuela=board)
+        with _published_lock:
+            if _published_tops.get(channel) == top:
+                continue
+            _published_tops[channel] = top
+        event_bus.publish(channel, 'leaderboard', {'escuela': board, 'data': top})
+
+
+def event_stream(subscription, initial):
+    """Tramas SSE: estado inicial, eventos publicados y comentarios de latido"""
+    try:
+        yield f'retry: {EVENTS_RETRY_MS}\n\n'
+        yield initial
+        while True:
+            frame = subscription.get(timeout=EVENTS_HEARTBEAT)
+            # El latido mantiene viva la conexión y detecta clientes desconectados
+            yield frame if frame is not None else ': ping\n\n'
+    finally:
+        event_bus.unsubscribe(subscription)
+
+
+def sse_response(channel, initial_loader):
+    """Suscribe al canal y devuelve la respuesta en streaming"""
+    # Suscribir antes de leer el estado inicial para no perder eventos
+    subscription = event_bus.subscribe([channel])
+    if subscription is None:
+        # El cliente vuelve a consultar la API periódicamente
+        return jsonify({
+            'success': False,
+            'error': 'Demasiadas conexiones de eventos abiertas'
+        }), 503, {'Retry-After': str(EVENTS_RETRY_MS // 1000)}
+    try:
+        initial = initial_loader()
+    except Exception:
+        event_bus.unsubscribe(subscription)
+        raise
+    response = Response(event_stream(subscription, initial), mimetype='text/event-stream')
+    response.cache_control.no_cache = True
+    # nginx no debe acumular el stream en su buffer
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@events_bp.route('/leaderboard', methods=['GET'])
+def leaderboard_events():
+    """Stream del top de monedas global o de ?escuela="""
+    try:
+        escuela = request.args.get('escuela')
+
+        def initial():
+            leaderboard.ensure_fresh()
+            return sse_frame('leaderboard', {
+                'escuela': escuela,
+                'data': leaderboard.top_coins(LIVE_TOP, escuela=escuela)
+            })
+
+        return sse_response(leaderboard_channel(escuela), initial)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@events_bp.route('/progress/<user_id>', methods=['GET'])
+def progress_events(user_id):
+    """Stream del progreso y la posición de un alumno"""
+    try:
+        def initial():
+            progress_data = cache.read_through(progress_key(user_id), lambda: load_progress(user_id))
+            leaderboard.ensure_fresh()
+            return sse_frame('progress', {
+                'data': progress_data,
+                'rank': leaderboard.coins_rank(user_id)
+            })
+
+        return sse_response(progress_channel(user_id), initial)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+def load_progress(user_id):
+    progress = GameProgress.query.filter_by(user_id=user_id).first()
+    return progress.to_dict() if progress else None
+
+
+@events_bp.route('/stats', methods=['GET'])
+def get_events_stats():
+    """Conexiones abiertas y eventos publicados/entregados en este proceso"""
+    return jsonify({
+        'success': True,
+        'data': event_bus.stats()
+    })
@@ -0,0 +1,226 @@
+"""Exportación masiva en streaming (NDJSON o CSV).
+
+GET /api/export/<dataset> recorre module_activities, student_sessions o
+high_scores con yield_per (cursor de servidor en Postgres, fetchmany en
+SQLite) y envía las filas por lotes en una respuesta en streaming, así que la
+memoria no crece con el tamaño de la tabla.
+
+Exportación incremental: cada respuesta lleva la cabecera X-Export-Watermark
+con la marca de tiempo hasta la que incluye filas; la siguiente exportación
+pasa ese valor en ?since= y recibe sólo las filas posteriores. La marca se
+fija unos segundos antes del inicio de la exportación para que no se pierdan
+filas fechadas que aún no se han confirmado: las que esperan en el buffer
+write-behind o tras un bloqueo de SQLite (busy_timeout en cada intento de
+retry_on_lock más su backoff). Por defecto el retraso supera ese máximo en
+EXPORT_WATERMARK_MARGIN segundos; EXPORT_WATERMARK_LAG lo sustituye.
+
+Las sesiones se exportan al cerrarse (por session_end): una sesión abierta
+todavía puede cambiar.
+"""
+import csv
+import io
+import os
+import sys
+from datetime import datetime, timedelta
+
+import click
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from sqlalchemy import select
+from src.models.user import db
+from src.models.game_progress import ModuleActivity
+from src.models.high_score import HighScore
+from src.models.student import StudentSession
+from src.db_config import SQLITE_PRAGMAS, LOCK_RETRIES, LOCK_RETRY_BASE_DELAY
+from src.serialization import dumps, loads
+from src.write_behind import write_behind
+from src.pagination import parse_since
+
+export_bp = Blueprint('export', __name__)
+
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '1000'))
+EXPORT_WATERMARK_LAG = float(os.environ['EXPORT_WATERMARK_LAG']) if os.environ.get('EXPORT_WATERMARK_LAG') else None
+EXPORT_WATERMARK_MARGIN = 5
+
+# columns: columnas exportadas; watermark: columna de la exportación
+# incremental; json_columns: texto JSON que en NDJSON se emite decodificado
+EXPORT_DATASETS = {
+    'activities': {
+        'columns': (
+            ModuleActivity.id, ModuleActivity.user_id, ModuleActivity.module_id,
+            ModuleActivity.activity_type, ModuleActivity.activity_data, ModuleActivity.score,
+            ModuleActivity.completed, ModuleActivity.completed_at, ModuleActivity.created_at
+        ),
+        'watermark': ModuleActivity.created_at,
+        'json_columns': {'activity_data': {}},
+    },
+    'sessions': {
+        'columns': (
+            StudentSession.id, StudentSession.student_id, StudentSession.session_start,
+            StudentSession.session_end, StudentSession.duration_minutes,
+            StudentSession.modules_completed, StudentSession.activities_completed,
+            StudentSession.coins_earned
+        ),
+        'watermark': StudentSession.session_end,
+        'json_columns': {'modules_completed': []},
+    },
+    'highscores': {
+        'columns': (
+            HighScore.id, HighScore.student_nip, HighScore.score,
+            HighScore.module_id, HighScore.achieved_at
+        ),
+        'watermark': HighScore.achieved_at,
+        'json_columns': {},
+    },
+}
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def commit_delay_bound():
+    """Segundos que puede tardar en confirmarse una fila ya fechada"""
+    busy_timeout = SQLITE_PRAGMAS['busy_timeout'] / 1000
+    # retry_on_lock espera hasta 1,5 veces la base entre intentos
+    backoff = sum(LOCK_RETRY_BASE_DELAY * (2 ** attempt) * 1.5 for attempt in range(LOCK_RETRIES))
+    return (LOCK_RETRIES + 1) * busy_timeout + backoff + write_behind.interval
+
+
+def watermark_lag():
+    if EXPORT_WATERMARK_LAG is not None:
+        return EXPORT_WATERMARK_LAG
+    return commit_delay_bound() + EXPORT_WATERMARK_MARGIN
+
+
+def export_watermark(now=None):
+    """Marca de tiempo hasta la que una exportación que empieza ahora incluye filas"""
+    return (now or datetime.utcnow()) - timedelta(seconds=watermark_lag())
+
+
+def export_query(dataset, since=None, until=None):
+    """SELECT de las filas con since < watermark <= until, en orden de watermark"""
+    spec = EXPORT_DATASETS[dataset]
+    watermark = spec['watermark']
+    primary_key = spec['columns'][0]
+    statement = select(*spec['columns']).where(watermark.is_not(None))
+    if since is not None:
+        statement = statement.where(watermark > since)
+    if until is not None:
+        statement = statement.where(watermark <= until)
+    return statement.order_by(watermark, primary_key).execution_options(yield_per=EXPORT_CHUNK_SIZE)
+
+
+def _datetime_indexes(dataset):
+    columns = EXPORT_DATASETS[dataset]['columns']
+    return [index for index, column in enumerate(columns) if isinstance(column.type, db.DateTime)]
+
+
+def ndjson_chunks(dataset, rows):
+    """Líneas JSON (una por fila) agrupadas en bloques de EXPORT_CHUNK_SIZE"""
+    spec = EXPORT_DATASETS[dataset]
+    names = [column.key for column in spec['columns']]
+    datetime_indexes = _datetime_indexes(dataset)
+    json_columns = [
+        (names.index(name), default) for name, default in spec['json_columns'].items()
+    ]
+    lines = []
+    for row in rows:
+        values = list(row)
+        for index in datetime_indexes:
+            if values[index] is not None:
+                values[index] = values[index].isoformat()
+        for index, default in json_columns:
+            values[index] = loads(values[index]) if values[index] else default
+        lines.append(dumps(dict(zip(names, values))))
+        if len(lines) >= EXPORT_CHUNK_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def csv_chunks(dataset, rows):
+    """Cabecera CSV y filas agrupadas en bloques de EXPORT_CHUNK_SIZE"""
+    datetime_indexes = _datetime_indexes(dataset)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.key for column in EXPORT_DATASETS[dataset]['columns']])
+    pending = 0
+    for row in rows:
+        values = list(row)
+        for index in datetime_indexes:
+            if values[index] is not None:
+                values[index] = values[index].isoformat()
+        writer.writerow(values)
+        pending += 1
+        if pending >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def export_chunks(dataset, export_format, since=None, until=None):
+    """Genera la exportación por bloques de texto"""
+    rows = db.session.execute(export_query(dataset, since, until))
+    encode = ndjson_chunks if export_format == 'ndjson' else csv_chunks
+    try:
+        yield from encode(dataset, rows)
+    finally:
+        rows.close()
+
+
+@export_bp.route('/<dataset>', methods=['GET'])
+def export_dataset(dataset):
+    """Exporta un dataset completo o incremental (?format=ndjson|csv, ?since=)"""
+    if dataset not in EXPORT_DATASETS:
+        return jsonify({
+            'success': False,
+            'error': f"Dataset desconocido; usa {', '.join(EXPORT_DATASETS)}"
+        }), 404
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({
+            'success': False,
+            'error': 'format debe ser ndjson o csv'
+        }), 400
+    try:
+        # since es el X-Export-Watermark de la exportación anterior
+        since = parse_since(request.args.get('since'))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    until = export_watermark()
+    response = Response(
+        stream_with_context(export_chunks(dataset, export_format, since, until)),
+        mimetype=EXPORT_FORMATS[export_format]
+    )
+    response.headers['X-Export-Watermark'] = until.isoformat()
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename="{dataset}-{until:%Y%m%dT%H%M%S}.{export_format}"'
+    )
+    return response
+
+
+@export_bp.cli.command('dump')
+@click.argument('dataset', type=click.Choice(list(EXPORT_DATASETS)))
+@click.option('--format', 'export_format', type=click.Choice(list(EXPORT_FORMATS)), default='ndjson')
+@click.option('--since', default=None, help='Watermark de la exportación anterior (ISO 8601)')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), default=None,
+              help='Fichero de salida (por defecto la salida estándar)')
+def dump_command(dataset, export_format, since, output):
+    """Exporta un dataset a un fichero; el watermark se escribe en stderr"""
+    until = export_watermark()
+    stream = open(output, 'w', encoding='utf-8', newline='') if output else sys.stdout
+    try:
+        for chunk in export_chunks(dataset, export_format, parse_since(since), until):
+            stream.write(chunk)
+    finally:
+        if output:
+            stream.close()
+    click.echo(f'watermark={until.isoformat()}', err=True)
@@ -1,7 +1,20 @@
 from flask import Blueprint, request, jsonify
 from src.models.game_progress import db, GameProgress, ModuleActivity
-from src.models.high_score import HighScore
+from src.models.high_score import HighScore, BestScore
+from src.models.coin_ledger import CoinLedgerEntry, CLIENT_REASONS, MAX_COINS_DELTA
+from src.leaderboard import leaderboard
+from src.write_behind import write_behind
+from src.cache import cache, progress_key
+from src.db_config import retry_on_lock
+from src.http_cache import conditional_json, payload_etag
+from src.pagination import parse_cursor, parse_since, encode_cursor, parse_limit, after_cursor, parse_fields, project_rows
+from src.routes.events import publish_progress
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError, OperationalError
 from datetime import datetime
+import click
+import json
+import re
 import uuid
 
 game_bp = Blueprint('game', __name__)
@@ -66,33 +79,79 @@ MODULES_CONFIG = [
     }
 ]
 
+# MODULES_CONFIG no cambia mientras corre el proceso: ETag precalculado
+MODULES_ETAG = payload_etag(MODULES_CONFIG)
+MODULES_MAX_AGE = 300
+
 @game_bp.route('/progress/<user_id>', methods=['GET'])
+@retry_on_lock
 def get_user_progress(user_id):
     """Obtiene el progreso del usuario"""
     try:
-        progress = GameProgress.query.filter_by(user_id=user_id).first()
+        progress_data = cache.get(progress_key(user_id))
         
-        if not progress:
-            # Crear nuevo progreso para el usuario
-            progress = GameProgress(user_id=user_id)
-            db.session.add(progress)
-            db.session.commit()
+        if progress_data is None:
+            progress = GameProgress.query.filter_by(user_id=user_id).first()
+            
+            if not progress:
+                # Crear nuevo progreso para el usuario
+                progress = GameProgress(user_id=user_id)
+                db.session.add(progress)
+                db.session.flush()
+                progress_data = progress.to_dict()
+                db.session.commit()
+                leaderboard.record_progress(progress, progress_data)
+            else:
+                progress_data = progress.to_dict()
+            cache.set(progress_key(user_id), progress_data)
         
-        return jsonify({
+        return conditional_json({
             'success': True,
-            'data': progress.to_dict()
+            'data': progress_data
         })
+    except OperationalError:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+def parse_coins_change(data):
+    """(coins_delta, reason, None) validados, o (None, None, error)"""
+    value = data['coins_delta']
+    if isinstance(value, str) and re.fullmatch(r'-?[0-9]+', value.strip()):
+        value = int(value)
+    if not isinstance(value, int) or isinstance(value, bool):
+        return None, None, 'coins_delta debe ser un número entero'
+    if value == 0 or abs(value) > MAX_COINS_DELTA:
+        return None, None, f'coins_delta debe estar entre -{MAX_COINS_DELTA} y {MAX_COINS_DELTA} y no ser 0'
+    reason = data.get('reason', 'ajuste')
+    if reason not in CLIENT_REASONS:
+        return None, None, f"reason debe ser uno de: {', '.join(CLIENT_REASONS)}"
+    return value, reason, None
+
 @game_bp.route('/progress/<user_id>', methods=['POST'])
+@retry_on_lock
 def update_user_progress(user_id):
     """Actualiza el progreso del usuario"""
     try:
         data = request.get_json()
+        if 'coins' in data:
+            # Un total enviado por el cliente pisaría premios concurrentes
+            return jsonify({
+                'success': False,
+                'error': 'coins ya no se acepta; envía coins_delta con la variación'
+            }), 400
+        
+        if 'coins_delta' in data:
+            coins_delta, reason, error = parse_coins_change(data)
+            if error:
+                return jsonify({
+                    'success': False,
+                    'error': error
+                }), 400
+        
         progress = GameProgress.query.filter_by(user_id=user_id).first()
         
         if not progress:
@@ -100,8 +159,16 @@ def update_user_progress(user_id):
             db.session.add(progress)
         
         # Actualizar campos si están presentes en los datos
-        if 'coins' in data:
-            progress.coins = data['coins']
+        if 'coins_delta' in data:
+            balance = CoinLedgerEntry.apply(
+                progress, coins_delta, reason, idempotency_key=idempotency_key(data)
+            )
+            if balance is None:
+                db.session.rollback()
+                return jsonify({
+                    'success': False,
+                    'error': 'Monedas insuficientes'
+                }), 400
         if 'level' in data:
             progress.level = data['level']
         if 'completed_modules' in data:
@@ -112,12 +179,33 @@ def update_user_progress(user_id):
             progress.current_module = data['current_module']
         
         progress.updated_at = datetime.utcnow()
+        db.session.flush()
+        progress_data = progress.to_dict()
         db.session.commit()
+        cache.set(progress_key(user_id), progress_data)
+        leaderboard.record_progress(progress, progress_data)
+        publish_progress(progress_data)
         
         return jsonify({
             'success': True,
-            'data': progress.to_dict()
+            'data': progress_data
         })
+    except IntegrityError as e:
+        # Petición reintentada con una clave de idempotencia ya aplicada
+        db.session.rollback()
+        key = idempotency_key(data)
+        if not key or CoinLedgerEntry.find(user_id, key) is None:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+        return jsonify({
+            'success': True,
+            'data': current_progress(user_id),
+            'replayed': True
+        })
+    except OperationalError:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
@@ -125,11 +213,19 @@ def update_user_progress(user_id):
         }), 500
 
 @game_bp.route('/complete-module/<user_id>/<int:module_id>', methods=['POST'])
+@retry_on_lock
 def complete_module(user_id, module_id):
     """Marca un módulo como completado y otorga recompensas"""
     try:
         data = request.get_json() or {}
         score = data.get('score', 0)
+        key = idempotency_key(data)
+        
+        # Reintento de una petición ya aplicada: no se vuelve a premiar
+        if key:
+            previous = CoinLedgerEntry.find(user_id, key)
+            if previous:
+                return replayed_completion(user_id, previous.delta)
         
         progress = GameProgress.query.filter_by(user_id=user_id).first()
         if not progress:
@@ -147,11 +243,11 @@ def complete_module(user_id, module_id):
         # Añadir módulo completado
         progress.add_completed_module(module_id)
         
-        # Otorgar monedas
+        # Otorgar monedas (UPDATE atómico + entrada en el libro)
         coins_earned = module_config['coins_reward']
         if score >= 80:  # Bonus por buen desempeño
             coins_earned = int(coins_earned * 1.5)
-        progress.add_coins(coins_earned)
+        CoinLedgerEntry.apply(progress, coins_earned, 'modulo', module_id=module_id, idempotency_key=key)
         
         # Otorgar insignias según el progreso
         completed_modules = progress.get_completed_modules()
@@ -167,34 +263,100 @@ def complete_module(user_id, module_id):
         progress.level = max(progress.level, new_level)
         
         progress.updated_at = datetime.utcnow()
-        # Guardar high score para el módulo
+        # Guardar high score para el módulo y actualizar el mejor score del estudiante
+        student_nip = user_id.replace('student_', '')
         high_score = HighScore(
-            student_nip=user_id.replace('student_', ''),
+            student_nip=student_nip,
             score=score,
-            module_id=module_id
+            module_id=module_id,
+            achieved_at=progress.updated_at
         )
         db.session.add(high_score)
+        BestScore.record(student_nip, module_id, score, high_score.achieved_at)
 
+        db.session.flush()
+        progress_data = progress.to_dict()
+        # Valores simples antes del commit, que expira los atributos
+        high_score_id, achieved_at = high_score.id, high_score.achieved_at
         db.session.commit()
+        cache.set(progress_key(user_id), progress_data)
+        leaderboard.record_progress(progress, progress_data)
+        leaderboard.record_high_score(high_score_id, student_nip, module_id, score, achieved_at)
+        publish_progress(progress_data)
         
+        badges = progress_data['badges']
         return jsonify({
             'success': True,
-            'data': progress.to_dict(),
+            'data': progress_data,
             'coins_earned': coins_earned,
-            'new_badges': progress.get_badges()[-1:] if len(progress.get_badges()) > 0 else []
+            'new_badges': badges[-1:] if len(badges) > 0 else []
         })
+    except IntegrityError as e:
+        # Dos reintentos simultáneos: el segundo choca con la clave única
+        db.session.rollback()
+        previous = CoinLedgerEntry.find(user_id, key) if key else None
+        if previous is None:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+        return replayed_completion(user_id, previous.delta)
+    except OperationalError:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+def idempotency_key(data):
+    """Clave de idempotencia de la cabecera Idempotency-Key o del cuerpo"""
+    key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    return str(key)[:100] if key else None
+
+def current_progress(user_id):
+    return cache.read_through(
+        progress_key(user_id),
+        lambda: GameProgress.query.filter_by(user_id=user_id).first().to_dict()
+    )
+
+def replayed_completion(user_id, coins_earned):
+    """Respuesta de un complete_module repetido con la misma clave"""
+    return jsonify({
+        'success': True,
+        'data': current_progress(user_id),
+        'coins_earned': coins_earned,
+        'new_badges': [],
+        'replayed': True
+    })
+
 @game_bp.route('/activity/<user_id>', methods=['POST'])
+@retry_on_lock
 def save_activity(user_id):
     """Guarda una actividad del usuario"""
     try:
         data = request.get_json()
         
+        if write_behind.enabled:
+            # Telemetría: se encola y se escribe en el siguiente volcado
+            try:
+                row = build_activity_row(user_id, data, datetime.utcnow())
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+            if not write_behind.insert(ModuleActivity, row):
+                return jsonify({
+                    'success': False,
+                    'error': 'Cola de actividades llena, inténtalo de nuevo'
+                }), 503
+            return jsonify({
+                'success': True,
+                'data': ModuleActivity(**row).to_dict(),
+                'queued': True
+            }), 202
+        
         activity = ModuleActivity(
             user_id=user_id,
             module_id=data.get('module_id'),
@@ -216,21 +378,150 @@ def save_activity(user_id):
             'success': True,
             'data': activity.to_dict()
         })
+    except OperationalError:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+MAX_ACTIVITY_BATCH = 500
+
+def build_activity_row(user_id, data, now):
+    """Valida una actividad y la convierte en una fila para inserción masiva"""
+    if not isinstance(data, dict):
+        raise ValueError('La actividad debe ser un objeto')
+    if not isinstance(data.get('module_id'), int) or isinstance(data['module_id'], bool):
+        raise ValueError('El campo module_id es requerido')
+    if not data.get('activity_type'):
+        raise ValueError('El campo activity_type es requerido')
+    
+    completed = bool(data.get('completed', False))
+    return {
+        'user_id': user_id,
+        'module_id': data['module_id'],
+        'activity_type': data['activity_type'],
+        'activity_data': json.dumps(data['activity_data']) if 'activity_data' in data else None,
+        'score': data.get('score', 0),
+        'completed': completed,
+        'completed_at': now if completed else None,
+        'created_at': now
+    }
+
+@game_bp.route('/activities/<user_id>/batch', methods=['POST'])
+@retry_on_lock
+def save_activities_batch(user_id):
+    """Guarda varias actividades del usuario en una sola transacción
+
+    Acepta una lista de actividades (o {"activities": [...]}) y devuelve un
+    resultado por elemento; las actividades inválidas no impiden guardar
+    las demás.
+    """
+    try:
+        data = request.get_json()
+        activities = data.get('activities') if isinstance(data, dict) else data
+        
+        if not isinstance(activities, list) or not activities:
+            return jsonify({
+                'success': False,
+                'error': 'Se requiere una lista de actividades'
+            }), 400
+        if len(activities) > MAX_ACTIVITY_BATCH:
+            return jsonify({
+                'success': False,
+                'error': f'Máximo {MAX_ACTIVITY_BATCH} actividades por lote'
+            }), 400
+        
+        now = datetime.utcnow()
+        results = []
+        rows = []
+        for index, item in enumerate(activities):
+            try:
+                rows.append(build_activity_row(user_id, item, now))
+                results.append({'index': index, 'success': True})
+            except ValueError as e:
+                results.append({'index': index, 'success': False, 'error': str(e)})
+        
+        if rows:
+            ids = db.session.scalars(
+                insert(ModuleActivity).returning(ModuleActivity.id, sort_by_parameter_order=True),
+                rows
+            ).all()
+            db.session.commit()
+            
+            saved = iter(ids)
+            for result in results:
+                if result['success']:
+                    result['id'] = next(saved)
+        
+        return jsonify({
+            'success': True,
+            'data': results,
+            'saved': len(rows)
+        })
+    except OperationalError:
+        raise
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# Campos de ?fields= y su columna; activity_data sólo se decodifica si se pide
+ACTIVITY_FIELDS = {
+    'id': ModuleActivity.id,
+    'user_id': ModuleActivity.user_id,
+    'module_id': ModuleActivity.module_id,
+    'activity_type': ModuleActivity.activity_type,
+    'activity_data': ModuleActivity.activity_data,
+    'score': ModuleActivity.score,
+    'completed': ModuleActivity.completed,
+    'completed_at': ModuleActivity.completed_at,
+    'created_at': ModuleActivity.created_at
+}
+
 @game_bp.route('/activities/<user_id>', methods=['GET'])
 def get_user_activities(user_id):
-    """Obtiene todas las actividades del usuario"""
+    """Obtiene las actividades del usuario, de la más reciente a la más antigua
+
+    Parámetros opcionales: ?limit=, ?after=<created_at,id> (el next_cursor de
+    la página anterior), ?module_id=, ?since=<fecha ISO> y ?fields=a,b,c.
+    """
     try:
-        activities = ModuleActivity.query.filter_by(user_id=user_id).all()
-        
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            fields = parse_fields(request.args.get('fields'), ACTIVITY_FIELDS)
+            after = parse_cursor(request.args['after']) if request.args.get('after') else None
+            since = parse_since(request.args.get('since'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        # id y created_at se leen siempre para construir el cursor
+        query = db.session.query(
+            ModuleActivity.created_at, ModuleActivity.id, *(ACTIVITY_FIELDS[field] for field in fields)
+        ).filter(ModuleActivity.user_id == user_id)
+        module_id = request.args.get('module_id', type=int)
+        if module_id is not None:
+            query = query.filter(ModuleActivity.module_id == module_id)
+        if since:
+            query = query.filter(ModuleActivity.created_at > since)
+        if after:
+            query = query.filter(after_cursor(ModuleActivity.created_at, ModuleActivity.id, after))
+        rows = query.order_by(ModuleActivity.created_at.desc(), ModuleActivity.id.desc()).limit(limit).all()
+
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = encode_cursor(rows[-1][0], rows[-1][1])
+
         return jsonify({
             'success': True,
-            'data': [activity.to_dict() for activity in activities]
+            'data': project_rows((row[2:] for row in rows), fields, {'activity_data': {}}),
+            'next_cursor': next_cursor
         })
     except Exception as e:
         return jsonify({
@@ -241,30 +532,43 @@ def get_user_activities(user_id):
 @game_bp.route('/modules', methods=['GET'])
 def get_modules():
     """Obtiene la configuración de todos los módulos"""
-    return jsonify({
+    return conditional_json({
         'success': True,
         'data': MODULES_CONFIG
-    })
+    }, etag=MODULES_ETAG, max_age=MODULES_MAX_AGE)
 
 @game_bp.route('/leaderboard', methods=['GET'])
 def get_leaderboard():
-    """Obtiene el ranking de usuarios por monedas"""
+    """Obtiene el ranking de usuarios por monedas (opcionalmente por ?escuela=)"""
     try:
-        top_users = GameProgress.query.order_by(GameProgress.coins.desc()).limit(10).all()
-        
-        leaderboard = []
-        for i, user in enumerate(top_users, 1):
-            leaderboard.append({
-                'rank': i,
-                'user_id': user.user_id,
-                'coins': user.coins,
-                'level': user.level,
-                'completed_modules': len(user.get_completed_modules())
-            })
+        leaderboard.ensure_fresh()
         
+        return conditional_json({
+            'success': True,
+            'data': leaderboard.top_coins(10, escuela=request.args.get('escuela'))
+        })
+    except Exception as e:
         return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@game_bp.route('/leaderboard/rank/<user_id>', methods=['GET'])
+def get_leaderboard_rank(user_id):
+    """Obtiene la posición de un usuario en el ranking de monedas"""
+    try:
+        leaderboard.ensure_fresh()
+        rank = leaderboard.coins_rank(user_id, escuela=request.args.get('escuela'))
+        
+        if rank is None:
+            return jsonify({
+                'success': False,
+                'error': 'Usuario no encontrado en el ranking'
+            }), 404
+        
+        return conditional_json({
             'success': True,
-            'data': leaderboard
+            'data': rank
         })
     except Exception as e:
         return jsonify({
@@ -273,6 +577,7 @@ def get_leaderboard():
         }), 500
 
 @game_bp.route('/reset/<user_id>', methods=['POST'])
+@retry_on_lock
 def reset_user_progress(user_id):
     """Reinicia el progreso del usuario (para testing)"""
     try:
@@ -280,15 +585,20 @@ def reset_user_progress(user_id):
         if progress:
             db.session.delete(progress)
         
-        # Eliminar actividades del usuario
+        # Eliminar actividades y movimientos de monedas del usuario
         ModuleActivity.query.filter_by(user_id=user_id).delete()
+        CoinLedgerEntry.query.filter_by(user_id=user_id).delete()
         
         db.session.commit()
+        cache.delete(progress_key(user_id))
+        leaderboard.remove_user(user_id)
         
         return jsonify({
             'success': True,
             'message': 'Progreso reiniciado exitosamente'
         })
+    except OperationalError:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
@@ -297,48 +607,58 @@ def reset_user_progress(user_id):
 
 
 
+@game_bp.route('/write-behind/stats', methods=['GET'])
+def get_write_behind_stats():
+    """Métricas del buffer de escritura diferida"""
+    return jsonify({
+        'success': True,
+        'data': write_behind.stats()
+    })
+
+@game_bp.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Contadores del caché de estudiantes y progreso"""
+    return jsonify({
+        'success': True,
+        'data': cache.stats()
+    })
+
 @game_bp.route("/highscores", methods=["GET"])
 def get_highscores():
-    """Obtiene los high scores de todos los módulos"""
+    """Obtiene los high scores de todos los módulos
+
+    Sin parámetros devuelve los 10 mejores scores globales; con ?module_id=
+    devuelve el mejor score de cada estudiante en ese módulo.
+    """
     try:
-        # Obtener los high scores únicos por estudiante y módulo
-        # Esto es un poco más complejo ya que queremos el score más alto por cada estudiante en cada módulo
-        # Una forma de hacerlo es agrupar por student_nip y module_id y seleccionar el max score
-        # Sin embargo, para un leaderboard general, podemos simplemente mostrar los top scores globales
-        # o los top scores por módulo.
-        # Para este caso, vamos a mostrar los top 10 scores globales, independientemente del módulo.
-        
-        # Si queremos el score más alto por estudiante en cada módulo:
-        # subquery = db.session.query(
-        #     HighScore.student_nip,
-        #     HighScore.module_id,
-        #     db.func.max(HighScore.score).label("max_score")
-        # ).group_by(HighScore.student_nip, HighScore.module_id).subquery()
-        # 
-        # high_scores = db.session.query(HighScore).join(
-        #     subquery,
-        #     db.and_(
-        #         HighScore.student_nip == subquery.c.student_nip,
-        #         HighScore.module_id == subquery.c.module_id,
-        #         HighScore.score == subquery.c.max_score
-        # )).order_by(HighScore.score.desc()).limit(10).all()
-
-        # Para un leaderboard simple de los 10 mejores scores generales:
-        high_scores = HighScore.query.order_by(HighScore.score.desc()).limit(10).all()
-        
-        leaderboard = []
-        for i, hs in enumerate(high_scores, 1):
-            leaderboard.append({
-                "rank": i,
-                "student_nip": hs.student_nip,
-                "score": hs.score,
-                "module_id": hs.module_id,
-                "achieved_at": hs.achieved_at.isoformat()
-            })
+        leaderboard.ensure_fresh()
+        
+        return conditional_json({
+            "success": True,
+            "data": leaderboard.top_scores(10, module_id=request.args.get("module_id", type=int))
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@game_bp.route("/highscores/rank/<student_nip>/<int:module_id>", methods=["GET"])
+def get_highscore_rank(student_nip, module_id):
+    """Obtiene la posición del mejor score de un estudiante en un módulo"""
+    try:
+        leaderboard.ensure_fresh()
+        rank = leaderboard.score_rank(student_nip.upper(), module_id)
+        
+        if rank is None:
+            return jsonify({
+                "success": False,
+                "error": "El estudiante no tiene puntuación en este módulo"
+            }), 404
         
         return jsonify({
             "success": True,
-            "data": leaderboard
+            "data": rank
         })
     except Exception as e:
         return jsonify({
@@ -346,4 +666,36 @@ def get_highscores():
             "error": str(e)
         }), 500
 
+# Columnas de BestScore.to_dict(), leídas como tuplas
+BEST_SCORE_FIELDS = {
+    'student_nip': BestScore.student_nip,
+    'score': BestScore.score,
+    'module_id': BestScore.module_id,
+    'achieved_at': BestScore.achieved_at
+}
+
+@game_bp.route("/highscores/student/<student_nip>", methods=["GET"])
+def get_student_best_scores(student_nip):
+    """Obtiene el mejor score de un estudiante en cada módulo"""
+    try:
+        rows = db.session.query(*BEST_SCORE_FIELDS.values()).filter(
+            BestScore.student_nip == student_nip.upper()
+        ).order_by(BestScore.module_id).all()
+        
+        return jsonify({
+            "success": True,
+            "data": project_rows(rows, list(BEST_SCORE_FIELDS))
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
 
+@game_bp.cli.command('compact-ledger')
+@click.option('--retention-days', default=30.0, help='Días de historial que se conservan sin agrupar')
+def compact_ledger_command(retention_days):
+    """Agrupa las entradas antiguas de coin_ledger en una por usuario"""
+    from src.coin_compaction import compact_coin_ledger
+    users, entries = compact_coin_ledger(retention_days)
+    click.echo(f'{entries} entradas agrupadas de {users} usuarios')
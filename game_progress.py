@@ -7,43 +7,66 @@ class GameProgress(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.String(100), nullable=False, unique=True)
-    coins = db.Column(db.Integer, default=100)
+    coins = db.Column(db.Integer, default=100, index=True)
     level = db.Column(db.Integer, default=1)
-    completed_modules = db.Column(db.Text, default='[]')  # JSON string
-    badges = db.Column(db.Text, default='[]')  # JSON string
     current_module = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Módulos completados e insignias en tablas hijas (antes columnas JSON)
+    module_completions = db.relationship('CompletedModule', order_by='CompletedModule.position',
+                                         cascade='all, delete-orphan', lazy='selectin')
+    badge_awards = db.relationship('EarnedBadge', order_by='EarnedBadge.position',
+                                   cascade='all, delete-orphan', lazy='selectin')
+    
     def get_completed_modules(self):
         """Devuelve la lista de módulos completados"""
-        return json.loads(self.completed_modules) if self.completed_modules else []
+        return [completion.module_id for completion in self.module_completions]
     
     def set_completed_modules(self, modules_list):
-        """Establece la lista de módulos completados"""
-        self.completed_modules = json.dumps(modules_list)
+        """Establece la lista de módulos completados (sin repetidos)"""
+        # Se reutilizan las filas existentes: la restricción única
+        # (progress_id, module_id) choca si se inserta antes de borrar
+        existing = {completion.module_id: completion for completion in self.module_completions}
+        completions = []
+        for module_id in dict.fromkeys(modules_list):
+            completion = existing.get(module_id) or CompletedModule(module_id=module_id)
+            completion.position = len(completions)
+            completions.append(completion)
+        self.module_completions = completions
     
     def get_badges(self):
         """Devuelve la lista de insignias"""
-        return json.loads(self.badges) if self.badges else []
+        return [award.name for award in self.badge_awards]
     
     def set_badges(self, badges_list):
-        """Establece la lista de insignias"""
-        self.badges = json.dumps(badges_list)
+        """Establece la lista de insignias (sin repetidas)"""
+        existing = {award.name: award for award in self.badge_awards}
+        awards = []
+        for name in dict.fromkeys(badges_list):
+            award = existing.get(name) or EarnedBadge(name=name)
+            award.position = len(awards)
+            awards.append(award)
+        self.badge_awards = awards
     
     def add_completed_module(self, module_id):
         """Añade un módulo a la lista de completados"""
-        completed = self.get_completed_modules()
-        if module_id not in completed:
-            completed.append(module_id)
-            self.set_completed_modules(completed)
+        if module_id not in self.get_completed_modules():
+            self.module_completions.append(
+                CompletedModule(module_id=module_id, position=len(self.module_completions))
+            )
     
     def add_badge(self, badge_name):
         """Añade una insignia"""
-        badges = self.get_badges()
-        if badge_name not in badges:
-            badges.append(badge_name)
-            self.set_badges(badges)
+        if badge_name not in self.get_badges():
+            self.badge_awards.append(
+                EarnedBadge(name=badge_name, position=len(self.badge_awards))
+            )
+    
+    @staticmethod
+    def count_completed(module_id):
+        """Número de usuarios que han completado un módulo (COUNT sobre índice)"""
+        return CompletedModule.query.filter_by(module_id=module_id).count()
     
     def add_coins(self, amount):
         """Añade monedas al total"""
@@ -70,8 +93,36 @@ class GameProgress(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class CompletedModule(db.Model):
+    __tablename__ = 'progress_completed_modules'
+    __table_args__ = (
+        db.Index('ix_progress_completed_modules_module_id', 'module_id', 'progress_id'),
+        db.Index('ux_progress_completed_modules_progress_module', 'progress_id', 'module_id', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    progress_id = db.Column(db.Integer, db.ForeignKey('game_progress.id'), nullable=False, index=True)
+    module_id = db.Column(db.Integer, nullable=False)
+    position = db.Column(db.Integer, nullable=False, default=0)  # orden de la lista original
+
+class EarnedBadge(db.Model):
+    __tablename__ = 'progress_badges'
+    __table_args__ = (
+        db.Index('ix_progress_badges_name', 'name', 'progress_id'),
+        db.Index('ux_progress_badges_progress_name', 'progress_id', 'name', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    progress_id = db.Column(db.Integer, db.ForeignKey('game_progress.id'), nullable=False, index=True)
+    name = db.Column(db.String(100), nullable=False)
+    position = db.Column(db.Integer, nullable=False, default=0)  # orden de la lista original
+
 class ModuleActivity(db.Model):
     __tablename__ = 'module_activities'
+    __table_args__ = (
+        db.Index('ix_module_activities_created_at', 'created_at', 'id'),  # exportación incremental
+        db.Index('ix_module_activities_user_id_created_at', 'user_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.String(100), nullable=False)
@@ -0,0 +1,79 @@
+"""Configuración de gunicorn: gunicorn -c gunicorn.conf.py main:app
+
+GUNICORN_PROFILE elige el tipo de worker:
+- sync: un proceso por petición en curso (2 x CPU + 1). Una conexión SSE o
+  un cliente lento ocupa un worker entero.
+- gthread (por defecto): pocos procesos con GUNICORN_THREADS hilos cada uno.
+- gevent (opcional): un proceso por CPU con hasta GUNICORN_WORKER_CONNECTIONS
+  conexiones en greenlets; es el perfil para muchos clientes SSE. Requiere
+  instalar gevent (y psycogreen con Postgres), que no están en las
+  dependencias del despliegue. db_config detecta gevent y adapta el acceso
+  a la BD.
+
+GUNICORN_WORKERS y GUNICORN_THREADS sustituyen los valores calculados.
+`python -m src.benchmark server` compara los perfiles.
+
+El esquema y las migraciones (`flask --app main migrate`) se ejecutan una
+sola vez en el proceso maestro antes de arrancar los workers: si los
+lanzara cada worker al importar la app, chocarían entre ellos con una base
+de datos nueva. Cada worker sólo construye sus rankings en memoria.
+"""
+import multiprocessing
+import os
+import subprocess
+import sys
+
+profile = os.environ.get('GUNICORN_PROFILE', 'gthread')
+cpus = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+if profile == 'sync':
+    worker_class = 'sync'
+    workers = cpus * 2 + 1
+    threads = 1
+elif profile == 'gthread':
+    worker_class = 'gthread'
+    workers = max(cpus, 2)
+    threads = 8
+elif profile == 'gevent':
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        raise RuntimeError('GUNICORN_PROFILE=gevent requiere el paquete gevent: pip install gevent psycogreen')
+    worker_class = 'gevent'
+    workers = cpus
+    threads = 1
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '1000'))
+else:
+    raise RuntimeError(f'GUNICORN_PROFILE desconocido: {profile}')
+
+workers = int(os.environ.get('GUNICORN_WORKERS', workers))
+threads = int(os.environ.get('GUNICORN_THREADS', threads))
+
+# Cada stream SSE ocupa un hilo del worker: sin gevent se limitan muy por
+# debajo de los hilos disponibles para que el resto de la API siga
+# respondiendo (los demás clientes reciben 503 y consultan periódicamente)
+if worker_class != 'gevent':
+    os.environ.setdefault('EVENTS_MAX_SUBSCRIBERS', str(threads // 4))
+
+# Sin preload: cada worker importa la app (y gevent parchea antes de hacerlo)
+preload_app = False
+# Los streams SSE mandan un latido cada EVENTS_HEARTBEAT segundos (15)
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+
+
+def on_starting(server):
+    # En un subproceso: el maestro no importa la app ni abre conexiones que
+    # heredarían los workers
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'main', 'migrate'],
+                   cwd=server.cfg.chdir, check=True)
+
+
+def post_worker_init(worker):
+    from src.leaderboard import leaderboard
+    with worker.wsgi.app_context():
+        leaderboard.rebuild()
@@ -1,12 +1,16 @@
 from src.models.user import db
 from datetime import datetime
+from src.db_config import upsert_insert
 
 class HighScore(db.Model):
     __tablename__ = 'high_scores'
+    __table_args__ = (
+        db.Index('ix_high_scores_achieved_at', 'achieved_at', 'id'),  # exportación incremental
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    student_nip = db.Column(db.String(6), db.ForeignKey('students.nip'), nullable=False)
-    score = db.Column(db.Integer, nullable=False)
+    student_nip = db.Column(db.String(6), db.ForeignKey('students.nip'), nullable=False, index=True)
+    score = db.Column(db.Integer, nullable=False, index=True)
     module_id = db.Column(db.Integer, nullable=False)
     achieved_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -21,3 +25,58 @@ class HighScore(db.Model):
             'achieved_at': self.achieved_at.isoformat()
         }
 
+class BestScore(db.Model):
+    """Mejor score de cada estudiante en cada módulo.
+
+    Se mantiene en la misma transacción que el HighScore que lo origina;
+    high_scores sigue guardando el historial completo.
+    """
+    __tablename__ = 'best_scores'
+    __table_args__ = (
+        db.UniqueConstraint('student_nip', 'module_id', name='uq_best_scores_student_module'),
+        db.Index('ix_best_scores_module_score', 'module_id', 'score'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    student_nip = db.Column(db.String(6), db.ForeignKey('students.nip'), nullable=False)
+    module_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Integer, nullable=False)
+    achieved_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    @classmethod
+    def record(cls, student_nip, module_id, score, achieved_at):
+        """Inserta o mejora el score del estudiante en el módulo (sólo si es mayor)"""
+        insert = upsert_insert()
+        if insert is not None:
+            statement = insert(cls).values(
+                student_nip=student_nip,
+                module_id=module_id,
+                score=score,
+                achieved_at=achieved_at
+            )
+            statement = statement.on_conflict_do_update(
+                index_elements=['student_nip', 'module_id'],
+                set_={
+                    'score': statement.excluded.score,
+                    'achieved_at': statement.excluded.achieved_at
+                },
+                where=cls.__table__.c.score < statement.excluded.score
+            )
+            db.session.execute(statement)
+            return
+        
+        best = cls.query.filter_by(student_nip=student_nip, module_id=module_id).with_for_update().first()
+        if not best:
+            db.session.add(cls(student_nip=student_nip, module_id=module_id,
+                               score=score, achieved_at=achieved_at))
+        elif score > best.score:
+            best.score = score
+            best.achieved_at = achieved_at
+    
+    def to_dict(self):
+        return {
+            'student_nip': self.student_nip,
+            'score': self.score,
+            'module_id': self.module_id,
+            'achieved_at': self.achieved_at.isoformat()
+        }
@@ -0,0 +1,39 @@
+"""Peticiones condicionales (ETag) y Cache-Control para respuestas JSON.
+
+Las rutas de sólo lectura que cambian poco (módulos, rankings, progreso)
+devuelven un ETag; si el cliente lo repite en If-None-Match se responde 304
+sin cuerpo. El ETag se deriva del contenido, así que es el mismo en todos los
+workers de gunicorn aunque cada uno tenga su propio caché.
+"""
+import hashlib
+import json
+
+from flask import current_app, jsonify, request
+
+
+def payload_etag(payload):
+    """ETag estable de un payload JSON, para precalcularlo una sola vez"""
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def conditional_json(payload, etag=None, max_age=0):
+    """jsonify(payload) con ETag, o 304 si el cliente ya tiene esa versión.
+
+    Con un etag precalculado el 304 se responde sin serializar nada; si no,
+    el ETag es el hash del cuerpo. Con max_age=0 el cliente puede guardar la
+    respuesta pero debe revalidarla en cada uso.
+    """
+    if etag is not None and request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(payload)
+    if etag is not None:
+        response.set_etag(etag)
+    else:
+        response.add_etag()
+    if max_age:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
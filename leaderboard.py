@@ -0,0 +1,346 @@
+"""Leaderboards materializados en memoria.
+
+Los rankings de monedas (global y por escuela) y de puntuaciones (top global y
+mejor puntuación por estudiante en cada módulo) se construyen desde la base de
+datos al arrancar y se actualizan incrementalmente desde las rutas que
+escriben progreso, de modo que las lecturas no tocan la base de datos.
+
+Cada worker de gunicorn tiene su propia copia; para que los cambios hechos en
+otros workers acaben viéndose, el caché se reconstruye si tiene más de
+LEADERBOARD_MAX_AGE segundos (0 lo desactiva). La reconstrucción de una copia
+caducada corre en un hilo aparte, una a la vez por worker, y mientras tanto
+las peticiones siguen leyendo la copia anterior; sólo la primera construcción
+hace esperar. Las actualizaciones incrementales que llegan mientras se leen
+los datos de la reconstrucción se guardan y se vuelven a aplicar sobre la
+copia nueva, para que no se pierdan al sustituir la anterior.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+
+from flask import current_app
+from src.models.user import db
+from src.models.game_progress import GameProgress, CompletedModule
+from src.models.high_score import HighScore, BestScore
+from src.models.student import Student
+
+LEADERBOARD_MAX_AGE = int(os.environ.get('LEADERBOARD_MAX_AGE', '60'))
+TOP_SCORES_KEPT = 100
+
+
+class RankedBoard:
+    """Ranking ordenado por valor descendente con búsqueda de posición O(log n)"""
+
+    def __init__(self):
+        self._keys = []
+        self._members = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def update(self, member, value, tiebreak, payload):
+        """Inserta o reemplaza la entrada de un miembro"""
+        self.remove(member)
+        key = (-value, tiebreak, member)
+        insort(self._keys, key)
+        self._members[member] = (key, payload)
+
+    def remove(self, member):
+        entry = self._members.pop(member, None)
+        if entry:
+            del self._keys[bisect_left(self._keys, entry[0])]
+
+    def get(self, member):
+        entry = self._members.get(member)
+        return entry[1] if entry else None
+
+    def rank(self, member):
+        """Posición (empezando en 1) del miembro o None si no está"""
+        entry = self._members.get(member)
+        if not entry:
+            return None
+        return bisect_left(self._keys, entry[0]) + 1
+
+    def top(self, limit=10):
+        return [self._members[key[2]][1] for key in self._keys[:limit]]
+
+
+class LeaderboardCache:
+    """Conjunto de rankings servidos por /leaderboard y /highscores"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()
+        self._built_at = None
+        # Actualizaciones recibidas durante una reconstrucción (None si no hay)
+        self._pending = None
+        self._reset()
+
+    def _reset(self):
+        self.coins = RankedBoard()
+        self.coins_by_school = {}
+        self.module_scores = {}
+        self._top_scores = []
+        self._schools = {}
+
+    # -- construcción ---------------------------------------------------
+
+    def rebuild(self):
+        """Reconstruye todos los rankings desde la base de datos"""
+        with self._lock:
+            self._pending = []
+        try:
+            self._rebuild()
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def _rebuild(self):
+        completed_counts = db.session.query(
+            CompletedModule.progress_id.label('progress_id'),
+            db.func.count(CompletedModule.id).label('total')
+        ).group_by(CompletedModule.progress_id).subquery()
+
+        progress_rows = db.session.query(
+            GameProgress.id,
+            GameProgress.user_id,
+            GameProgress.coins,
+            GameProgress.level,
+            db.func.coalesce(completed_counts.c.total, 0),
+            Student.escuela
+        ).outerjoin(
+            completed_counts, completed_counts.c.progress_id == GameProgress.id
+        ).outerjoin(
+            # substr permite buscar por el índice único de students.nip
+            Student, db.and_(
+                Student.nip == db.func.substr(GameProgress.user_id, len('student_') + 1),
+                GameProgress.user_id == db.literal('student_') + Student.nip
+            )
+        ).all()
+
+        # Tuplas en lugar de objetos ORM: sólo se leen para construir los rankings
+        best_scores = db.session.query(
+            BestScore.student_nip, BestScore.module_id, BestScore.score, BestScore.achieved_at
+        ).all()
+
+        top_scores = db.session.query(
+            HighScore.id, HighScore.student_nip, HighScore.score, HighScore.module_id, HighScore.achieved_at
+        ).order_by(
+            HighScore.score.desc(), HighScore.id
+        ).limit(TOP_SCORES_KEPT).all()
+
+        with self._lock:
+            self._reset()
+            for progress_id, user_id, coins, level, completed, escuela in progress_rows:
+                self._schools[user_id] = escuela
+                self._update_coins(progress_id, user_id, coins, level, completed)
+            for student_nip, module_id, score, achieved_at in best_scores:
+                self._update_module_score(student_nip, module_id, score, achieved_at)
+            for score_id, student_nip, score, module_id, achieved_at in top_scores:
+                self._insert_top_score(score_id, student_nip, score, module_id, achieved_at)
+            # Lo que llegó durante las consultas puede no estar en ellas
+            for update, args in self._pending:
+                update(*args)
+            self._built_at = time.monotonic()
+
+    def _is_fresh(self):
+        with self._lock:
+            return self._built_at is not None and (
+                LEADERBOARD_MAX_AGE <= 0 or time.monotonic() - self._built_at <= LEADERBOARD_MAX_AGE
+            )
+
+    def ensure_fresh(self):
+        """Construye el caché si nunca se construyó y lanza su reconstrucción si está caducado"""
+        if self._is_fresh():
+            return
+        if self._built_at is None:
+            # Sin copia que servir: la petición espera a la primera construcción
+            with self._rebuild_lock:
+                if self._built_at is None:
+                    self.rebuild()
+            return
+        # Una sola reconstrucción a la vez y fuera de la petición: mientras
+        # dura, todos siguen leyendo la copia caducada
+        if not self._rebuild_lock.acquire(blocking=False):
+            return
+        if self._is_fresh():
+            self._rebuild_lock.release()
+            return
+        try:
+            app = current_app._get_current_object()
+            threading.Thread(target=self._rebuild_in_background, args=(app,),
+                             name='leaderboard-rebuild', daemon=True).start()
+        except Exception:
+            self._rebuild_lock.release()
+            raise
+
+    def _rebuild_in_background(self, app):
+        try:
+            with app.app_context():
+                self.rebuild()
+        except Exception as e:
+            app.logger.warning('Error reconstruyendo los rankings: %s', e)
+        finally:
+            self._rebuild_lock.release()
+
+    # -- actualizaciones incrementales ----------------------------------
+
+    def record_progress(self, progress, data=None):
+        """Actualiza el ranking de monedas tras guardar un GameProgress.
+
+        data puede ser el progress.to_dict() ya construido, para no releer
+        atributos que el commit ha expirado.
+        """
+        if data is None:
+            data = progress.to_dict()
+        user_id = data['user_id']
+        with self._lock:
+            if not self._tracking():
+                return
+            known = user_id in self._schools
+            escuela = self._schools.get(user_id)
+        # La escuela se consulta fuera del bloqueo: las lecturas no esperan a la BD
+        if not known:
+            escuela = self._lookup_school(user_id)
+        with self._lock:
+            self._apply(self._set_progress, data['id'], user_id, data['coins'],
+                        data['level'], len(data['completed_modules']), escuela)
+
+    def record_new_progress(self, rows):
+        """Añade progresos recién creados en bloque (alta masiva).
+
+        rows son tuplas (progress_id, user_id, coins, level, escuela).
+        """
+        with self._lock:
+            if not self._tracking():
+                return
+            for progress_id, user_id, coins, level, escuela in rows:
+                self._apply(self._set_progress, progress_id, user_id, coins, level, 0, escuela)
+
+    def record_high_score(self, score_id, student_nip, module_id, score, achieved_at):
+        """Actualiza los rankings de puntuación tras guardar un HighScore.
+
+        Recibe valores simples y no el objeto: tras el commit sus atributos
+        están expirados y leerlos lanzaría un SELECT con el bloqueo tomado.
+        """
+        with self._lock:
+            self._apply(self._update_module_score, student_nip, module_id, score, achieved_at)
+            self._apply(self._insert_top_score, score_id, student_nip, score, module_id, achieved_at)
+
+    def remove_user(self, user_id):
+        """Elimina a un usuario de los rankings de monedas"""
+        with self._lock:
+            self._apply(self._remove_user, user_id)
+
+    def _tracking(self):
+        """True si hay rankings o una reconstrucción que recoja las actualizaciones"""
+        return self._built_at is not None or self._pending is not None
+
+    def _apply(self, update, *args):
+        """Aplica una actualización (con _lock tomado) y la guarda si hay una
+        reconstrucción en curso, que la repite sobre la copia nueva"""
+        if self._pending is not None:
+            self._pending.append((update, args))
+        if self._built_at is not None:
+            update(*args)
+
+    def _set_progress(self, progress_id, user_id, coins, level, completed, escuela):
+        if escuela is not None:
+            self._schools[user_id] = escuela
+        else:
+            self._schools.setdefault(user_id, None)
+        self._update_coins(progress_id, user_id, coins, level, completed)
+
+    def _remove_user(self, user_id):
+        self.coins.remove(user_id)
+        escuela = self._schools.get(user_id)
+        if escuela in self.coins_by_school:
+            self.coins_by_school[escuela].remove(user_id)
+
+    def _lookup_school(self, user_id):
+        if not user_id.startswith('student_'):
+            return None
+        return db.session.query(Student.escuela).filter_by(
+            nip=user_id[len('student_'):]
+        ).scalar()
+
+    def _update_coins(self, progress_id, user_id, coins, level, completed):
+        payload = {
+            'user_id': user_id,
+            'coins': coins,
+            'level': level,
+            'completed_modules': completed
+        }
+        self.coins.update(user_id, coins, progress_id, payload)
+        escuela = self._schools.get(user_id)
+        if escuela is not None:
+            self.coins_by_school.setdefault(escuela, RankedBoard()).update(
+                user_id, coins, progress_id, payload
+            )
+
+    def _update_module_score(self, student_nip, module_id, score, achieved_at):
+        board = self.module_scores.setdefault(module_id, RankedBoard())
+        current = board.get(student_nip)
+        if current and current['score'] >= score:
+            return
+        board.update(student_nip, score, achieved_at, {
+            'student_nip': student_nip,
+            'score': score,
+            'module_id': module_id,
+            'achieved_at': achieved_at.isoformat()
+        })
+
+    def _insert_top_score(self, score_id, student_nip, score, module_id, achieved_at):
+        key = (-score, score_id)
+        if len(self._top_scores) >= TOP_SCORES_KEPT and key >= self._top_scores[-1][0]:
+            return
+        position = bisect_left(self._top_scores, (key,))
+        if position < len(self._top_scores) and self._top_scores[position][0] == key:
+            return  # ya está (repetida al reconstruir)
+        insort(self._top_scores, (key, {
+            'student_nip': student_nip,
+            'score': score,
+            'module_id': module_id,
+            'achieved_at': achieved_at.isoformat()
+        }))
+        del self._top_scores[TOP_SCORES_KEPT:]
+
+    # -- lecturas -------------------------------------------------------
+
+    def school_of(self, user_id):
+        """Escuela del usuario según los rankings (None si no se conoce)"""
+        with self._lock:
+            return self._schools.get(user_id)
+
+    def top_coins(self, limit=10, escuela=None):
+        with self._lock:
+            board = self.coins if escuela is None else self.coins_by_school.get(escuela, RankedBoard())
+            return [dict(rank=i, **entry) for i, entry in enumerate(board.top(limit), 1)]
+
+    def coins_rank(self, user_id, escuela=None):
+        with self._lock:
+            board = self.coins if escuela is None else self.coins_by_school.get(escuela, RankedBoard())
+            rank = board.rank(user_id)
+            if rank is None:
+                return None
+            return dict(rank=rank, total=len(board), **board.get(user_id))
+
+    def top_scores(self, limit=10, module_id=None):
+        with self._lock:
+            if module_id is None:
+                entries = [payload for _, payload in self._top_scores[:limit]]
+            else:
+                entries = self.module_scores.get(module_id, RankedBoard()).top(limit)
+            return [dict(rank=i, **entry) for i, entry in enumerate(entries, 1)]
+
+    def score_rank(self, student_nip, module_id):
+        with self._lock:
+            board = self.module_scores.get(module_id)
+            rank = board.rank(student_nip) if board else None
+            if rank is None:
+                return None
+            return dict(rank=rank, total=len(board), **board.get(student_nip))
+
+
+leaderboard = LeaderboardCache()
@@ -3,15 +3,25 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_cors import CORS
 from src.models.user import db
 from src.routes.user import user_bp
 from src.routes.game import game_bp
 from src.routes.auth import auth_bp
+from src.routes.analytics import analytics_bp
+from src.routes.export import export_bp
+from src.routes.events import events_bp
+from src.routes.metrics import metrics_bp
+from src.routes.profiling import profiling_bp
+from src.db_config import configure_database
+from src.serialization import FastJSONProvider
+from src.static_assets import static_manifest, compress_static_command
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+# jsonify con orjson (si está instalado)
+app.json = FastJSONProvider(app)
 
 # Habilitar CORS para todas las rutas
 CORS(app)
@@ -19,36 +29,67 @@ CORS(app)
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(game_bp, url_prefix='/api/game')
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
+app.register_blueprint(analytics_bp, url_prefix='/api/analytics')
+app.register_blueprint(export_bp, url_prefix='/api/export')
+app.register_blueprint(events_bp, url_prefix='/api/events')
+app.register_blueprint(metrics_bp)
+app.register_blueprint(profiling_bp, url_prefix='/api/profiling')
 
-# uncomment if you need to use database
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Base de datos: DATABASE_URL (Postgres) o SQLite con WAL y PRAGMAs de producción
+configure_database(app)
 db.init_app(app)
 
 # Importar modelos después de configurar la app
-from src.models.game_progress import GameProgress, ModuleActivity
-from src.models.student import Student, StudentSession
-from src.models.high_score import HighScore
+from src.models.game_progress import GameProgress, ModuleActivity, CompletedModule, EarnedBadge
+from src.models.student import Student, StudentSession, StudentStats
+from src.models.high_score import HighScore, BestScore
+from src.models.coin_ledger import CoinLedgerEntry
+from src.migrations import run_migrations
+from src.leaderboard import leaderboard
+from src.write_behind import write_behind
+from src.cache import cache
+from src.stats_checker import stats_checker
+from src.pubsub import event_bus
+from src.coin_compaction import ledger_compactor
+from src.request_metrics import request_metrics
+from src.request_profiler import request_profiler
 
-with app.app_context():
+request_metrics.init_app(app)
+request_profiler.init_app(app)
+write_behind.init_app(app)
+cache.init_app(app)
+event_bus.init_app(app)
+
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Crea las tablas que falten y ejecuta las migraciones pendientes"""
     db.create_all()
+    run_migrations()
+
+stats_checker.init_app(app)
+ledger_compactor.init_app(app)
+static_manifest.init_app(app)
+app.cli.add_command(compress_static_command)
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
+    if app.static_folder is None:
             return "Static folder not configured", 404
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
-            return "index.html not found", 404
+    # Ficheros del manifiesto construido al arrancar; el resto son rutas de la SPA
+    response = static_manifest.send(path) if path != "" else None
+    if response is None:
+        response = static_manifest.send('index.html')
+    if response is None:
+        return "index.html not found", 404
+    return response
 
 
 if __name__ == '__main__':
+    with app.app_context():
+        db.create_all()
+        run_migrations()
+        leaderboard.rebuild()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,15 @@
+"""GET /metrics: métricas por petición de este proceso (src.request_metrics)"""
+from flask import Blueprint, Response
+from src.request_metrics import request_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Latencia, consultas SQL, tamaño y errores por ruta en formato Prometheus"""
+    response = Response(request_metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+    response.cache_control.no_store = True
+    return response
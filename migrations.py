@@ -0,0 +1,197 @@
+"""Migraciones de esquema/datos para bases de datos existentes.
+
+db.create_all() crea las tablas nuevas pero no modifica las existentes, así
+que cada migración aquí es idempotente y se ejecuta al arrancar la app.
+"""
+import json
+
+from sqlalchemy import inspect, insert, text
+from src.models.user import db
+from src.db_config import upsert_insert
+from src.models.game_progress import CompletedModule, EarnedBadge
+from src.models.high_score import HighScore, BestScore
+from src.models.student import StudentSession, StudentStats
+
+
+def migrate_progress_json_columns(chunk_size=1000):
+    """Convierte las columnas JSON completed_modules/badges de game_progress
+    en filas de progress_completed_modules y progress_badges.
+
+    Las filas convertidas quedan con ambas columnas a NULL, de modo que volver
+    a ejecutar la migración no duplica datos. Si dos procesos la ejecutan a la
+    vez, cada lote se reclama primero con un UPDATE que vuelve a comprobar las
+    columnas: sólo se migran las filas reclamadas, y los índices únicos de las
+    tablas hijas (con ON CONFLICT DO NOTHING) descartan lo que se repita.
+    """
+    columns = {column['name'] for column in inspect(db.engine).get_columns('game_progress')}
+    if not {'completed_modules', 'badges'} <= columns:
+        return 0
+
+    converted = 0
+    while True:
+        rows = db.session.execute(text(
+            "SELECT id, completed_modules, badges FROM game_progress "
+            "WHERE completed_modules IS NOT NULL OR badges IS NOT NULL "
+            "LIMIT :limit"
+        ), {'limit': chunk_size}).all()
+        if not rows:
+            break
+
+        claimed = {progress_id for (progress_id,) in db.session.execute(text(
+            "UPDATE game_progress SET completed_modules = NULL, badges = NULL "
+            "WHERE id IN ({}) AND (completed_modules IS NOT NULL OR badges IS NOT NULL) "
+            "RETURNING id".format(', '.join(str(row[0]) for row in rows))
+        ))}
+
+        module_rows = []
+        badge_rows = []
+        for progress_id, completed_modules, badges in rows:
+            if progress_id not in claimed:
+                continue  # ya la ha migrado otro proceso
+            for position, module_id in enumerate(json.loads(completed_modules or '[]')):
+                module_rows.append({'progress_id': progress_id, 'module_id': module_id, 'position': position})
+            for position, name in enumerate(json.loads(badges or '[]')):
+                badge_rows.append({'progress_id': progress_id, 'name': name, 'position': position})
+
+        if module_rows:
+            db.session.execute(insert_ignoring_duplicates(CompletedModule), module_rows)
+        if badge_rows:
+            db.session.execute(insert_ignoring_duplicates(EarnedBadge), badge_rows)
+        db.session.commit()
+        converted += len(claimed)
+
+    return converted
+
+
+def insert_ignoring_duplicates(model):
+    """INSERT que descarta las filas que violan un índice único (si la BD lo admite)"""
+    dialect_insert = upsert_insert()
+    if dialect_insert is None:
+        return insert(model)
+    return dialect_insert(model).on_conflict_do_nothing()
+
+
+# Índices únicos añadidos a tablas que pueden tener filas repetidas de
+# ejecuciones simultáneas de migrate_progress_json_columns
+UNIQUE_CHILD_INDEXES = {
+    'progress_completed_modules': ('ux_progress_completed_modules_progress_module', ('progress_id', 'module_id')),
+    'progress_badges': ('ux_progress_badges_progress_name', ('progress_id', 'name')),
+}
+
+
+def remove_duplicate_progress_rows():
+    """Borra las filas repetidas de las tablas hijas antes de crear sus índices únicos"""
+    removed = 0
+    for table_name, (index_name, columns) in UNIQUE_CHILD_INDEXES.items():
+        existing = {index['name'] for index in inspect(db.engine).get_indexes(table_name)}
+        if index_name in existing:
+            continue
+        key = ', '.join(columns)
+        removed += db.session.execute(text(
+            f"DELETE FROM {table_name} WHERE id NOT IN "
+            f"(SELECT MIN(id) FROM {table_name} GROUP BY {key})"
+        )).rowcount
+    db.session.commit()
+    return removed
+
+
+def backfill_best_scores(chunk_size=1000):
+    """Rellena best_scores a partir del historial de high_scores.
+
+    Sólo actúa si best_scores está vacía; en empates gana el score más antiguo.
+    """
+    if db.session.query(BestScore.id).first() is not None:
+        return 0
+
+    history = db.session.query(
+        HighScore.student_nip, HighScore.module_id, HighScore.score, HighScore.achieved_at
+    ).order_by(
+        HighScore.student_nip, HighScore.module_id, HighScore.score.desc(), HighScore.id
+    ).yield_per(chunk_size)
+
+    rows = []
+    seen = None
+    for student_nip, module_id, score, achieved_at in history:
+        if (student_nip, module_id) == seen:
+            continue
+        seen = (student_nip, module_id)
+        rows.append({
+            'student_nip': student_nip,
+            'module_id': module_id,
+            'score': score,
+            'achieved_at': achieved_at
+        })
+
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(insert(BestScore), rows[start:start + chunk_size])
+    db.session.commit()
+    return len(rows)
+
+
+def backfill_student_stats(force=False):
+    """Calcula student_stats desde el historial de student_sessions.
+
+    Sin force sólo actúa si la tabla está vacía y hay sesiones; con force
+    borra y recalcula todos los agregados.
+    """
+    if not force:
+        if db.session.query(StudentStats.student_id).first() is not None:
+            return 0
+        if db.session.query(StudentSession.id).first() is None:
+            return 0
+
+    db.session.query(StudentStats).delete()
+    aggregates = StudentStats.aggregates_query().subquery()
+    result = db.session.execute(insert(StudentStats).from_select(
+        ['student_id', 'total_sessions', 'total_minutes', 'last_seen_at'],
+        db.select(
+            aggregates.c.student_id,
+            aggregates.c.total_sessions,
+            aggregates.c.total_minutes,
+            aggregates.c.last_seen_at
+        )
+    ))
+    db.session.commit()
+    return result.rowcount
+
+
+def create_missing_indexes():
+    """Crea en tablas existentes los índices declarados en los modelos"""
+    created = 0
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspect(db.engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+                created += 1
+    return created
+
+
+# Índices sustituidos por otros compuestos que empiezan por la misma columna
+REPLACED_INDEXES = {
+    'module_activities': ('ix_module_activities_user_id',),
+    'student_sessions': ('ix_student_sessions_student_id',),
+}
+
+
+def drop_replaced_indexes():
+    """Elimina los índices de REPLACED_INDEXES que sigan existiendo"""
+    dropped = 0
+    for table_name, names in REPLACED_INDEXES.items():
+        existing = {index['name'] for index in inspect(db.engine).get_indexes(table_name)}
+        for name in names:
+            if name in existing:
+                db.session.execute(text(f'DROP INDEX {name}'))
+                dropped += 1
+    db.session.commit()
+    return dropped
+
+
+def run_migrations():
+    """Ejecuta todas las migraciones pendientes"""
+    remove_duplicate_progress_rows()
+    create_missing_indexes()
+    drop_replaced_indexes()
+    migrate_progress_json_columns()
+    backfill_best_scores()
+    backfill_student_stats()
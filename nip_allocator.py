@@ -0,0 +1,149 @@
+"""Asignación de NIP sin colisiones.
+
+El NIP base son las iniciales y la fecha DDMM, así que dos alumnos con las
+mismas iniciales y cumpleaños chocan. Cada base tiene 24 NIP posibles: el
+base y 23 alternativas que conservan las iniciales y desplazan el día (+31)
+y el mes (+12). Siguen teniendo 6 caracteres, la fecha se puede recuperar y
+nunca coinciden con el NIP base de otra fecha.
+
+NipAllocator guarda en memoria, por base, un bitmap de 24 bits con los NIP
+ocupados (una sola consulta al cargar, o sólo las bases que se van a usar
+con refresh), así que elegir la alternativa libre no consulta la base de
+datos. Cada worker de gunicorn tiene su propio índice: si otro worker tomó
+el NIP entretanto, el INSERT choca con la restricción única de students.nip:
+quien llama relee de la BD los NIP de esa base (refresh, una consulta por
+tabla) y reintenta con el siguiente libre, hasta NIP_ALLOCATION_RETRIES
+veces.
+"""
+import threading
+
+from src.models.user import db
+from src.models.student import Student
+from src.models.game_progress import GameProgress
+
+DAY_SHIFTS = 3
+MONTH_SHIFTS = 8
+CANDIDATES = DAY_SHIFTS * MONTH_SHIFTS
+NIP_ALLOCATION_RETRIES = 5
+# Bases por consulta al refrescar (24 NIP por base)
+REFRESH_CHUNK = 20
+
+
+def candidate(base, index):
+    """NIP número index (0 = el propio base) de los posibles para base"""
+    day_shift, month_shift = divmod(index, MONTH_SHIFTS)
+    return f"{base[:2]}{int(base[2:4]) + 31 * day_shift:02d}{int(base[4:6]) + 12 * month_shift:02d}"
+
+
+def nip_candidates(base):
+    """NIP base y sus alternativas, en el orden en que se asignan"""
+    for index in range(CANDIDATES):
+        yield candidate(base, index)
+
+
+def decode(nip):
+    """(base, index) de un NIP, o None si no sigue el formato IIDDMM"""
+    if len(nip) != 6 or not nip[2:].isdigit():
+        return None
+    dia, mes = int(nip[2:4]), int(nip[4:6])
+    if not (1 <= dia <= 31 * DAY_SHIFTS and 1 <= mes <= 12 * MONTH_SHIFTS):
+        return None
+    day_shift, month_shift = (dia - 1) // 31, (mes - 1) // 12
+    base = f"{nip[:2]}{dia - 31 * day_shift:02d}{mes - 12 * month_shift:02d}"
+    return base, day_shift * MONTH_SHIFTS + month_shift
+
+
+class NipAllocator:
+    """Índice en memoria de los NIP ocupados, por NIP base"""
+
+    def __init__(self):
+        self._taken = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        # Bases leídas con refresh antes de la carga completa
+        self._refreshed = set()
+
+    def load(self):
+        """Carga los NIP de students (y de progresos sin estudiante) con una consulta por tabla"""
+        taken = {}
+        nips = [nip for (nip,) in db.session.query(Student.nip)]
+        nips.extend(
+            user_id[len('student_'):] for (user_id,) in
+            db.session.query(GameProgress.user_id).filter(GameProgress.user_id.like('student\\_%', escape='\\'))
+        )
+        for nip in nips:
+            decoded = decode(nip)
+            if decoded is not None:
+                base, index = decoded
+                taken[base] = taken.get(base, 0) | (1 << index)
+        with self._lock:
+            # Se conservan las reservas hechas sobre bases ya refrescadas
+            for base in self._refreshed:
+                taken[base] = taken.get(base, 0) | self._taken.get(base, 0)
+            self._taken = taken
+            self._loaded = True
+            self._refreshed.clear()
+
+    def refresh(self, bases):
+        """Relee de la BD los NIP ocupados de esas bases (antes de una importación o tras chocar con otro worker)"""
+        bases = list(bases)
+        for start in range(0, len(bases), REFRESH_CHUNK):
+            nips = [nip for base in bases[start:start + REFRESH_CHUNK] for nip in nip_candidates(base)]
+            used = [nip for (nip,) in db.session.query(Student.nip).filter(Student.nip.in_(nips))]
+            used.extend(user_id[len('student_'):] for (user_id,) in db.session.query(GameProgress.user_id)
+                        .filter(GameProgress.user_id.in_([f'student_{nip}' for nip in nips])))
+            for nip in used:
+                self.mark_taken(nip)
+        if not self._loaded:
+            with self._lock:
+                self._refreshed.update(bases)
+
+    def ensure_loaded(self, base=None):
+        """Carga el índice completo, salvo que base ya se haya leído con refresh"""
+        if self._loaded:
+            return
+        with self._lock:
+            if base is not None and base in self._refreshed:
+                return
+        self.load()
+
+    def reserve(self, base):
+        """Marca y devuelve el primer NIP libre de base, o None si no queda ninguno"""
+        self.ensure_loaded(base)
+        with self._lock:
+            mask = self._taken.get(base, 0)
+            free = ~mask & ((1 << CANDIDATES) - 1)
+            if not free:
+                return None
+            index = (free & -free).bit_length() - 1
+            self._taken[base] = mask | (1 << index)
+        return candidate(base, index)
+
+    def mark_taken(self, nip):
+        decoded = decode(nip)
+        if decoded is not None:
+            base, index = decoded
+            with self._lock:
+                self._taken[base] = self._taken.get(base, 0) | (1 << index)
+
+    def release(self, nip):
+        """Libera un NIP reservado que al final no se insertó"""
+        decoded = decode(nip) if nip else None
+        if decoded is not None:
+            base, index = decoded
+            with self._lock:
+                self._taken[base] = self._taken.get(base, 0) & ~(1 << index)
+
+    def taken_candidates(self, base):
+        """NIP ocupados de base según el índice"""
+        self.ensure_loaded(base)
+        with self._lock:
+            mask = self._taken.get(base, 0)
+        return [candidate(base, index) for index in range(CANDIDATES) if mask >> index & 1]
+
+    def __len__(self):
+        with self._lock:
+            return sum(bin(mask).count('1') for mask in self._taken.values())
+
+
+nip_allocator = NipAllocator()
@@ -0,0 +1,87 @@
+"""Paginación por cursor y proyección de campos para los listados.
+
+El cursor '<created_at>,<id>' identifica la última fila de la página
+anterior; la página siguiente empieza justo después en orden (created_at, id)
+descendente, así que cada página cuesta lo mismo aunque el historial crezca.
+
+?fields= limita las columnas que se leen de la base de datos; las columnas
+con texto JSON sólo se decodifican si se piden.
+"""
+from datetime import datetime
+
+from src.models.user import db
+from src.serialization import loads
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def parse_cursor(cursor):
+    """Convierte un cursor '<created_at>,<id>' en una tupla (datetime, int)"""
+    try:
+        created_at, row_id = cursor.rsplit(',', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        raise ValueError('Cursor de paginación inválido') from None
+
+
+def parse_since(value):
+    """Valida ?since= (fecha ISO 8601); None si no viene"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError('since debe ser una fecha ISO 8601') from None
+
+
+def encode_cursor(created_at, row_id):
+    return f"{created_at.isoformat()},{row_id}"
+
+
+def parse_limit(value, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    """Valida ?limit= (entero >= 1, recortado a maximum)"""
+    try:
+        limit = default if value in (None, '') else int(value)
+    except ValueError:
+        raise ValueError('El parámetro limit debe ser un número entero') from None
+    if limit < 1:
+        raise ValueError('El parámetro limit debe ser mayor que 0')
+    return min(limit, maximum)
+
+
+def after_cursor(created_column, id_column, cursor):
+    """Condición de las filas posteriores al cursor en orden descendente"""
+    created_at, row_id = cursor
+    return db.or_(
+        created_column < created_at,
+        db.and_(created_column == created_at, id_column < row_id)
+    )
+
+
+def parse_fields(value, allowed):
+    """Valida ?fields=a,b,c; sin valor devuelve todos los campos permitidos"""
+    if not value:
+        return list(allowed)
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown or not fields:
+        raise ValueError(f"Campos desconocidos: {', '.join(unknown)}; usa {', '.join(allowed)}")
+    return fields
+
+
+def project_rows(rows, fields, json_defaults=None):
+    """Convierte tuplas (en el orden de fields) en diccionarios para JSON.
+
+    Las fechas salen en ISO 8601 y los campos de json_defaults se decodifican
+    (con ese valor por defecto si están vacíos).
+    """
+    json_defaults = json_defaults or {}
+    decoded = [(index, json_defaults[field]) for index, field in enumerate(fields) if field in json_defaults]
+    data = []
+    for row in rows:
+        values = [value.isoformat() if isinstance(value, datetime) else value for value in row]
+        for index, default in decoded:
+            values[index] = loads(values[index]) if values[index] else default.copy()
+        data.append(dict(zip(fields, values)))
+    return data
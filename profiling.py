@@ -0,0 +1,139 @@
+"""Consulta de los perfiles guardados por src.request_profiler.
+
+GET /api/profiling/profiles?limit= lista los últimos perfiles; cada uno se
+descarga completo (JSON), como pilas colapsadas (texto para flamegraph.pl o
+speedscope) o como volcado pstats (snakeviz, `python -m pstats`). Las rutas
+exigen la cabecera X-Profile con PROFILE_TOKEN; sin token configurado (por
+ejemplo, sólo con PROFILE_SAMPLE_RATE) responden 404 y los perfiles sólo se
+leen con la CLI.
+
+    flask --app main profiling list -n 10
+    flask --app main profiling download <id> --format collapsed --output perfil.txt
+"""
+import shutil
+import sys
+
+import click
+from flask import Blueprint, Response, request, jsonify, send_file
+from src.request_profiler import request_profiler, collapsed_text
+from src.serialization import dumps
+from src.pagination import parse_limit
+
+profiling_bp = Blueprint('profiling', __name__)
+
+PROFILE_FORMATS = ('json', 'collapsed', 'pstats')
+PROFILE_LIST_MAX = 1000
+
+
+@profiling_bp.before_request
+def require_token():
+    if request_profiler.token is None:
+        return jsonify({
+            'success': False,
+            'error': 'Recurso no encontrado'
+        }), 404
+    if not request_profiler.authorized():
+        return jsonify({
+            'success': False,
+            'error': 'Falta la cabecera X-Profile con el token de perfilado'
+        }), 403
+
+
+@profiling_bp.route('/profiles', methods=['GET'])
+def list_profiles():
+    """Últimos perfiles guardados (ruta, duración, consultas SQL), del más reciente al más antiguo"""
+    try:
+        try:
+            limit = parse_limit(request.args.get('limit'), default=20, maximum=PROFILE_LIST_MAX)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        return jsonify({
+            'success': True,
+            'data': request_profiler.summaries(limit)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@profiling_bp.route('/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Perfil completo: consultas SQL con su tiempo y pilas colapsadas"""
+    profile = request_profiler.load(profile_id)
+    if profile is None:
+        return jsonify({
+            'success': False,
+            'error': 'Perfil no encontrado'
+        }), 404
+    return jsonify({
+        'success': True,
+        'data': profile
+    })
+
+
+@profiling_bp.route('/profiles/<profile_id>/collapsed', methods=['GET'])
+def get_profile_collapsed(profile_id):
+    """Pilas colapsadas en texto ("a;b;c microsegundos")"""
+    profile = request_profiler.load(profile_id)
+    if profile is None:
+        return jsonify({
+            'success': False,
+            'error': 'Perfil no encontrado'
+        }), 404
+    return Response(collapsed_text(profile), mimetype='text/plain')
+
+
+@profiling_bp.route('/profiles/<profile_id>/pstats', methods=['GET'])
+def get_profile_pstats(profile_id):
+    """Volcado binario de pstats"""
+    path = request_profiler.path(profile_id, '.prof')
+    if path is None:
+        return jsonify({
+            'success': False,
+            'error': 'Perfil no encontrado'
+        }), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f'{profile_id}.prof')
+
+
+@profiling_bp.cli.command('list')
+@click.option('-n', 'limit', type=int, default=20, help='Número de perfiles')
+def list_command(limit):
+    """Lista los últimos perfiles guardados"""
+    for profile in request_profiler.summaries(limit):
+        click.echo(f"{profile['id']}  {profile['created_at']}  {profile['method']} {profile['route']}  "
+                   f"{profile['status']}  {profile['duration_ms']:.1f} ms  "
+                   f"sql={profile['sql_queries']} ({profile['sql_ms']:.1f} ms)")
+
+
+@profiling_bp.cli.command('download')
+@click.argument('profile_id')
+@click.option('--format', 'profile_format', type=click.Choice(PROFILE_FORMATS), default='collapsed')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), default=None,
+              help='Fichero de salida (por defecto la salida estándar; obligatorio con pstats)')
+def download_command(profile_id, profile_format, output):
+    """Escribe un perfil como JSON, pilas colapsadas o volcado pstats"""
+    if profile_format == 'pstats':
+        path = request_profiler.path(profile_id, '.prof')
+        if path is None:
+            raise click.ClickException('Perfil no encontrado')
+        if not output:
+            raise click.ClickException('El volcado pstats es binario: indica --output')
+        shutil.copyfile(path, output)
+        return
+
+    profile = request_profiler.load(profile_id)
+    if profile is None:
+        raise click.ClickException('Perfil no encontrado')
+    text = collapsed_text(profile) if profile_format == 'collapsed' else dumps(profile)
+    stream = open(output, 'w', encoding='utf-8') if output else sys.stdout
+    try:
+        stream.write(text)
+    finally:
+        if output:
+            stream.close()
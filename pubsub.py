@@ -0,0 +1,291 @@
+"""Pub/sub en proceso para los eventos en vivo (SSE).
+
+Las rutas de escritura publican un evento por canal ('leaderboard',
+'leaderboard:<escuela>', 'progress:<user_id>') y EventBus lo reparte a las
+suscripciones abiertas en este proceso. Cada evento se codifica una sola vez
+como trama SSE y la misma cadena se entrega a todos los suscriptores, así que
+el coste por cliente conectado es un put() en su cola, sin consultas.
+
+Con varios workers de gunicorn los eventos pasan por un broker
+(EVENTS_BROKER):
+- local (por defecto): sin broker, sólo llegan a los clientes del mismo proceso.
+- redis: pub/sub de Redis (EVENTS_REDIS_URL, requiere el paquete redis).
+- memory: InMemoryBroker, sustituto local con la misma interfaz que redis
+  para pruebas y benchmarks (varios EventBus compartiendo un broker).
+Con broker, cada proceso tiene un hilo suscrito que reparte lo recibido; si
+la conexión con el broker se corta, el hilo se vuelve a suscribir con
+backoff exponencial (los eventos perdidos entretanto no se recuperan, pero
+cada evento lleva el estado completo).
+
+Cada cliente conectado ocupa un hilo o greenlet: EVENTS_MAX_SUBSCRIBERS
+limita las suscripciones por proceso (2000 con gevent; con hilos,
+gunicorn.conf.py lo deriva de los hilos por worker).
+"""
+import os
+import queue
+import random
+import threading
+import time
+from fnmatch import fnmatchcase
+
+try:
+    import redis
+except ImportError:  # El broker redis es opcional
+    redis = None
+
+from src.db_config import cooperative_mode
+from src.serialization import dumps
+
+CHANNEL_PREFIX = 'aventura:events:'
+# Suscripciones por proceso si no se indica EVENTS_MAX_SUBSCRIBERS
+COOPERATIVE_MAX_SUBSCRIBERS = 2000
+THREADED_MAX_SUBSCRIBERS = 2
+LISTEN_RETRY_BASE_DELAY = 0.5
+LISTEN_RETRY_MAX_DELAY = 30
+
+
+def sse_frame(event, data):
+    """Trama SSE de un evento con datos JSON (una sola línea)"""
+    return f'event: {event}\ndata: {dumps(data)}\n\n'
+
+
+class Subscription:
+    """Cola acotada de tramas de un cliente conectado.
+
+    Si el cliente no lee a tiempo se descartan las tramas más antiguas: los
+    eventos llevan el estado completo, así que basta con el último.
+    """
+
+    def __init__(self, channels, max_queue=100):
+        self.channels = tuple(channels)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def put(self, frame):
+        while True:
+            try:
+                self._queue.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Siguiente trama, o None si no llega ninguna en timeout segundos"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class InMemoryPubSub:
+    """Suscripción por patrón de InMemoryBroker (psubscribe/listen/close)"""
+
+    def __init__(self, broker):
+        self._broker = broker
+        self._queue = queue.Queue()
+        self._patterns = []
+
+    def psubscribe(self, pattern):
+        self._patterns.append(pattern)
+        self._broker._add(self)
+
+    def _deliver(self, channel, data):
+        if any(fnmatchcase(channel, pattern) for pattern in self._patterns):
+            self._queue.put({'type': 'pmessage', 'channel': channel, 'data': data})
+
+    def listen(self):
+        while True:
+            message = self._queue.get()
+            if message is None:
+                return
+            yield message
+
+    def close(self):
+        self._broker._remove(self)
+        self._queue.put(None)
+
+
+class InMemoryBroker:
+    """Sustituto en memoria del pub/sub de redis (publish/pubsub)"""
+
+    def __init__(self):
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def _add(self, listener):
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def _remove(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def publish(self, channel, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener._deliver(channel, data)
+        return len(listeners)
+
+    def pubsub(self):
+        return InMemoryPubSub(self)
+
+
+class EventBus:
+    """Reparte eventos a las suscripciones de este proceso"""
+
+    def __init__(self):
+        self.broker = None
+        self.name = 'local'
+        self.max_queue = 100
+        self.max_subscribers = 2000
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._listener = None
+        self._pid = None
+        self._app = None
+        self.published = 0
+        self.delivered = 0
+
+    def init_app(self, app):
+        """Elige el broker a partir de las variables de entorno"""
+        self._app = app
+        self.max_queue = int(os.environ.get('EVENTS_MAX_QUEUE', '100'))
+        default_max = COOPERATIVE_MAX_SUBSCRIBERS if cooperative_mode() else THREADED_MAX_SUBSCRIBERS
+        self.max_subscribers = int(os.environ.get('EVENTS_MAX_SUBSCRIBERS', default_max))
+        name = os.environ.get('EVENTS_BROKER', 'local')
+        if name == 'local':
+            broker = None
+        elif name == 'redis':
+            if redis is None:
+                raise RuntimeError('EVENTS_BROKER=redis requiere el paquete redis')
+            broker = redis.Redis.from_url(os.environ['EVENTS_REDIS_URL'])
+        elif name == 'memory':
+            broker = InMemoryBroker()
+        else:
+            raise RuntimeError(f'EVENTS_BROKER desconocido: {name}')
+        self.use(broker, name)
+
+    def use(self, broker, name=None):
+        """Sustituye el broker (None = sólo en proceso)"""
+        self.broker = broker
+        self.name = name or (type(broker).__name__ if broker is not None else 'local')
+        self._listener = None
+        self._pid = None
+
+    # -- suscripciones --------------------------------------------------
+
+    def subscribe(self, channels):
+        """Abre una suscripción, o devuelve None si se alcanzó el máximo"""
+        self._ensure_listening()
+        subscription = Subscription(channels, self.max_queue)
+        with self._lock:
+            if self.subscriber_count() >= self.max_subscribers:
+                return None
+            for channel in subscription.channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def subscriber_count(self):
+        return len({s for subscribers in self._subscribers.values() for s in subscribers})
+
+    # -- publicación ----------------------------------------------------
+
+    def publish(self, channel, event, data):
+        """Publica un evento; con broker llega también a los demás procesos"""
+        frame = sse_frame(event, data)
+        self.published += 1
+        if self.broker is None:
+            self._fan_out(channel, frame)
+            return
+        self._ensure_listening()
+        self.broker.publish(CHANNEL_PREFIX + channel, frame)
+
+    def _fan_out(self, channel, frame):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(frame)
+        self.delivered += len(subscribers)
+
+    # -- broker ---------------------------------------------------------
+
+    def _ensure_listening(self):
+        # Un hilo por proceso; tras un fork el del padre no existe en el hijo
+        if self.broker is None or (self._listener is not None and self._pid == os.getpid()):
+            return
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                return
+            pubsub = self._broker_subscribe(self.broker)
+            self._pid = os.getpid()
+            self._listener = threading.Thread(target=self._listen, args=(self.broker, pubsub),
+                                              name='event-bus', daemon=True)
+            self._listener.start()
+
+    @staticmethod
+    def _broker_subscribe(broker):
+        pubsub = broker.pubsub()
+        pubsub.psubscribe(CHANNEL_PREFIX + '*')
+        return pubsub
+
+    def _listen(self, broker, pubsub):
+        """Reparte los mensajes del broker; tras un corte se vuelve a suscribir"""
+        delay = LISTEN_RETRY_BASE_DELAY
+        while self.broker is broker:
+            try:
+                if pubsub is None:
+                    pubsub = self._broker_subscribe(broker)
+                for message in pubsub.listen():
+                    delay = LISTEN_RETRY_BASE_DELAY
+                    if message.get('type') != 'pmessage':
+                        continue
+                    channel = message['channel']
+                    if isinstance(channel, bytes):
+                        channel = channel.decode('utf-8')
+                    data = message['data']
+                    self._fan_out(channel[len(CHANNEL_PREFIX):],
+                                  data.decode('utf-8') if isinstance(data, bytes) else data)
+                return  # suscripción cerrada
+            except Exception as e:
+                if self._app is not None:
+                    self._app.logger.warning('Conexión con el broker de eventos perdida (%s); reintento en %.1f s',
+                                             e, delay)
+                try:
+                    if pubsub is not None:
+                        pubsub.close()
+                except Exception:
+                    pass
+                pubsub = None
+                time.sleep(delay * (0.5 + random.random()))
+                delay = min(delay * 2, LISTEN_RETRY_MAX_DELAY)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'broker': self.name,
+                'subscribers': self.subscriber_count(),
+                'channels': len(self._subscribers),
+                'published': self.published,
+                'delivered': self.delivered
+            }
+
+
+event_bus = EventBus()
@@ -0,0 +1,244 @@
+"""Métricas por petición en formato Prometheus.
+
+RequestMetrics.init_app instala before/after_request en la app y escucha los
+eventos de SQLAlchemy de todos los engines. Por cada petición se registra,
+con la regla de la ruta como etiqueta (/api/game/progress/<user_id>, no el
+user_id concreto):
+
+- latencia hasta devolver la respuesta (en las respuestas en streaming, como
+  SSE o las exportaciones, no incluye el envío del cuerpo),
+- número de consultas SQL y tiempo total en la base de datos,
+- tamaño de la respuesta (si se conoce de antemano),
+- errores por clase: las excepciones de la BD se cuentan aunque la ruta las
+  capture y devuelva un 500 con str(e), o retry_on_lock las reintente (así
+  aparecen los bloqueos de SQLite), y también las excepciones no capturadas.
+
+GET /metrics las devuelve en formato de texto de Prometheus. Son de cada
+proceso: con varios workers de gunicorn cada scrape ve el worker que atiende
+la petición.
+
+Con SLOW_QUERY_MS > 0 cada consulta más lenta se registra con logger.warning
+junto con la ruta y el SQL (sin parámetros: pueden llevar datos de alumnos).
+METRICS_ENABLED=0 desactiva todo.
+"""
+import os
+import threading
+import time
+
+from flask import current_app, g, got_request_exception, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SQL_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class Histogram:
+    """Histograma acumulativo con buckets fijos"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        """(le, acumulado) de cada bucket, terminando en +Inf"""
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+
+def route_label():
+    """Regla de la ruta de la petición actual (o 'unmatched' si no hay)"""
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+class RequestMetrics:
+    """Latencia, SQL, tamaño y errores por ruta de este proceso"""
+
+    HISTOGRAMS = (
+        ('http_request_duration_seconds', 'Latencia de la petición', LATENCY_BUCKETS),
+        ('http_request_sql_queries', 'Consultas SQL por petición', QUERY_COUNT_BUCKETS),
+        ('http_request_sql_duration_seconds', 'Tiempo en la base de datos por petición', SQL_TIME_BUCKETS),
+        ('http_response_size_bytes', 'Tamaño de la respuesta', SIZE_BUCKETS),
+    )
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_ms = 0
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._requests = {}
+        self._errors = {}
+        self.slow_queries = 0
+
+    def init_app(self, app):
+        self.enabled = os.environ.get('METRICS_ENABLED', '1') == '1'
+        self.slow_query_ms = float(os.environ.get('SLOW_QUERY_MS', '0'))
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        got_request_exception.connect(self._on_exception, app, weak=False)
+        if not event.contains(Engine, 'before_cursor_execute', self._before_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_execute)
+            event.listen(Engine, 'handle_error', self._on_db_error)
+
+    # Hooks de Flask
+
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_sql_queries = 0
+        g.metrics_sql_time = 0.0
+        g.metrics_errors = []
+
+    def _after_request(self, response):
+        start = g.get('metrics_start')
+        if start is not None:
+            self.observe(
+                route_label(), request.method, response.status_code,
+                time.perf_counter() - start,
+                g.metrics_sql_queries, g.metrics_sql_time,
+                None if response.is_streamed else response.content_length,
+                g.metrics_errors
+            )
+        return response
+
+    def _on_exception(self, sender, exception, **extra):
+        if 'metrics_errors' in g:
+            g.metrics_errors.append(type(exception).__name__)
+
+    # Eventos de SQLAlchemy (fuera de una petición no se registra nada)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'metrics_start' in g:
+            context._metrics_query_start = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_metrics_query_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        g.metrics_sql_queries += 1
+        g.metrics_sql_time += elapsed
+        if self.slow_query_ms and elapsed * 1000 >= self.slow_query_ms:
+            with self._lock:
+                self.slow_queries += 1
+            current_app.logger.warning(
+                'Consulta lenta (%.1f ms) en %s %s: %s',
+                elapsed * 1000, request.method, route_label(), ' '.join(statement.split())
+            )
+
+    def _on_db_error(self, exception_context):
+        if has_request_context() and 'metrics_errors' in g:
+            error = exception_context.sqlalchemy_exception or exception_context.original_exception
+            g.metrics_errors.append(type(error).__name__)
+
+    # Registro y exposición
+
+    def observe(self, route, method, status, duration, sql_queries, sql_time, size, errors):
+        key = (route, method)
+        with self._lock:
+            histograms = self._histograms.get(key)
+            if histograms is None:
+                histograms = self._histograms[key] = [Histogram(buckets) for _, _, buckets in self.HISTOGRAMS]
+            histograms[0].observe(duration)
+            histograms[1].observe(sql_queries)
+            histograms[2].observe(sql_time)
+            if size is not None:
+                histograms[3].observe(size)
+            request_key = (route, method, status)
+            self._requests[request_key] = self._requests.get(request_key, 0) + 1
+            for error in errors:
+                error_key = (route, method, error)
+                self._errors[error_key] = self._errors.get(error_key, 0) + 1
+
+    def render(self):
+        """Texto en formato de exposición de Prometheus"""
+        with self._lock:
+            histograms = {key: [(h.sum, h.count, list(h.samples())) for h in values]
+                          for key, values in self._histograms.items()}
+            requests_total = dict(self._requests)
+            errors_total = dict(self._errors)
+            slow_queries = self.slow_queries
+
+        lines = [
+            '# HELP http_requests_total Peticiones atendidas',
+            '# TYPE http_requests_total counter',
+        ]
+        for (route, method, status), count in sorted(requests_total.items()):
+            lines.append(f'http_requests_total{format_labels([("route", route), ("method", method), ("status", status)])} {count}')
+
+        lines += [
+            '# HELP http_request_errors_total Errores por clase (también los capturados por la ruta)',
+            '# TYPE http_request_errors_total counter',
+        ]
+        for (route, method, error), count in sorted(errors_total.items()):
+            lines.append(f'http_request_errors_total{format_labels([("route", route), ("method", method), ("error", error)])} {count}')
+
+        for index, (name, description, _) in enumerate(self.HISTOGRAMS):
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+            for (route, method), values in sorted(histograms.items()):
+                total, count, samples = values[index]
+                labels = [('route', route), ('method', method)]
+                for bound, cumulative in samples:
+                    lines.append(f'{name}_bucket{format_labels(labels + [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {total}')
+                lines.append(f'{name}_count{format_labels(labels)} {count}')
+
+        lines += [
+            '# HELP sql_slow_queries_total Consultas más lentas que SLOW_QUERY_MS',
+            '# TYPE sql_slow_queries_total counter',
+            f'sql_slow_queries_total {slow_queries}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """Totales por (ruta, método): peticiones, consultas, tiempo SQL, bytes y excepciones"""
+        with self._lock:
+            totals = {}
+            for key, (duration, queries, sql_time, size) in self._histograms.items():
+                totals[key] = {
+                    'requests': duration.count,
+                    'sql_queries': queries.sum,
+                    'sql_seconds': sql_time.sum,
+                    'bytes': size.sum,
+                    'exceptions': 0,
+                }
+            for (route, method, _), count in self._errors.items():
+                totals[(route, method)]['exceptions'] += count
+            return totals
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._requests.clear()
+            self._errors.clear()
+            self.slow_queries = 0
+
+
+request_metrics = RequestMetrics()
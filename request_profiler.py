@@ -0,0 +1,264 @@
+"""Perfiles cProfile de peticiones concretas, bajo demanda.
+
+Una petición se perfila si lleva la cabecera X-Profile con el valor de
+PROFILE_TOKEN, o al azar con probabilidad PROFILE_SAMPLE_RATE (0-1). Sin
+ninguna de las dos variables init_app no instala nada: el resto de peticiones
+no paga ningún coste. Con ellas, cada petición sólo consulta una cabecera y
+un número aleatorio.
+
+Cada perfil guarda la ruta, la duración, las consultas SQL con su tiempo (sin
+parámetros), las pilas colapsadas ("a;b;c microsegundos", el formato de
+flamegraph.pl y speedscope) y el volcado de pstats. Se escriben en
+PROFILE_DIR (por defecto aventura-profiles/ en el directorio temporal, fuera
+del código) para que todos los workers y `flask profiling` los vean; se
+conservan los PROFILE_KEEP más recientes. La respuesta perfilada lleva la
+cabecera X-Profile-Id. Las rutas de consulta (src.routes.profiling) sólo
+responden si PROFILE_TOKEN está definido.
+
+cProfile mide el hilo de la petición hasta after_request: en las respuestas
+en streaming no incluye el envío del cuerpo. Sólo se perfila una petición a
+la vez por proceso (con gevent comparten hilo); las demás siguen sin perfil.
+Las pilas se reconstruyen a partir del grafo de llamadas de cProfile,
+repartiendo el tiempo de cada función entre sus llamadores.
+"""
+import cProfile
+import hmac
+import itertools
+import os
+import pstats
+import random
+import re
+import tempfile
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from src.request_metrics import route_label
+from src.serialization import dumps, loads
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ID = re.compile(r'^[0-9]+-[0-9]+-[0-9]+$')
+MAX_STACK_DEPTH = 64
+MIN_STACK_SECONDS = 1e-6
+MIN_STACK_SHARE = 0.0005
+
+
+def default_profile_dir():
+    return os.path.join(tempfile.gettempdir(), 'aventura-profiles')
+
+
+def function_label(function):
+    """module.py:línea(nombre) de una entrada de pstats"""
+    filename, line, name = function
+    if filename == '~':
+        return name
+    return f'{os.path.basename(filename)}:{line}({name})'
+
+
+def collapsed_stacks(stats):
+    """Pilas colapsadas {"a;b;c": microsegundos de tiempo propio} de un pstats.Stats"""
+    entries = stats.stats
+    children = {}
+    for function, (_, _, _, _, callers) in entries.items():
+        for caller in callers:
+            children.setdefault(caller, []).append(function)
+    roots = [function for function, entry in entries.items() if not entry[4]]
+    # Las ramas por debajo de este tiempo no se recorren: el número de
+    # caminos del grafo crece exponencialmente con la profundidad
+    min_time = max(MIN_STACK_SECONDS, sum(entries[root][3] for root in roots) * MIN_STACK_SHARE)
+
+    stacks = {}
+
+    def walk(function, path, budget):
+        # budget: tiempo de esta función en este camino
+        cumtime = entries[function][3]
+        path = path + (function_label(function),)
+        fraction = min(1.0, budget / cumtime) if cumtime > 0 else 0.0
+        calls = []
+        if len(path) < MAX_STACK_DEPTH:
+            for child in children.get(function, ()):
+                if function_label(child) in path:
+                    continue  # recursión: su tiempo ya está en la rama actual
+                calls.append((child, entries[child][4][function][3] * fraction))
+        # Con recursión cProfile cuenta el tiempo acumulado más de una vez:
+        # los hijos nunca reciben más tiempo que el que le queda al padre
+        total = sum(seconds for _, seconds in calls)
+        scale = min(1.0, budget / total) if total > 0 else 0.0
+        # El tiempo de las ramas que no se recorren se queda en esta función
+        self_time = budget
+        for child, seconds in calls:
+            if seconds * scale >= min_time:
+                walk(child, path, seconds * scale)
+                self_time -= seconds * scale
+        if self_time > 0:
+            key = ';'.join(path)
+            stacks[key] = stacks.get(key, 0) + self_time
+
+    for root in roots:
+        walk(root, (), entries[root][3])
+    return {stack: round(seconds * 1e6) for stack, seconds in stacks.items() if seconds * 1e6 >= 1}
+
+
+class RequestProfiler:
+    """Perfila peticiones con cProfile por cabecera o muestreo"""
+
+    def __init__(self):
+        self.token = None
+        self.sample_rate = 0.0
+        self.directory = default_profile_dir()
+        self.keep = 20
+        self._busy = threading.Lock()
+        self._sequence = itertools.count(1)
+
+    @property
+    def enabled(self):
+        return bool(self.token) or self.sample_rate > 0
+
+    def init_app(self, app):
+        self.token = os.environ.get('PROFILE_TOKEN') or None
+        self.sample_rate = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+        self.directory = os.environ.get('PROFILE_DIR') or default_profile_dir()
+        self.keep = int(os.environ.get('PROFILE_KEEP', '20'))
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        if not event.contains(Engine, 'before_cursor_execute', self._before_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_execute)
+
+    def authorized(self):
+        """True si la petición lleva el token de perfilado (comparación en tiempo constante)"""
+        provided = request.headers.get(PROFILE_HEADER)
+        if not self.token or not provided:
+            return False
+        return hmac.compare_digest(provided.encode('utf-8'), self.token.encode('utf-8'))
+
+    def _before_request(self):
+        if request.blueprint == 'profiling':
+            return  # la consulta de perfiles usa la misma cabecera
+        if not (self.authorized() or (self.sample_rate and random.random() < self.sample_rate)):
+            return
+        # Un solo perfil a la vez: cProfile no admite dos activos en el mismo hilo
+        if not self._busy.acquire(blocking=False):
+            return
+        g.profile_queries = []
+        g.profile_start = time.perf_counter()
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+    def _after_request(self, response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        try:
+            profiler.disable()
+            duration = time.perf_counter() - g.profile_start
+            profile_id = self.save(profiler, duration, response.status_code, g.profile_queries)
+            response.headers['X-Profile-Id'] = profile_id
+        except Exception as e:
+            current_app.logger.warning('Error guardando el perfil: %s', e)
+        finally:
+            self._busy.release()
+        return response
+
+    def _teardown_request(self, exc):
+        # after_request no llegó a ejecutarse: liberar el perfilador sin guardar
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            self._busy.release()
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'profiler' in g:
+            context._profile_query_start = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_profile_query_start', None)
+        if start is not None and 'profiler' in g:
+            g.profile_queries.append({
+                'sql': ' '.join(statement.split()),
+                'ms': round((time.perf_counter() - start) * 1000, 3)
+            })
+
+    # Almacenamiento
+
+    def next_id(self):
+        return f'{int(time.time() * 1000)}-{os.getpid()}-{next(self._sequence)}'
+
+    def save(self, profiler, duration, status, queries):
+        """Escribe el perfil (JSON con las pilas colapsadas y volcado pstats) y devuelve su id"""
+        profile_id = self.next_id()
+        stats = pstats.Stats(profiler)
+        profile = {
+            'id': profile_id,
+            'route': route_label(),
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': status,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime()),
+            'duration_ms': round(duration * 1000, 3),
+            'sql_queries': len(queries),
+            'sql_ms': round(sum(query['ms'] for query in queries), 3),
+            'queries': queries,
+            'stacks': collapsed_stacks(stats),
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        stats.dump_stats(os.path.join(self.directory, f'{profile_id}.prof'))
+        with open(os.path.join(self.directory, f'{profile_id}.json'), 'w', encoding='utf-8') as f:
+            f.write(dumps(profile))
+        self.prune()
+        return profile_id
+
+    def profile_ids(self):
+        """Ids guardados, del más reciente al más antiguo"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        ids = [name[:-len('.json')] for name in names if name.endswith('.json')]
+        return sorted(ids, key=lambda profile_id: [int(part) for part in profile_id.split('-')], reverse=True)
+
+    def prune(self):
+        for profile_id in self.profile_ids()[self.keep:]:
+            for extension in ('.json', '.prof'):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + extension))
+                except FileNotFoundError:
+                    pass  # Otro worker ya lo ha borrado
+
+    def path(self, profile_id, extension):
+        """Ruta del fichero de un perfil, o None si el id no es válido o no existe"""
+        if not PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.directory, profile_id + extension)
+        return path if os.path.exists(path) else None
+
+    def load(self, profile_id):
+        path = self.path(profile_id, '.json')
+        if path is None:
+            return None
+        with open(path, encoding='utf-8') as f:
+            return loads(f.read())
+
+    def summaries(self, limit):
+        """Metadatos de los últimos perfiles (sin consultas ni pilas)"""
+        summaries = []
+        for profile_id in self.profile_ids()[:limit]:
+            profile = self.load(profile_id)
+            if profile is not None:
+                summaries.append({key: value for key, value in profile.items() if key not in ('queries', 'stacks')})
+        return summaries
+
+
+def collapsed_text(profile):
+    """Pilas colapsadas en texto, una por línea (de más a menos tiempo)"""
+    stacks = sorted(profile['stacks'].items(), key=lambda item: item[1], reverse=True)
+    return ''.join(f'{stack} {micros}\n' for stack, micros in stacks)
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,68 @@
+"""Serialización JSON rápida.
+
+FastJSONProvider sustituye al proveedor JSON de Flask (jsonify,
+request.get_json) y codifica con orjson, que es varias veces más rápido que
+el módulo json estándar y escribe directamente bytes UTF-8. La salida
+conserva lo que hacía Flask: claves ordenadas, fechas datetime en formato
+HTTP y sangría en modo debug. Si orjson no está instalado se usa el
+proveedor estándar sin cambios.
+
+dumps/loads ofrecen lo mismo fuera de una respuesta (exportaciones, caché).
+"""
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional; sin él se usa json
+    orjson = None
+
+if orjson is not None:
+    # Los datetime pasan a default() para mantener el formato HTTP de Flask
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps(obj):
+    """Codifica obj como texto JSON compacto (UTF-8, sin escapar)"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=ORJSON_OPTIONS).decode()
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(data):
+    """Decodifica texto o bytes JSON"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Proveedor JSON de Flask respaldado por orjson"""
+
+    def _options(self, indent=False):
+        option = ORJSON_OPTIONS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        # Con argumentos de json.dumps (indent, cls...) se respeta el comportamiento estándar
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._options(indent))
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,244 @@
+"""Servicio de los ficheros estáticos del frontend.
+
+Al arrancar se construye un manifiesto de la carpeta static (ruta relativa ->
+tamaño, mtime, hash de contenido y variantes precomprimidas), así que servir
+un fichero o una ruta de la SPA no toca el sistema de ficheros salvo para
+enviar el propio fichero. Con STATIC_WATCH_INTERVAL > 0 (por defecto 1 s en
+modo debug) un hilo vuelve a recorrer la carpeta y rehace sólo las entradas
+que han cambiado.
+
+- El ETag es el hash del contenido: igual en todos los workers y estable
+  entre despliegues si el fichero no cambia.
+- Los ficheros con hash en el nombre (assets/index-3f9a1c2b.js, como los
+  genera Vite) no cambian nunca: se sirven con Cache-Control immutable de un
+  año. index.html y el resto se revalidan con ETag/Last-Modified.
+- Si existe una variante precomprimida (fichero.br o fichero.gz) y el
+  cliente la acepta, se envía esa con Content-Encoding. `flask
+  compress-static` genera las variantes (brotli sólo si está instalado).
+- Las peticiones Range (audio y vídeo) se responden con 206. El fichero se
+  envía por wsgi.file_wrapper, que gunicorn implementa con sendfile();
+  STATIC_X_SENDFILE=1 delega el envío en nginx (X-Sendfile).
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import threading
+import time
+
+import click
+from flask import current_app, request, send_file
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:  # Las variantes .br son opcionales
+    brotli = None
+
+# Hash de Vite: '-' + 8 caracteres base64url con al menos un dígito antes de la
+# extensión (index-a1B2c3D4.js). Un hash sin dígitos sólo pierde el immutable.
+HASHED_ASSET = re.compile(r'-(?=[A-Za-z0-9_-]{0,7}[0-9])[A-Za-z0-9_-]{8}\.[0-9A-Za-z]+$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Codificación y extensión de cada variante, por orden de preferencia
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+COMPRESSIBLE = {'.html', '.js', '.mjs', '.css', '.svg', '.json', '.map', '.txt', '.xml', '.ico', '.wasm'}
+MIN_COMPRESS_SIZE = 1024
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def is_hashed_asset(path):
+    """True si el nombre lleva un hash de contenido (assets/x-<hash>.ext)"""
+    return path.startswith('assets/') and bool(HASHED_ASSET.search(path))
+
+
+def accepted_encodings():
+    """Codificaciones de Accept-Encoding con calidad > 0"""
+    return {value for value, quality in request.accept_encodings if quality > 0}
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class StaticManifest:
+    """Índice en memoria de la carpeta static"""
+
+    def __init__(self):
+        self.folder = None
+        self.entries = {}
+        self.interval = 0
+        self.refreshes = 0
+        self._files = {}
+        self._thread = None
+        self._app = None
+
+    def init_app(self, app):
+        """Construye el manifiesto y, si se pide, arranca el hilo de vigilancia"""
+        self._app = app
+        self.folder = app.static_folder
+        self.interval = float(os.environ.get('STATIC_WATCH_INTERVAL', '1' if app.debug else '0'))
+        app.config['USE_X_SENDFILE'] = os.environ.get('STATIC_X_SENDFILE', '0') == '1'
+        self.build()
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='static-watch', daemon=True)
+            self._thread.start()
+
+    def _scan(self):
+        """(tamaño, mtime) de cada fichero, por ruta relativa con '/'"""
+        files = {}
+        if not self.folder or not os.path.isdir(self.folder):
+            return files
+        for root, _, names in os.walk(self.folder):
+            for name in names:
+                full_path = os.path.join(root, name)
+                stat = os.stat(full_path)
+                relative = os.path.relpath(full_path, self.folder).replace(os.sep, '/')
+                files[relative] = (stat.st_size, stat.st_mtime)
+        return files
+
+    def build(self):
+        """Recorre la carpeta y rehace las entradas nuevas o modificadas.
+
+        Devuelve True si algo cambió.
+        """
+        files = self._scan()
+        if files == self._files:
+            return False
+
+        # Sólo se vuelve a leer el contenido de los ficheros con otro tamaño/mtime
+        hashes = {}
+        previous_hashes = {
+            relative: entry['hash'] for relative, entry in self.entries.items()
+        }
+        for entry in self.entries.values():
+            for variant in entry['variants'].values():
+                previous_hashes[variant['relative']] = variant['hash']
+        for relative, signature in files.items():
+            if relative in previous_hashes and self._files.get(relative) == signature:
+                hashes[relative] = previous_hashes[relative]
+            else:
+                hashes[relative] = file_hash(os.path.join(self.folder, relative))
+
+        variant_suffixes = tuple(suffix for _, suffix in PRECOMPRESSED)
+        entries = {}
+        for relative, (size, mtime) in files.items():
+            if relative.endswith(variant_suffixes) and relative.rsplit('.', 1)[0] in files:
+                continue
+            variants = {}
+            for encoding, suffix in PRECOMPRESSED:
+                if relative + suffix in files:
+                    variants[encoding] = {
+                        'relative': relative + suffix,
+                        'path': os.path.join(self.folder, relative + suffix),
+                        'hash': hashes[relative + suffix]
+                    }
+            entries[relative] = {
+                'path': os.path.join(self.folder, relative),
+                'size': size,
+                'mtime': mtime,
+                'hash': hashes[relative],
+                'mimetype': mimetypes.guess_type(relative)[0] or 'application/octet-stream',
+                'compressible': os.path.splitext(relative)[1] in COMPRESSIBLE,
+                'immutable': is_hashed_asset(relative),
+                'variants': variants
+            }
+
+        # Se sustituye el diccionario completo: los lectores nunca ven uno a medias
+        self.entries = entries
+        self._files = files
+        self.refreshes += 1
+        return True
+
+    def get(self, path):
+        return self.entries.get(path)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                if self.build():
+                    self._app.logger.info('Manifiesto de estáticos actualizado (%d ficheros)', len(self.entries))
+            except Exception as e:
+                self._app.logger.warning('Error actualizando el manifiesto de estáticos: %s', e)
+
+    def send(self, path):
+        """Respuesta para el fichero path del manifiesto, o None si no existe"""
+        entry = self.get(path)
+        if entry is None:
+            return None
+
+        file_path, etag, encoding = entry['path'], entry['hash'], None
+        if entry['variants']:
+            accepted = accepted_encodings()
+            for name, _ in PRECOMPRESSED:
+                variant = entry['variants'].get(name)
+                if variant is not None and name in accepted:
+                    file_path, etag, encoding = variant['path'], variant['hash'], name
+                    break
+
+        try:
+            response = send_file(
+                file_path, mimetype=entry['mimetype'], conditional=True, etag=etag,
+                last_modified=entry['mtime'],
+                max_age=IMMUTABLE_MAX_AGE if entry['immutable'] else 0
+            )
+        except FileNotFoundError:
+            # Borrado después de construir el manifiesto
+            return None
+        if entry['immutable']:
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        if encoding:
+            response.content_encoding = encoding
+        if entry['compressible']:
+            response.vary.add('Accept-Encoding')
+        return response
+
+
+def compress_file(path):
+    """Escribe path.gz (y path.br) si son más pequeños que el original"""
+    written = 0
+    with open(path, 'rb') as source:
+        data = source.read()
+    variants = [('.gz', lambda raw: gzip.compress(raw, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', lambda raw: brotli.compress(raw, quality=11)))
+    for suffix, compress in variants:
+        compressed = compress(data)
+        if len(compressed) >= len(data):
+            continue
+        with open(path + suffix + '.tmp', 'wb') as target:
+            target.write(compressed)
+        shutil.copystat(path, path + suffix + '.tmp')
+        os.replace(path + suffix + '.tmp', path + suffix)
+        written += 1
+    return written
+
+
+def precompress(static_folder):
+    """Genera las variantes .gz/.br de los ficheros comprimibles"""
+    written = 0
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.splitext(name)[1] in COMPRESSIBLE and os.path.getsize(path) >= MIN_COMPRESS_SIZE:
+                written += compress_file(path)
+    return written
+
+
+@click.command('compress-static')
+@with_appcontext
+def compress_static_command():
+    """Genera variantes .gz (y .br si está brotli) de los ficheros estáticos"""
+    click.echo(f'{precompress(current_app.static_folder)} variantes escritas')
+
+
+static_manifest = StaticManifest()
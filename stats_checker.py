@@ -0,0 +1,110 @@
+"""Verificador de consistencia de student_stats.
+
+Los agregados se mantienen de forma incremental en login/logout; este
+verificador los recalcula desde student_sessions por lotes de estudiantes y
+corrige las diferencias (p. ej. logouts perdidos por el buffer write-behind
+o sesiones cerradas dos veces). Con STATS_CHECK_INTERVAL > 0 corre en un
+hilo en segundo plano, revisando STATS_CHECK_BATCH estudiantes por ciclo.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import insert, update
+from src.models.user import db
+from src.models.student import StudentSession, StudentStats
+
+
+def check_student_stats(first_id, last_id, fix=True):
+    """Compara los agregados de los estudiantes con id en [first_id, last_id]
+    con los recalculados desde las sesiones.
+
+    La corrección se hace con un UPDATE ... SET col = (subconsulta) en una sola
+    sentencia, para no pisar incrementos concurrentes de login/logout.
+    Devuelve el número de estudiantes inconsistentes.
+    """
+    sessions = StudentSession.__table__
+    stats = StudentStats.__table__
+    in_range = StudentSession.student_id.between(first_id, last_id)
+
+    def correlated(column):
+        return db.select(column).where(
+            sessions.c.student_id == stats.c.student_id
+        ).scalar_subquery()
+
+    recomputed_sessions = correlated(db.func.count(sessions.c.id))
+    recomputed_minutes = correlated(db.func.coalesce(db.func.sum(sessions.c.duration_minutes), 0))
+    drifted = db.and_(
+        stats.c.student_id.between(first_id, last_id),
+        db.or_(
+            stats.c.total_sessions != recomputed_sessions,
+            stats.c.total_minutes != recomputed_minutes
+        )
+    )
+
+    aggregates = StudentStats.aggregates_query().filter(in_range).subquery()
+    missing = db.select(
+        aggregates.c.student_id,
+        aggregates.c.total_sessions,
+        aggregates.c.total_minutes,
+        aggregates.c.last_seen_at
+    ).where(~db.exists().where(stats.c.student_id == aggregates.c.student_id))
+
+    if not fix:
+        inconsistent = db.session.execute(db.select(db.func.count()).where(drifted)).scalar()
+        inconsistent += db.session.execute(db.select(db.func.count()).select_from(missing.subquery())).scalar()
+        return inconsistent
+
+    inconsistent = db.session.execute(
+        update(stats).where(drifted).values(
+            total_sessions=recomputed_sessions,
+            total_minutes=recomputed_minutes
+        )
+    ).rowcount
+    inconsistent += db.session.execute(insert(stats).from_select(
+        ['student_id', 'total_sessions', 'total_minutes', 'last_seen_at'], missing
+    )).rowcount
+    db.session.commit()
+    return inconsistent
+
+
+class StatsConsistencyChecker:
+    """Recorre los estudiantes por lotes en un hilo en segundo plano"""
+
+    def __init__(self):
+        self.interval = 0
+        self.batch_size = 500
+        self._app = None
+        self._thread = None
+        self._next_id = 0
+        self.checked_batches = 0
+        self.fixed = 0
+
+    def init_app(self, app):
+        self._app = app
+        self.interval = float(os.environ.get('STATS_CHECK_INTERVAL', '0'))
+        self.batch_size = int(os.environ.get('STATS_CHECK_BATCH', '500'))
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='stats-checker', daemon=True)
+            self._thread.start()
+
+    def check_next_batch(self):
+        """Revisa el siguiente lote y vuelve al principio al llegar al final"""
+        first_id = self._next_id
+        last_id = first_id + self.batch_size - 1
+        with self._app.app_context():
+            self.fixed += check_student_stats(first_id, last_id)
+            max_id = db.session.query(db.func.max(StudentSession.student_id)).scalar() or 0
+        self._next_id = last_id + 1 if last_id < max_id else 0
+        self.checked_batches += 1
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check_next_batch()
+            except Exception as e:
+                self._app.logger.warning('Error verificando student_stats: %s', e)
+
+
+stats_checker = StatsConsistencyChecker()
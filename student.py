@@ -1,9 +1,14 @@
 from src.models.user import db
 from datetime import datetime
+from src.db_config import upsert_insert
 import json
 
 class Student(db.Model):
     __tablename__ = 'students'
+    __table_args__ = (
+        db.Index('ix_students_activo_created_at', 'activo', 'created_at', 'id'),
+        db.Index('ix_students_escuela_activo_created_at', 'escuela', 'activo', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nip = db.Column(db.String(6), unique=True, nullable=False)
@@ -44,6 +49,10 @@ class Student(db.Model):
 
 class StudentSession(db.Model):
     __tablename__ = 'student_sessions'
+    __table_args__ = (
+        db.Index('ix_student_sessions_session_end', 'session_end', 'id'),  # exportación incremental
+        db.Index('ix_student_sessions_student_id_session_start', 'student_id', 'session_start', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
@@ -84,3 +93,81 @@ class StudentSession(db.Model):
             'coins_earned': self.coins_earned
         }
 
+
+class StudentStats(db.Model):
+    """Agregados de sesiones por estudiante, mantenidos en login/logout.
+
+    Evitan el COUNT/SUM sobre student_sessions en cada consulta; el
+    verificador de consistencia los recalcula desde las sesiones.
+    """
+    __tablename__ = 'student_stats'
+    
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), primary_key=True)
+    total_sessions = db.Column(db.Integer, nullable=False, default=0)
+    total_minutes = db.Column(db.Integer, nullable=False, default=0)
+    last_seen_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @classmethod
+    def _increment(cls, student_id, sessions, minutes, at):
+        """Suma sesiones/minutos de forma atómica (crea la fila si no existe)"""
+        insert = upsert_insert()
+        if insert is not None:
+            statement = insert(cls).values(
+                student_id=student_id,
+                total_sessions=sessions,
+                total_minutes=minutes,
+                last_seen_at=at,
+                updated_at=at
+            )
+            statement = statement.on_conflict_do_update(
+                index_elements=['student_id'],
+                set_={
+                    'total_sessions': cls.__table__.c.total_sessions + sessions,
+                    'total_minutes': cls.__table__.c.total_minutes + minutes,
+                    'last_seen_at': statement.excluded.last_seen_at,
+                    'updated_at': statement.excluded.updated_at
+                }
+            )
+            db.session.execute(statement)
+            return
+        
+        stats = cls.query.filter_by(student_id=student_id).with_for_update().first()
+        if not stats:
+            stats = cls(student_id=student_id, total_sessions=0, total_minutes=0)
+            db.session.add(stats)
+        stats.total_sessions += sessions
+        stats.total_minutes += minutes
+        stats.last_seen_at = at
+    
+    @classmethod
+    def record_login(cls, student_id, at):
+        """Cuenta una sesión nueva"""
+        cls._increment(student_id, 1, 0, at)
+    
+    @classmethod
+    def record_logout(cls, student_id, duration_minutes, at):
+        """Suma la duración de una sesión cerrada"""
+        cls._increment(student_id, 0, duration_minutes or 0, at)
+    
+    @staticmethod
+    def aggregates_query():
+        """Agregados recalculados desde student_sessions, por student_id"""
+        return db.session.query(
+            StudentSession.student_id.label('student_id'),
+            db.func.count(StudentSession.id).label('total_sessions'),
+            db.func.coalesce(db.func.sum(StudentSession.duration_minutes), 0).label('total_minutes'),
+            db.func.max(db.func.coalesce(StudentSession.session_end, StudentSession.session_start)).label('last_seen_at')
+        ).group_by(StudentSession.student_id)
+    
+    def average_session_time(self):
+        return round(self.total_minutes / self.total_sessions, 1) if self.total_sessions > 0 else 0
+    
+    def to_statistics(self):
+        """Estadísticas en el formato de /api/auth/student/<nip>"""
+        return {
+            'total_sessions': self.total_sessions,
+            'total_time_minutes': self.total_minutes,
+            'average_session_time': self.average_session_time(),
+            'last_seen': self.last_seen_at.isoformat() if self.last_seen_at else None
+        }
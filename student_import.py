@@ -0,0 +1,229 @@
+"""Alta masiva de estudiantes desde un listado CSV o JSON.
+
+POST /api/auth/register/bulk y `flask auth import-students` validan todas las
+filas con las mismas reglas que /register y después insertan estudiantes y su
+GameProgress por lotes de IMPORT_CHUNK_SIZE filas, con un INSERT de varias
+filas por tabla y un commit por lote (en lugar de dos commits por alumno).
+
+Los NIP los asigna nip_allocator, que al empezar relee de la BD sólo los NIP
+de las bases del listado: si el NIP base está ocupado se usa la siguiente
+alternativa. Si otro worker registra el mismo NIP mientras tanto, el lote
+choca con la restricción única, se releen los NIP de esas bases y se
+reintenta. Un alumno que ya existe (mismo nombre, apellidos y fecha de
+nacimiento con uno de sus NIP posibles) se rechaza en lugar de duplicarlo.
+
+El resultado lista los alumnos creados con su NIP y los errores por fila
+(numeradas desde 1, sin contar la cabecera del CSV). Si la BD sigue
+bloqueada tras los reintentos, las filas de ese lote salen como errores y se
+pueden volver a enviar.
+"""
+import csv
+import io
+import os
+import random
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError, OperationalError
+from src.models.user import db
+from src.models.student import Student
+from src.models.game_progress import GameProgress
+from src.leaderboard import leaderboard
+from src.db_config import is_lock_error, LOCK_RETRIES, LOCK_RETRY_BASE_DELAY
+from src.nip_allocator import nip_allocator
+from src.routes.auth import generate_nip, validate_student_data
+from src.serialization import loads
+
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '1000'))
+IMPORT_MAX_ROWS = int(os.environ.get('IMPORT_MAX_ROWS', '20000'))
+# Parámetros por sentencia del IN (SQLite admite 32766)
+LOOKUP_CHUNK = 500
+# Mismo mensaje que retry_on_lock al agotar los reintentos
+BUSY_ERROR = 'La base de datos está ocupada, inténtalo de nuevo'
+
+
+def parse_roster(body, content_type):
+    """Filas (diccionarios) de un listado CSV o JSON.
+
+    JSON: una lista de objetos o {"students": [...]}. CSV: cabecera con los
+    mismos nombres de campo que /register.
+    """
+    if isinstance(body, bytes):
+        body = body.decode('utf-8-sig')
+    if 'csv' in (content_type or ''):
+        rows = list(csv.DictReader(io.StringIO(body)))
+    else:
+        try:
+            data = loads(body)
+        except ValueError:
+            raise ValueError('El listado no es JSON ni CSV válido')
+        rows = data.get('students') if isinstance(data, dict) else data
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError('El listado JSON debe ser una lista de estudiantes')
+    if not rows:
+        raise ValueError('El listado está vacío')
+    if len(rows) > IMPORT_MAX_ROWS:
+        raise ValueError(f'El listado supera el máximo de {IMPORT_MAX_ROWS} filas')
+    return rows
+
+
+def identity(values):
+    """Clave que identifica a un alumno para detectar duplicados"""
+    return (values['nombre'].lower(), values['apellidos'].lower(), values['fecha_nacimiento'])
+
+
+def load_identities(nips):
+    """Identidad de los estudiantes existentes con alguno de esos NIP"""
+    nips = list(nips)
+    identities = {}
+    for start in range(0, len(nips), LOOKUP_CHUNK):
+        rows = db.session.query(
+            Student.nip, Student.nombre, Student.apellidos, Student.fecha_nacimiento
+        ).filter(Student.nip.in_(nips[start:start + LOOKUP_CHUNK])).all()
+        for nip, nombre, apellidos, fecha_nacimiento in rows:
+            identities[(nombre.lower(), apellidos.lower(), fecha_nacimiento)] = nip
+    return identities
+
+
+def import_students(rows, dry_run=False, chunk_size=None):
+    """Valida e inserta un listado de estudiantes.
+
+    Devuelve {'created': [...], 'errors': [...], 'dry_run': bool}.
+    """
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+    errors = []
+    valid = []
+    for number, row in enumerate(rows, 1):
+        values, error = validate_student_data(row)
+        if error:
+            errors.append({'row': number, 'error': error})
+            continue
+        values['nip'] = generate_nip(values['nombre'], values['apellidos'], values['fecha_nacimiento'])
+        valid.append((number, values))
+
+    # NIP ocupados de las bases del listado (no de toda la tabla)
+    nip_allocator.refresh({values['nip'] for _, values in valid})
+
+    # Alumnos ya registrados: sólo pueden tener uno de los NIP de su base
+    existing = load_identities({
+        nip for _, values in valid for nip in nip_allocator.taken_candidates(values['nip'])
+    })
+
+    pending = []
+    seen = {}
+    for number, values in valid:
+        key = identity(values)
+        if key in existing:
+            errors.append({'row': number, 'error': f'El estudiante ya está registrado con el NIP {existing[key]}'})
+            continue
+        if key in seen:
+            errors.append({'row': number, 'error': f'Estudiante repetido en la fila {seen[key]}'})
+            continue
+        seen[key] = number
+        nip = nip_allocator.reserve(values['nip'])
+        if nip is None:
+            errors.append({'row': number, 'error': 'No quedan NIP disponibles para estas iniciales y fecha'})
+            continue
+        values['nip'] = nip
+        pending.append((number, values))
+
+    created = []
+    if not dry_run:
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            insert_chunk(chunk, errors)
+            created.extend(chunk)
+    else:
+        created = pending
+        for _, values in pending:
+            nip_allocator.release(values['nip'])
+
+    errors.sort(key=lambda error: error['row'])
+    return {
+        'created': [
+            {'row': number, 'nip': values['nip'], 'nombre': values['nombre'], 'apellidos': values['apellidos']}
+            for number, values in created
+        ],
+        'errors': errors,
+        'dry_run': dry_run
+    }
+
+
+def nips_in_use(nips):
+    """NIP de la lista que ya tienen estudiante o progreso en la BD"""
+    nips = list(nips)
+    user_ids = [f'student_{nip}' for nip in nips]
+    used = set()
+    for start in range(0, len(nips), LOOKUP_CHUNK):
+        used.update(nip for (nip,) in db.session.query(Student.nip).filter(
+            Student.nip.in_(nips[start:start + LOOKUP_CHUNK])))
+        used.update(user_id[len('student_'):] for (user_id,) in db.session.query(GameProgress.user_id).filter(
+            GameProgress.user_id.in_(user_ids[start:start + LOOKUP_CHUNK])))
+    return used
+
+
+def insert_chunk(chunk, errors):
+    """Inserta un lote en una transacción; reasigna los NIP que otra petición
+    haya ocupado mientras tanto. Modifica chunk quitando las filas sin NIP; si
+    se agotan los reintentos, todas sus filas pasan a errors."""
+    for attempt in range(LOCK_RETRIES + 1):
+        now = datetime.utcnow()
+        try:
+            db.session.execute(insert(Student), [
+                dict(values, activo=True, created_at=now, updated_at=now) for _, values in chunk
+            ])
+            progress_rows = db.session.execute(
+                insert(GameProgress).returning(GameProgress.id, GameProgress.user_id, GameProgress.coins,
+                                               GameProgress.level),
+                [{'user_id': f"student_{values['nip']}", 'created_at': now, 'updated_at': now}
+                 for _, values in chunk]
+            ).all()
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            # Siguen reservados en el índice; se releen los NIP de sus bases
+            # para que reserve() pase a uno libre
+            used = nips_in_use(values['nip'] for _, values in chunk)
+            bases = {
+                number: generate_nip(values['nombre'], values['apellidos'], values['fecha_nacimiento'])
+                for number, values in chunk if values['nip'] in used
+            }
+            nip_allocator.refresh(set(bases.values()))
+            remaining = []
+            for number, values in chunk:
+                if number in bases:
+                    values['nip'] = nip_allocator.reserve(bases[number])
+                    if values['nip'] is None:
+                        errors.append({'row': number, 'error': 'No quedan NIP disponibles para estas iniciales y fecha'})
+                        continue
+                remaining.append((number, values))
+            chunk[:] = remaining
+            if not chunk:
+                return
+            continue
+        except OperationalError as e:
+            db.session.rollback()
+            if not is_lock_error(e):
+                raise
+            if attempt == LOCK_RETRIES:
+                reject_chunk(chunk, errors, BUSY_ERROR)
+                return
+            time.sleep(LOCK_RETRY_BASE_DELAY * (2 ** attempt) * (0.5 + random.random()))
+            continue
+
+        schools = {f"student_{values['nip']}": values['escuela'] for _, values in chunk}
+        leaderboard.record_new_progress(
+            (progress_id, user_id, coins, level, schools[user_id])
+            for progress_id, user_id, coins, level in progress_rows
+        )
+        return
+    reject_chunk(chunk, errors, 'No se pudo asignar un NIP libre, inténtalo de nuevo')
+
+
+def reject_chunk(chunk, errors, message):
+    """Pasa las filas de un lote no insertado a errors y libera sus NIP"""
+    for number, values in chunk:
+        nip_allocator.release(values['nip'])
+        errors.append({'row': number, 'error': message})
+    chunk[:] = []
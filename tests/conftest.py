@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Igual que main.py: el paquete src se importa desde el directorio que lo
+# contiene (backend), dos niveles por encima de src/tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -0,0 +1,23 @@
+"""Regresiones de rendimiento de la API sobre unos miles de filas.
+
+Reutilizan los chequeos de src/benchmark.py (`plans` y `live`) con tamaños
+pequeños para que corran con pytest:
+
+    python -m pytest src/tests   (desde backend/)
+"""
+from src.benchmark import bench_live, check_query_plans
+
+PLAN_ROWS = 3000
+LIVE_COMPLETIONS = 100
+
+
+def test_indexed_tables_are_not_scanned():
+    """EXPLAIN QUERY PLAN de cada endpoint: ningún SCAN sin índice en las tablas grandes"""
+    failures = check_query_plans(PLAN_ROWS)
+    assert not failures, '\n'.join(f'{label}: {detail}\n    {statement}'
+                                   for label, statement, detail in failures)
+
+
+def test_completion_queries_do_not_depend_on_subscribers():
+    """complete_module hace las mismas consultas sin clientes SSE que con 50"""
+    assert bench_live([0, 50], LIVE_COMPLETIONS, 'local')
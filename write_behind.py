@@ -0,0 +1,187 @@
+"""Buffer de escritura diferida (write-behind) para telemetría.
+
+Las filas de ModuleActivity que guarda save_activity y los datos de cierre de
+StudentSession de logout_student no necesitan ser durables al instante. Con
+WRITE_BEHIND_ENABLED=1 se encolan en memoria y un hilo en segundo plano las
+escribe en lotes cada WRITE_BEHIND_INTERVAL_MS milisegundos o en cuanto hay
+WRITE_BEHIND_BATCH_SIZE elementos, en una sola transacción por lote.
+
+La cola está acotada (WRITE_BEHIND_MAX_QUEUE); si se llena, los elementos
+nuevos se descartan y se contabilizan en dropped. Al terminar el proceso
+(atexit o SIGTERM) se vacía la cola.
+"""
+import atexit
+import os
+import queue
+import signal
+import threading
+import time
+
+from sqlalchemy import insert, update
+from src.models.user import db
+
+
+class WriteBehindBuffer:
+    """Cola acotada de inserciones/actualizaciones con volcado periódico"""
+
+    def __init__(self, interval_ms=500, batch_size=200, max_queue=10000):
+        self.enabled = False
+        self.interval = interval_ms / 1000
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._app = None
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.flush_seconds_total = 0.0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    def init_app(self, app):
+        """Configura el buffer a partir de las variables de entorno"""
+        self._app = app
+        self.enabled = os.environ.get('WRITE_BEHIND_ENABLED', '0') == '1'
+        self.interval = int(os.environ.get('WRITE_BEHIND_INTERVAL_MS', '500')) / 1000
+        self.batch_size = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', '200'))
+        self._queue = queue.Queue(maxsize=int(os.environ.get('WRITE_BEHIND_MAX_QUEUE', '10000')))
+        if self.enabled:
+            atexit.register(self.shutdown)
+            self._install_signal_handler()
+
+    def _install_signal_handler(self):
+        if threading.current_thread() is not threading.main_thread():
+            return
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def handle_sigterm(signum, frame):
+            self.shutdown()
+            if callable(previous):
+                previous(signum, frame)
+            else:
+                raise SystemExit(0)
+
+        signal.signal(signal.SIGTERM, handle_sigterm)
+
+    def _ensure_started(self):
+        # Tras un fork (gunicorn --preload) el hilo del padre no existe en el hijo
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+
+    # -- productores ----------------------------------------------------
+
+    def insert(self, model, values):
+        """Encola la inserción de una fila de model"""
+        return self._put(('insert', model, values))
+
+    def update(self, model, values):
+        """Encola la actualización por clave primaria ('id' en values)"""
+        return self._put(('update', model, values))
+
+    def call(self, function, *args):
+        """Encola una llamada function(*args) que se ejecuta dentro de la
+        transacción del volcado (p. ej. un UPDATE incremental)"""
+        return self._put(('call', function, args))
+
+    def _put(self, item):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+        with self._stats_lock:
+            self.queued += 1
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+        return True
+
+    # -- volcado --------------------------------------------------------
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Escribe todo lo encolado; devuelve el número de elementos escritos"""
+        with self._flush_lock:
+            items = []
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not items:
+                return 0
+
+            grouped = {}
+            for kind, target, values in items:
+                grouped.setdefault((kind, target), []).append(values)
+
+            start = time.perf_counter()
+            try:
+                with self._app.app_context():
+                    for (kind, target), rows in grouped.items():
+                        if kind == 'call':
+                            for args in rows:
+                                target(*args)
+                            continue
+                        statement = insert(target) if kind == 'insert' else update(target)
+                        db.session.execute(statement, rows)
+                    db.session.commit()
+            except Exception:
+                with self._app.app_context():
+                    db.session.rollback()
+                with self._stats_lock:
+                    self.failed += len(items)
+                return 0
+
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                self.flushed += len(items)
+                self.flushes += 1
+                self.flush_seconds_total += elapsed
+                self.last_flush_ms = elapsed * 1000
+                self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+            return len(items)
+
+    def shutdown(self):
+        """Detiene el hilo y vacía la cola"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        if self._app is not None:
+            self.flush()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'enabled': self.enabled,
+                'queue_depth': self._queue.qsize(),
+                'queued': self.queued,
+                'flushed': self.flushed,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'flushes': self.flushes,
+                'last_flush_ms': round(self.last_flush_ms, 2),
+                'max_flush_ms': round(self.max_flush_ms, 2),
+                'avg_flush_ms': round(self.flush_seconds_total * 1000 / self.flushes, 2) if self.flushes else 0
+            }
+
+
+write_behind = WriteBehindBuffer()